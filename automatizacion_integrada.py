@@ -1,11 +1,41 @@
+import argparse
 import pyvisa
 import time
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 from datetime import datetime
 
-def barrido_frecuencias_automatizado():
+def generar_diagrama_bode(resultados, timestamp, mostrar=True):
+    # matplotlib se importa solo aquí: un barrido sin gráfico nunca lo carga
+    import matplotlib
+    if not mostrar:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    
+    # Extraer datos para el gráfico
+    x_freq = [r['frecuencia'] for r in resultados]
+    y_gain = [r['ganancia_db'] for r in resultados]
+    
+    # Crear figura
+    plt.figure(figsize=(12, 8))
+    plt.semilogx(x_freq, y_gain, 'o-', linewidth=2, markersize=8, color='blue')
+    plt.grid(True, which="both", ls="-", alpha=0.7)
+    
+    # Configurar etiquetas y título
+    plt.title("Diagrama de Bode - Respuesta en Frecuencia", fontsize=16)
+    plt.xlabel("Frecuencia (Hz)", fontsize=14)
+    plt.ylabel("Ganancia (dB)", fontsize=14)
+    
+    # Guardar diagrama
+    filename = f"resultados/diagrama_bode_{timestamp}.png"
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    print(f"Diagrama de Bode guardado como: {filename}")
+    
+    # Mostrar el diagrama
+    if mostrar:
+        plt.show()
+
+def barrido_frecuencias_automatizado(generar_grafico=True, mostrar_grafico=True):
     # Crear directorio para guardar resultados
     os.makedirs("resultados", exist_ok=True)
     
@@ -164,28 +194,7 @@ def barrido_frecuencias_automatizado():
         for r in resultados:
             print(f"{r['frecuencia']:<14.2f} | {r['entrada_vpp']:<13.6f} | {r['salida_vpp']:<12.6f} | {r['ganancia']:<8.6f} | {r['ganancia_db']:<12.2f}")
         
-        # Generar diagrama de Bode
-        print("\nGenerando diagrama de Bode...")
-        
-        # Extraer datos para el gráfico
-        x_freq = [r['frecuencia'] for r in resultados]
-        y_gain = [r['ganancia_db'] for r in resultados]
-        
-        # Crear figura
-        plt.figure(figsize=(12, 8))
-        plt.semilogx(x_freq, y_gain, 'o-', linewidth=2, markersize=8, color='blue')
-        plt.grid(True, which="both", ls="-", alpha=0.7)
-        
-        # Configurar etiquetas y título
-        plt.title("Diagrama de Bode - Respuesta en Frecuencia", fontsize=16)
-        plt.xlabel("Frecuencia (Hz)", fontsize=14)
-        plt.ylabel("Ganancia (dB)", fontsize=14)
-        
-        # Guardar diagrama
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"resultados/diagrama_bode_{timestamp}.png"
-        plt.savefig(filename, dpi=300, bbox_inches='tight')
-        print(f"Diagrama de Bode guardado como: {filename}")
         
         # Guardar datos en CSV
         csv_filename = f"resultados/datos_bode_{timestamp}.csv"
@@ -196,8 +205,10 @@ def barrido_frecuencias_automatizado():
         
         print(f"Datos guardados en CSV: {csv_filename}")
         
-        # Mostrar el diagrama
-        plt.show()
+        # Generar diagrama de Bode
+        if generar_grafico:
+            print("\nGenerando diagrama de Bode...")
+            generar_diagrama_bode(resultados, timestamp, mostrar_grafico)
         
         # 6. FINALIZAR PRUEBA Y DESCONECTAR
         print("\nFinalizando barrido de frecuencias...")
@@ -230,4 +241,14 @@ def barrido_frecuencias_automatizado():
 
 # Ejecutar el barrido de frecuencias
 if __name__ == "__main__":
-    barrido_frecuencias_automatizado()
+    parser = argparse.ArgumentParser(description="Barrido de frecuencias para diagrama de Bode")
+    parser.add_argument("--sin-grafico", action="store_true",
+                        help="No generar el diagrama (no importa matplotlib)")
+    parser.add_argument("--sin-ventana", action="store_true",
+                        help="Guardar el diagrama sin abrir una ventana")
+    args = parser.parse_args()
+    
+    barrido_frecuencias_automatizado(
+        generar_grafico=not args.sin_grafico,
+        mostrar_grafico=not args.sin_ventana
+    )
@@ -1,24 +1,28 @@
 # Archivo app.py - Versión mejorada con sidebar y nueva configuración de frecuencias
 
+# Solo se importa aquí lo imprescindible para arrancar. pandas, numpy y plotly
+# se cargan dentro de la pestaña de Gráficas o de las exportaciones que los usan.
 import streamlit as st
 import time
-import pandas as pd
-import plotly.graph_objects as go
-import json
 import os
+import uuid
 from datetime import datetime
-import threading
-import queue
-import signal  # Para manejo de señales para detener procesos
 
 # Importar módulos propios
 from modules.config import (
     cargar_perfiles_red, guardar_perfiles_red, 
-    cargar_frecuencias, cargar_datos_ganancia
+    cargar_frecuencias, guardar_frecuencias, generar_frecuencias, descongelar
 )
 from modules.equipos import Osciloscopio, GeneradorFunciones
-from modules.automatizacion import ejecutar_medicion_automatica, ejecutar_secuencia_completa
-from modules.visualizacion import mostrar_tabla_ganancias, generar_grafico_bode
+from modules.sesiones import BancoInstrumentos
+from modules.servicio import (
+    ServicioBarrido, ClienteServicio, crear_estado_con_espejo, PUERTO_POR_DEFECTO
+)
+from modules.automatizacion import ejecutar_medicion_automatica
+from modules.visualizacion import (
+    mostrar_tabla_ganancias, generar_grafico_bode, crear_dataframe_ganancias, agregar_columnas_db,
+    dataframe_mediciones, mostrar_metricas_bode, generar_grafico_spc, generar_carta_control, BodeEnVivo
+)
 
 # Configuración de la página de Streamlit
 st.set_page_config(
@@ -30,33 +34,55 @@ st.set_page_config(
 
 # Crear directorio de datos si no existe
 os.makedirs("data", exist_ok=True)
-# Archivo para comunicación entre hilos
-LOG_FILE = os.path.join("data", "progress_log.txt")
-PROGRESS_FILE = os.path.join("data", "progress_status.json")
-CONTROL_FILE = os.path.join("data", "process_control.json")  # Archivo para control de procesos
 
-# Inicializar archivo de progreso si no existe
-if not os.path.exists(PROGRESS_FILE):
-    with open(PROGRESS_FILE, "w") as f:
-        json.dump({
-            "estado": "Detenido", 
-            "progreso": 0, 
-            "total": 1
-        }, f)
+# Servicio de barridos externo (python -m modules.servicio). Si no está en
+# ejecución, los barridos se ejecutan dentro de este proceso como antes.
+SERVICIO_BARRIDO_URL = os.environ.get("SERVICIO_BARRIDO_URL", f"http://127.0.0.1:{PUERTO_POR_DEFECTO}")
+
+# Conexiones persistentes del control manual, compartidas por todo el servidor
+# (una por equipo) y asignadas a la sesión del navegador que las usa
+@st.cache_resource
+def obtener_banco_instrumentos():
+    return BancoInstrumentos()
+
+banco_instrumentos = obtener_banco_instrumentos()
+
+@st.cache_resource
+def obtener_cliente_servicio():
+    return ClienteServicio(SERVICIO_BARRIDO_URL)
+
+# Salud de los equipos en segundo plano. Reutiliza las sesiones manuales y
+# cede los equipos al servicio externo cuando está en marcha (que tiene su
+# propio monitor)
+@st.cache_resource
+def obtener_monitor():
+    from modules.monitor import MonitorEquipos
+    cliente = obtener_cliente_servicio()
+    return MonitorEquipos(banco=banco_instrumentos, ocupado=cliente.disponible).iniciar()
 
-# Inicializar archivo de control si no existe
-if not os.path.exists(CONTROL_FILE):
-    with open(CONTROL_FILE, "w") as f:
-        json.dump({
-            "ejecutando": False,
-            "detener": False,
-            "ultimo_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, f)
+# Servicio local compartido por todas las sesiones del servidor. El hilo de
+# barrido y la interfaz se comunican en memoria; los archivos son un espejo asíncrono.
+@st.cache_resource
+def obtener_servicio_local():
+    return ServicioBarrido(crear_estado_con_espejo("data"), monitor=obtener_monitor())
 
-# Inicializar archivo de log si no existe
-if not os.path.exists(LOG_FILE):
-    with open(LOG_FILE, "w") as f:
-        f.write("")
+# Elegir servicio: el local mientras tenga un barrido en curso; si no, el
+# externo cuando está disponible
+def obtener_servicio():
+    local = obtener_servicio_local()
+    if local.estado(0)["ejecutando"]:
+        return local
+    cliente = obtener_cliente_servicio()
+    return cliente if cliente.disponible() else local
+
+servicio_barrido = obtener_servicio()
+
+# Intervalos de refresco (s) del panel de ejecución: más rápido cuanto más
+# eventos por segundo publica el barrido; INTERVALO_REPOSO sin barrido en curso
+INTERVALOS_REFRESCO = (0.5, 1.0, 2.0)
+INTERVALO_REPOSO = 5.0
+# Tiempo mínimo (s) entre cambios de intervalo (cada cambio recarga la página)
+PERMANENCIA_INTERVALO = 10.0
 
 # Inicializar estado de sesión de manera segura
 if 'menu_actual' not in st.session_state:
@@ -65,110 +91,358 @@ if 'menu_actual' not in st.session_state:
 if 'auto_refresh' not in st.session_state:
     st.session_state['auto_refresh'] = True
 
-if 'thread_id' not in st.session_state:
-    st.session_state['thread_id'] = None
+if 'id_sesion' not in st.session_state:
+    st.session_state['id_sesion'] = uuid.uuid4().hex
+
+# Cada ejecución cuenta como actividad del navegador para sus conexiones manuales
+banco_instrumentos.tocar(st.session_state['id_sesion'])
+
+if 'barrido_id' not in st.session_state:
+    st.session_state['barrido_id'] = None
+
+if 'bode_en_vivo' not in st.session_state:
+    st.session_state['bode_en_vivo'] = BodeEnVivo()
+
+if 'intervalo_refresco' not in st.session_state:
+    st.session_state['intervalo_refresco'] = INTERVALOS_REFRESCO[0]
+    st.session_state['cambio_intervalo'] = 0.0
+    st.session_state['muestra_refresco'] = None
+    st.session_state['eventos_por_segundo'] = 0.0
 
 # Función para leer el estado del progreso
 def leer_estado_progreso():
-    try:
-        with open(PROGRESS_FILE, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error al leer estado de progreso: {e}")
-        return {"estado": "Detenido", "progreso": 0, "total": 1}
-
-# Función para guardar el estado del progreso
-def guardar_estado_progreso(estado, progreso=0, total=1):
-    try:
-        with open(PROGRESS_FILE, "w") as f:
-            json.dump({
-                "estado": estado,
-                "progreso": progreso,
-                "total": total,
-                "timestamp": datetime.now().timestamp()  # Añadir timestamp para control
-            }, f)
-        return True
-    except Exception as e:
-        print(f"Error al guardar estado de progreso: {e}")
-        return False
+    return servicio_barrido.estado(0)
 
 # Función para agregar mensajes al log
 def agregar_log(mensaje):
-    try:
-        tiempo = datetime.now().strftime("%H:%M:%S")
-        with open(LOG_FILE, "a") as f:
-            f.write(f"[{tiempo}] {mensaje}\n")
-        
-        # Actualizar timestamp en archivo de control para trigger refresco
-        actualizar_control(None, None)
-        return True
-    except Exception as e:
-        print(f"Error al escribir en el log: {e}")
-        return False
-
-# Función para leer los mensajes del log
-def leer_log(max_lines=100):
-    try:
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r") as f:
-                lines = f.readlines()
-            return lines[-max_lines:] if len(lines) > max_lines else lines
-        return []
-    except Exception as e:
-        print(f"Error al leer el log: {e}")
-        return []
+    exito, error = servicio_barrido.registrar_log(mensaje)
+    if not exito:
+        print(f"Error al escribir en el log: {error}")
+    return exito
 
-# Función para limpiar el log
+# Función para limpiar el log (el contenido anterior queda archivado en disco)
 def limpiar_log():
-    try:
-        with open(LOG_FILE, "w") as f:
-            f.write("")
-        return True
-    except Exception as e:
-        print(f"Error al limpiar el log: {e}")
-        return False
+    exito, _ = servicio_barrido.limpiar_log()
+    return exito
+
+# Función para cambiar el menú actual
+def cambiar_menu(nuevo_menu):
+    st.session_state['menu_actual'] = nuevo_menu
+
+# Sesión del navegador con las conexiones manuales del banco
+def obtener_sesion_manual(clase, conexion, forzar=False):
+    return banco_instrumentos.obtener(clase, conexion["ip"], conexion["puerto"],
+                                      st.session_state['id_sesion'], forzar=forzar)
+
+# Ejecutar una operación en la sesión persistente; devuelve (valor, error).
+# Las escrituras pasan reintentar=False: tras perder la conexión no se repiten
+def ejecutar_en_sesion(sesion, error_sesion, operacion, reintentar=True):
+    if sesion is None:
+        return None, error_sesion
+    return sesion.ejecutar(operacion, reintentar=reintentar)
 
-# Leer estado de control de proceso
-def leer_control():
-    try:
-        with open(CONTROL_FILE, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error al leer control: {e}")
-        return {"ejecutando": False, "detener": False, "ultimo_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+# Indicador del estado de la conexión manual, con liberar / tomar el control
+def mostrar_estado_sesion(sesion, error_sesion, conexion, clase, clave):
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        if sesion is None:
+            st.badge(error_sesion, icon=":material/lock:", color="orange")
+        elif sesion.estado == "conectado":
+            latencia = f" · {sesion.latencia_ms:.0f} ms" if sesion.latencia_ms is not None else ""
+            st.badge(f"Conectado{latencia}", icon=":material/link:", color="green")
+        elif sesion.estado in ("reconectando", "error"):
+            st.badge(f"Sin conexión: {sesion.ultimo_error}", icon=":material/link_off:", color="red")
+        else:
+            liberada = banco_instrumentos.sesion_liberada(conexion["ip"], conexion["puerto"], st.session_state['id_sesion'])
+            motivo = f" (anterior: {liberada.motivo_liberacion})" if liberada else ""
+            st.badge(f"Se conectará al primer comando{motivo}", icon=":material/link:", color="gray")
+    with col2:
+        if sesion is None and error_sesion != "Barrido automático en curso":
+            if st.button("Tomar control", key=f"tomar_{clave}", use_container_width=True,
+                         help="Libera la conexión de la otra sesión y usa el equipo desde aquí"):
+                obtener_sesion_manual(clase, conexion, forzar=True)
+                st.rerun()
+        elif sesion is not None and sesion.equipo.instrumento:
+            if st.button("Liberar", key=f"liberar_{clave}", use_container_width=True,
+                         help="Cierra la conexión para que otros puedan usar el equipo"):
+                sesion.liberar()
+                st.rerun()
 
-# Actualizar estado de control de proceso
-def actualizar_control(ejecutando=None, detener=None):
-    control = leer_control()
+# Modo script de la consola SCPI: ejecuta un script completo sobre la sesión
+# persistente y muestra la respuesta y el tiempo de cada línea
+def mostrar_script_scpi(sesion, error_sesion, clave):
+    from modules.scripts_scpi import parsear_script, ejecutar_script, resumen_tiempos, filas_a_csv
+
+    with st.expander("📜 Modo script"):
+        archivo = st.file_uploader("Cargar script:", type=["scpi", "txt"], key=f"archivo_script_{clave}")
+        texto = st.text_area(
+            "Script SCPI (# comentarios, WAIT ms, LOOP n ... END):",
+            value=archivo.getvalue().decode("utf-8", errors="replace") if archivo else "*IDN?\n",
+            height=200,
+            key=f"texto_script_{clave}"
+        )
+        canalizar = st.checkbox(
+            "Agrupar comandos consecutivos en una sola escritura",
+            value=True,
+            key=f"canalizar_script_{clave}",
+            help="Los comandos sin respuesta con ruta completa (':' o '*') se envían unidos con ';'"
+        )
+
+        if st.button("Ejecutar Script", key=f"btn_script_{clave}", use_container_width=True):
+            pasos, error = parsear_script(texto)
+            if error:
+                st.error(f"Error en el script: {error}")
+            elif sesion is None:
+                st.error(f"Error: {error_sesion}")
+            else:
+                with st.spinner(f"Ejecutando {len(pasos)} pasos..."):
+                    # Sin reintento automático: repetir el script duplicaría sus efectos
+                    filas, error = sesion.ejecutar(
+                        lambda equipo: ejecutar_script(equipo, pasos, canalizar=canalizar),
+                        reintentar=False
+                    )
+                st.session_state[f'resultado_script_{clave}'] = (filas or [], error)
+
+        resultado = st.session_state.get(f'resultado_script_{clave}')
+        if resultado:
+            filas, error = resultado
+            if error:
+                st.warning(error)
+            if filas:
+                resumen = resumen_tiempos(filas)
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Tiempo de E/S", f"{resumen['total_ms']:.1f} ms")
+                col2.metric("Pasos", len(filas))
+                col3.metric("Escrituras/queries", resumen['lotes'])
+                st.dataframe(filas, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "Exportar CSV",
+                    data=filas_a_csv(filas),
+                    file_name=f"script_{clave}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv",
+                    key=f"exportar_script_{clave}"
+                )
+
+# Veredicto de la última corrida frente a la referencia y gestión de referencias.
+# Los veredictos se guardan con cada corrida, así que solo se leen las últimas
+# líneas del historial (sin recalcular ni parsear todo el archivo)
+def mostrar_veredictos():
+    from modules.corridas import ultimas_corridas
+    from modules.referencia import (
+        cargar_referencias, crear_referencia, guardar_referencia, activar_referencia,
+        evaluar_lote, ganancia_db, referencia_activa, PASA, FALLA
+    )
+
+    ultima = ultimas_corridas(1)
+    veredicto = ultima[0].get("veredicto") if ultima else None
+    if veredicto:
+        colores = {PASA: "green", FALLA: "red"}
+        st.badge(f"{veredicto['veredicto']} · {veredicto['referencia']}",
+                 icon=":material/fact_check:", color=colores.get(veredicto["veredicto"], "orange"))
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Margen", f"{veredicto['margen_db']:+.2f} dB" if veredicto["margen_db"] is not None else "—")
+        col2.metric("Peor frecuencia", f"{veredicto['frecuencia_peor']:.6g} Hz" if veredicto["frecuencia_peor"] else "—")
+        col3.metric("Puntos fuera", f"{veredicto['puntos_fuera']}/{veredicto['puntos_cubiertos']}",
+                    f"{veredicto['puntos_referencia'] - veredicto['puntos_cubiertos']} sin medir" if veredicto["veredicto"] != PASA else None,
+                    delta_color="off")
+        st.caption(f"Corrida {ultima[0]['inicio']} ({ultima[0]['estado']})"
+                   + (" · abortada por falla dura" if veredicto.get("falla_dura") and ultima[0]["estado"] == "rechazada" else ""))
+    elif ultima:
+        st.info("La última corrida no tiene veredicto (no había referencia activa).")
+
+    with st.expander("Referencia (prueba de máscara)"):
+        datos = cargar_referencias()
+        nombres = [r["nombre"] for r in datos["referencias"]]
+        opciones = ["(ninguna)"] + nombres
+        actual = datos.get("referencia_activa")
+        activa = st.selectbox("Referencia activa:", options=opciones,
+                              index=opciones.index(actual) if actual in nombres else 0)
+        if (activa if activa in nombres else None) != actual:
+            if activar_referencia(activa if activa in nombres else None):
+                st.rerun()
+
+        st.markdown("**Crear referencia desde una corrida**")
+        corridas = ultimas_corridas(50)
+        if not corridas:
+            st.caption("Todavía no hay corridas registradas.")
+        else:
+            origen = st.selectbox(
+                "Corrida:", options=range(len(corridas)),
+                format_func=lambda i: f"{corridas[i]['inicio']} · {corridas[i].get('plan') or 'barrido'} · "
+                                      f"{len(corridas[i]['mediciones'])} puntos ({corridas[i]['estado']})"
+            )
+            col1, col2, col3 = st.columns(3)
+            nombre = col1.text_input("Nombre:", value=f"Referencia {corridas[origen]['inicio'][:10]}")
+            tolerancia = col2.number_input("Tolerancia (± dB):", min_value=0.0, value=1.0, step=0.1)
+            limite = col3.number_input("Límite duro (± dB, 0 = sin límite):", min_value=0.0, value=0.0, step=0.5)
+            abortar = st.checkbox("Abortar el barrido en la primera falla dura", value=False,
+                                  disabled=limite == 0)
+            if st.button("Guardar referencia", use_container_width=True):
+                referencia, error = crear_referencia(nombre, corridas[origen]["mediciones"], tolerancia,
+                                                     limite or None, abortar, corridas[origen]["id"])
+                if error:
+                    st.error(error)
+                elif guardar_referencia(referencia):
+                    st.success(f"Referencia '{nombre}' guardada y activada")
+                    st.rerun()
+                else:
+                    st.error("No se pudo guardar la referencia")
+
+        if corridas:
+            st.markdown("**Historial de veredictos**")
+            historial = [{"inicio": c["inicio"], "estado": c["estado"], **(c.get("veredicto") or {})}
+                         for c in corridas]
+            referencia = referencia_activa()
+            if referencia and st.button("Reevaluar con la referencia activa", use_container_width=True):
+                # Todas las corridas en un solo cálculo vectorizado
+                curvas = [([m["frecuencia"] for m in c["mediciones"]], [ganancia_db(m) for m in c["mediciones"]])
+                          for c in corridas]
+                historial = [{"inicio": c["inicio"], "estado": c["estado"], **v}
+                             for c, v in zip(corridas, evaluar_lote(referencia, curvas))]
+            st.dataframe(historial, use_container_width=True, hide_index=True)
+
+# Intervalo de refresco adecuado para la tasa de eventos observada
+def calcular_intervalo_refresco(eventos_por_segundo):
+    if eventos_por_segundo >= 4:
+        return INTERVALOS_REFRESCO[0]
+    if eventos_por_segundo >= 1:
+        return INTERVALOS_REFRESCO[1]
+    return INTERVALOS_REFRESCO[2]
+
+# Panel del visor de forma de onda: muestra solo el último cuadro capturado
+# (los que llegaron entre dos refrescos se descartan)
+def panel_forma_onda():
+    visor = st.session_state.get('visor_forma_onda')
+    if visor is None or not visor.activo:
+        st.info("Visor detenido.")
+        return
     
-    if ejecutando is not None:
-        control["ejecutando"] = ejecutando
+    if visor.error:
+        st.warning(f"Error de captura: {visor.error}")
     
-    if detener is not None:
-        control["detener"] = detener
+    cuadro = visor.ultimo_cuadro()
+    if cuadro is None:
+        st.info("Esperando la primera captura...")
+        return
     
-    # Siempre actualizar timestamp
-    control["ultimo_update"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    import plotly.graph_objects as go
     
-    try:
-        with open(CONTROL_FILE, "w") as f:
-            json.dump(control, f)
-        return True
-    except Exception as e:
-        print(f"Error al actualizar control: {e}")
-        return False
+    colores = {"CH1": "gold", "CH2": "deepskyblue"}
+    fig = go.Figure()
+    for nombre, (tiempo, voltaje) in cuadro["canales"].items():
+        # Scattergl: trazas WebGL, mucho más ligeras de redibujar
+        fig.add_trace(go.Scattergl(x=tiempo, y=voltaje, mode="lines", name=nombre,
+                                   line=dict(color=colores.get(nombre), width=1)))
+    fig.update_layout(
+        xaxis_title="Tiempo (s)",
+        yaxis_title="Voltaje (V)",
+        plot_bgcolor="black",
+        height=400,
+        margin=dict(l=40, r=20, t=20, b=40),
+        uirevision="forma_onda"
+    )
+    st.plotly_chart(fig, use_container_width=True, key="grafico_forma_onda")
+    
+    puntos_enviados = max(len(v[1]) for v in cuadro["canales"].values())
+    st.caption(
+        f"Cuadro {cuadro['numero']} · {cuadro['puntos_originales']} → {puntos_enviados} puntos por canal · "
+        f"captura {cuadro['duracion_captura'] * 1000:.0f} ms · descartados {visor.descartados}"
+    )
 
-# Función para cambiar el menú actual
-def cambiar_menu(nuevo_menu):
-    st.session_state['menu_actual'] = nuevo_menu
+# Panel de progreso, log y gráfico en vivo. Se ejecuta como fragmento: cada
+# refresco automático vuelve a ejecutar solo esta función.
+def panel_ejecucion():
+    # Una sola consulta al servicio por refresco (incluye el log)
+    estado_progreso = servicio_barrido.estado(100)
+    
+    # Al empezar o terminar un barrido, recargar la página para actualizar los botones
+    if estado_progreso["ejecutando"] != st.session_state.get('ejecutando_visto'):
+        st.rerun(scope="app")
+    
+    # Adaptar el intervalo a la tasa de eventos (media móvil exponencial)
+    ahora = time.monotonic()
+    muestra = st.session_state['muestra_refresco']
+    if muestra is not None and ahora > muestra[1]:
+        tasa = (estado_progreso["version"] - muestra[0]) / (ahora - muestra[1])
+        st.session_state['eventos_por_segundo'] = 0.7 * st.session_state['eventos_por_segundo'] + 0.3 * tasa
+    st.session_state['muestra_refresco'] = (estado_progreso["version"], ahora)
+    
+    if estado_progreso["ejecutando"] and st.session_state['intervalo_activo'] is not None:
+        deseado = calcular_intervalo_refresco(st.session_state['eventos_por_segundo'])
+        if (deseado != st.session_state['intervalo_refresco']
+                and ahora - st.session_state['cambio_intervalo'] >= PERMANENCIA_INTERVALO):
+            st.session_state['intervalo_refresco'] = deseado
+            st.session_state['cambio_intervalo'] = ahora
+            st.rerun(scope="app")
+    
+    # Barra de progreso
+    if estado_progreso["estado"] != "Detenido" and estado_progreso["total"] > 0:
+        porcentaje = estado_progreso["progreso"] / estado_progreso["total"]
+        progress_text = f"Progreso: {estado_progreso['progreso']}/{estado_progreso['total']} frecuencias ({int(porcentaje*100)}%)"
+    else:
+        porcentaje = 0
+        progress_text = "Esperando inicio..."
+    
+    st.progress(porcentaje, text=progress_text)
+    
+    # Botón para refrescar manualmente (solo vuelve a ejecutar este panel)
+    refresco_col1, refresco_col2 = st.columns([1, 6])
+    with refresco_col1:
+        st.button("🔄 Refrescar", key="refresh_btn")
+    
+    with refresco_col2:
+        if estado_progreso["ejecutando"]:
+            st.info(f"Proceso en ejecución. Estado: {estado_progreso['estado']}")
+        else:
+            if estado_progreso["estado"] == "Detenido":
+                st.info("No hay procesos en ejecución.")
+            else:
+                st.warning(f"Estado: {estado_progreso['estado']} - Puede haber un proceso incompleto.")
+    
+    # Área de log
+    st.subheader("Log de Ejecución")
+    log_container = st.container(height=300)
+    
+    with log_container:
+        log_lines = estado_progreso["log"]
+        if log_lines:
+            st.code("".join(log_lines))
+        else:
+            st.info("No hay mensajes en el log.")
+    
+    # Gráfico en vivo: solo se piden al servicio los resultados que aún no se tienen
+    bode_en_vivo = st.session_state['bode_en_vivo']
+    corrida, nuevos = servicio_barrido.mediciones(bode_en_vivo.corrida, bode_en_vivo.recibidos)
+    bode_en_vivo.agregar(corrida, nuevos)
+    figura_en_vivo = bode_en_vivo.figura(forzar=not estado_progreso["ejecutando"])
+    if figura_en_vivo is not None:
+        st.plotly_chart(figura_en_vivo, use_container_width=True, key="grafico_bode_en_vivo")
+
+# Estado de los equipos del perfil según el monitor, con el detalle de todos
+COLORES_SALUD = {"ok": "green", "degradado": "orange", "caido": "red", "sin datos": "gray"}
 
-# Función para verificar si debemos detener la ejecución
-def debe_detenerse():
-    control = leer_control()
-    return control["detener"]
+def mostrar_salud_banco(nombre_perfil):
+    salud = servicio_barrido.salud()
+    if salud is None:
+        return
+    for fila in salud["equipos"]:
+        if fila["perfil"] == nombre_perfil:
+            detalle = f" · {fila['latencia_ms']:.0f} ms" if fila["latencia_ms"] is not None else ""
+            if fila["errores_%"]:
+                detalle += f" · {fila['errores_%']}% errores"
+            st.badge(f"{fila['equipo'].capitalize()}: {fila['estado']}{detalle}",
+                     color=COLORES_SALUD.get(fila["estado"], "gray"))
+    if salud["pausado_por"]:
+        st.caption(f"Monitor en pausa: {salud['pausado_por']}")
+    with st.expander("Salud de todos los perfiles"):
+        st.dataframe(salud["equipos"], use_container_width=True, hide_index=True)
+        if st.button("Comprobar ahora", key="btn_salud", use_container_width=True):
+            servicio_barrido.sondear_salud()
+            time.sleep(0.5)
+            st.rerun()
 
-# Cargar perfiles
-perfiles = cargar_perfiles_red()
+# Cargar perfiles (copia modificable de la instantánea en caché)
+perfiles = descongelar(cargar_perfiles_red())
 
 # Sidebar para navegación y configuración rápida - MEJORADO
 with st.sidebar:
@@ -230,12 +504,20 @@ with st.sidebar:
             """)
             break
     
+    mostrar_salud_banco(perfil_seleccionado)
+    
     # Opción para activar/desactivar refresco automático
     auto_refresh = st.checkbox("Auto-refresco", value=st.session_state['auto_refresh'], 
                               help="Actualizar automáticamente logs y progreso")
     if auto_refresh != st.session_state['auto_refresh']:
         st.session_state['auto_refresh'] = auto_refresh
     
+    # Dónde se ejecutan los barridos
+    if servicio_barrido.remoto:
+        st.caption(f"🛰️ Servicio de barridos: {SERVICIO_BARRIDO_URL}")
+    else:
+        st.caption("💻 Servicio de barridos: local (dentro de Streamlit)")
+    
     # Ayuda en un expander al final
     with st.expander("📘 Comandos SCPI Comunes"):
         st.info("""
@@ -279,7 +561,7 @@ if st.session_state['menu_actual'] == "Automatizacion":
             st.header("Parámetros de Configuración")
 
             # Dividir en pestañas para mejor organización
-            config_tabs = st.tabs(["Configuración de Frecuencias", "Configuración de Señal", "Tiempos de Espera"])
+            config_tabs = st.tabs(["Configuración de Frecuencias", "Configuración de Señal", "Tiempos de Espera", "Plan de Barrido", "Calibración"])
 
             with config_tabs[0]:  # Pestaña de frecuencias
                 # Slider para seleccionar número de frecuencias
@@ -325,30 +607,13 @@ if st.session_state['menu_actual'] == "Automatizacion":
                 
                 # Botón para generar las frecuencias
                 if st.button("Generar lista de frecuencias", key="gen_freq_btn"):
-                    import numpy as np
-                    
                     try:
-                        # Generar frecuencias según la escala seleccionada
-                        if escala == "Logarítmica":
-                            nuevas_frecuencias = np.logspace(
-                                np.log10(freq_min),
-                                np.log10(freq_max),
-                                num_frecuencias
-                            ).tolist()
-                        else:  # Lineal
-                            nuevas_frecuencias = np.linspace(
-                                freq_min,
-                                freq_max,
-                                num_frecuencias
-                            ).tolist()
-                        
-                        # Redondear a 2 decimales
-                        nuevas_frecuencias = [round(f, 2) for f in nuevas_frecuencias]
+                        # Generar frecuencias según la escala seleccionada (redondeadas a 2 decimales)
+                        nuevas_frecuencias = generar_frecuencias(freq_min, freq_max, num_frecuencias, escala)
                         
                         # Guardar en archivo
-                        os.makedirs("data", exist_ok=True)
-                        with open(os.path.join("data", "frecuencias.json"), "w") as f:
-                            json.dump({"frecuencias": nuevas_frecuencias}, f, indent=4)
+                        if not guardar_frecuencias(nuevas_frecuencias):
+                            raise IOError("No se pudo escribir frecuencias.json")
                         
                         st.success(f"Se generaron {num_frecuencias} frecuencias correctamente")
                         
@@ -380,8 +645,7 @@ if st.session_state['menu_actual'] == "Automatizacion":
                     # Opción para ver todas las frecuencias
                     if st.checkbox("Ver lista completa de frecuencias"):
                         # Mostrar tabla de frecuencias
-                        df_frecuencias = pd.DataFrame({"Frecuencia (Hz)": frecuencias})
-                        st.dataframe(df_frecuencias, height=200)
+                        st.dataframe({"Frecuencia (Hz)": list(frecuencias)}, height=200)
 
             with config_tabs[1]:  # Pestaña de configuración de señal
                 # Amplitud de la señal
@@ -429,10 +693,108 @@ if st.session_state['menu_actual'] == "Automatizacion":
                     step=0.1,
                     help="Tiempo de espera entre mediciones consecutivas"
                 )
+                
+                establecimiento = None
+                if st.checkbox(
+                    "Establecimiento adaptativo",
+                    help="Espera en cada punto varios periodos de la señal y las constantes de tiempo "
+                         "del dispositivo estimadas en el punto anterior, en lugar de los tiempos fijos"
+                ):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        periodos = st.number_input("Periodos mínimos:", min_value=1, max_value=100, value=10)
+                        confirmar = st.checkbox("Confirmar con lecturas repetidas",
+                                                help="Repite lecturas rápidas de la salida hasta que dos "
+                                                     "seguidas coincidan dentro de la tolerancia")
+                    with col2:
+                        maximo = st.slider("Espera máxima por punto (s):", min_value=0.1, max_value=5.0,
+                                           value=2.0, step=0.1)
+                        tolerancia = st.number_input("Tolerancia de confirmación (%):", min_value=0.1,
+                                                     max_value=10.0, value=1.0, step=0.1, disabled=not confirmar)
+                    establecimiento = {"modo": "adaptativo", "periodos": periodos, "maximo": maximo,
+                                       "confirmar": confirmar, "tolerancia": tolerancia / 100}
+                
+                modos_captura = {"No capturar": None, "En cada punto": "punto", "Solo si el punto falla": "falla"}
+                capturar_pantalla = modos_captura[st.selectbox(
+                    "Capturas de pantalla del osciloscopio:",
+                    options=list(modos_captura),
+                    help="Guarda la pantalla en data/capturas/ para el registro de la prueba. "
+                         "Cada captura añade su transferencia (~1 MB) al barrido; un presupuesto "
+                         "de ancho de banda omite las que lo excedan"
+                )]
+            
+            with config_tabs[3]:  # Plan de barrido declarativo (opcional)
+                from modules.planes import leer_plan, plan_desde_parametros, compilar_plan, resumen_programa
+                
+                archivo_plan = st.file_uploader(
+                    "Plan de barrido (JSON o YAML):",
+                    type=["json", "yaml", "yml"],
+                    help="Sustituye a las frecuencias y a los parámetros de las otras pestañas"
+                )
+                plan = None
+                if archivo_plan is not None:
+                    plan, error_plan = leer_plan(
+                        archivo_plan.getvalue().decode("utf-8"),
+                        yaml=archivo_plan.name.endswith((".yaml", ".yml"))
+                    )
+                    if error_plan:
+                        st.error(f"Plan no válido: {error_plan}")
+                
+                # Programa compilado del barrido que se va a ejecutar, para estimar su duración
+                plan_efectivo = plan or plan_desde_parametros(
+                    frecuencias, amplitud, offset, forma_onda, tiempo_estabilizacion, tiempo_entre_mediciones,
+                    establecimiento
+                )
+                programa, error_plan = compilar_plan(plan_efectivo)
+                if programa:
+                    resumen = resumen_programa(programa)
+                    st.caption("Plan cargado" if plan else "Sin plan: se usan las otras pestañas")
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Puntos", resumen["puntos"])
+                    col2.metric("Comandos", resumen["comandos"],
+                                delta=resumen["comandos"] - resumen["comandos_sin_deltas"], delta_color="inverse",
+                                help="Frente a reenviar la configuración completa en cada punto")
+                    col3.metric("Duración estimada", f"{resumen['duracion_estimada'] / 60:.1f} min")
+            
+            with config_tabs[4]:  # Calibración con conexión directa (through)
+                from modules.calibracion import buscar_calibracion, estado_calibracion
+                
+                canales_plan = programa["plan"]["canales"] if programa else {"entrada": 1, "salida": 2}
+                calibracion = buscar_calibracion(perfil_activo["nombre"], canales_plan["entrada"],
+                                                 canales_plan["salida"], solo_vigente=False)
+                if calibracion is None:
+                    st.info(f"Sin calibración para '{perfil_activo['nombre']}' "
+                            f"CH{canales_plan['entrada']}-CH{canales_plan['salida']}: la ganancia es CH2/CH1 sin corregir")
+                else:
+                    vigencia = estado_calibracion(calibracion)
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Creada", calibracion["creada"])
+                    col2.metric("Edad", f"{vigencia['edad_horas']:.1f} h")
+                    col3.metric("Corrección máxima",
+                                f"{max(calibracion['ganancia_db'], key=abs):+.2f} dB")
+                    if vigencia["vigente"]:
+                        st.badge(f"Vigente hasta {calibracion['caduca']}", icon=":material/verified:", color="green")
+                    else:
+                        st.badge(f"Caducada el {calibracion['caduca']}: repetir la calibración",
+                                 icon=":material/schedule:", color="orange")
+                    st.line_chart(
+                        {"Frecuencia (Hz)": calibracion["frecuencias"], "Corrección (dB)": calibracion["ganancia_db"]},
+                        x="Frecuencia (Hz)", y="Corrección (dB)", height=200
+                    )
+                
+                corregir = st.checkbox("Aplicar la calibración vigente", value=True,
+                                       help="Divide cada punto por la respuesta de la conexión directa")
+                calibrar = st.checkbox(
+                    "Barrido de calibración (conexión directa)",
+                    help="Con ambos canales del osciloscopio conectados a la salida del generador: "
+                         "el barrido guarda la corrección del perfil en lugar de medir el dispositivo"
+                )
+                if calibrar:
+                    st.warning("Conectar CH1 y CH2 al mismo punto antes de iniciar. "
+                               "No se evalúa la referencia en este barrido.")
             
-            # Leer estado actual del proceso y control
+            # Leer estado actual del proceso (instantánea en memoria)
             estado_progreso = leer_estado_progreso()
-            control = leer_control()
             
             # Controles para iniciar/detener la secuencia
             col1, col2 = st.columns(2)
@@ -443,7 +805,7 @@ if st.session_state['menu_actual'] == "Automatizacion":
                     "INICIAR SECUENCIA COMPLETA",
                     type="primary",
                     use_container_width=True,
-                    disabled=(estado_progreso["estado"] != "Detenido" or control["ejecutando"])
+                    disabled=(estado_progreso["estado"] != "Detenido" or estado_progreso["ejecutando"])
                 )
             
             # Botón de detención
@@ -452,145 +814,67 @@ if st.session_state['menu_actual'] == "Automatizacion":
                     "DETENER PROCESO",
                     type="secondary",
                     use_container_width=True,
-                    disabled=(estado_progreso["estado"] == "Detenido" and not control["ejecutando"])
+                    disabled=(estado_progreso["estado"] == "Detenido" and not estado_progreso["ejecutando"])
                 )
             
-            # Barra de progreso
-            if estado_progreso["estado"] != "Detenido" and estado_progreso["total"] > 0:
-                porcentaje = estado_progreso["progreso"] / estado_progreso["total"]
-                progress_text = f"Progreso: {estado_progreso['progreso']}/{estado_progreso['total']} frecuencias ({int(porcentaje*100)}%)"
+            # Progreso, log y gráfico en vivo se refrescan solos en un fragmento,
+            # sin volver a ejecutar el resto de la página
+            st.session_state['ejecutando_visto'] = estado_progreso["ejecutando"]
+            if not st.session_state['auto_refresh']:
+                intervalo = None
+            elif estado_progreso["ejecutando"]:
+                intervalo = st.session_state['intervalo_refresco']
             else:
-                porcentaje = 0
-                progress_text = "Esperando inicio..."
-            
-            progress_bar = st.progress(porcentaje, text=progress_text)
-            
-            # Botón para refrescar manualmente
-            refresco_col1, refresco_col2 = st.columns([1, 6])
-            with refresco_col1:
-                if st.button("🔄 Refrescar", key="refresh_btn") and not st.session_state['auto_refresh']:
-                    pass  # La acción se realiza al hacer clic, no necesitamos código adicional
-            
-            with refresco_col2:
-                if control["ejecutando"]:
-                    st.info(f"Proceso en ejecución. Estado: {estado_progreso['estado']}")
-                else:
-                    if estado_progreso["estado"] == "Detenido":
-                        st.info("No hay procesos en ejecución.")
-                    else:
-                        st.warning(f"Estado: {estado_progreso['estado']} - Puede haber un proceso incompleto.")
-            
-            # Área de log
-            st.subheader("Log de Ejecución")
-            log_container = st.container(height=300)
-            
-            with log_container:
-                # Leer y mostrar los mensajes del log
-                log_lines = leer_log()
-                if log_lines:
-                    st.code("".join(log_lines))
-                else:
-                    st.info("No hay mensajes en el log.")
-            
-            # Función modificada para actualizar la UI
-            def actualizar_progreso(mensaje, progreso=None, total=None):
-                agregar_log(mensaje)
-                
-                # Actualizar barra de progreso si es posible
-                if progreso is not None and total is not None:
-                    guardar_estado_progreso("Ejecutando", progreso, total)
-                elif "frecuencia" in mensaje and "Iniciando medición" in mensaje:
-                    try:
-                        # Extraer el número de medición actual del formato "Iniciando medición X/Y"
-                        partes = mensaje.split("Iniciando medición ")[1].split("/")
-                        actual = int(partes[0])
-                        total = int(partes[1].split(":")[0])
-                        
-                        # Actualizar progreso
-                        guardar_estado_progreso("Ejecutando", actual, total)
-                    except:
-                        pass
+                intervalo = INTERVALO_REPOSO
+            st.session_state['intervalo_activo'] = intervalo
+            st.fragment(panel_ejecucion, run_every=intervalo)()
             
             # Lógica para iniciar la secuencia
             if start_button:
-                # Limpiar log
-                limpiar_log()
-                # Inicializar estado
-                guardar_estado_progreso("Iniciando", 0, 1)
-                # Configurar estado de control
-                actualizar_control(True, False)
+                # Los equipos aceptan una sola conexión: cerrar las del control manual
+                banco_instrumentos.liberar_todas("Barrido automático iniciado")
+                visor = st.session_state.get('visor_forma_onda')
+                if visor is not None:
+                    visor.detener()
                 
-                # Mensaje inicial
-                agregar_log("Iniciando secuencia automática...")
+                # El servicio limpia el log, marca el inicio y ejecuta el barrido en su hilo
+                parametros_barrido = {
+                    "gen_ip": perfil_activo["generador"]["ip"],
+                    "gen_puerto": perfil_activo["generador"]["puerto"],
+                    "osc_ip": perfil_activo["osciloscopio"]["ip"],
+                    "osc_puerto": perfil_activo["osciloscopio"]["puerto"],
+                    "amplitud": amplitud,
+                    "offset": offset,
+                    "forma_onda": forma_onda,
+                    "tiempo_estabilizacion": tiempo_estabilizacion,
+                    "tiempo_entre_mediciones": tiempo_entre_mediciones
+                }
+                if establecimiento:
+                    parametros_barrido["establecimiento"] = establecimiento
+                parametros_barrido.update(perfil=perfil_activo["nombre"], calibrar=calibrar, corregir=corregir)
+                if capturar_pantalla:
+                    parametros_barrido["capturar_pantalla"] = capturar_pantalla
+                if plan:
+                    parametros_barrido["plan"] = plan
+                id_barrido, error = servicio_barrido.iniciar_barrido(parametros_barrido)
                 
-                # Ejecutar en un hilo separado para no bloquear la UI
-                def ejecutar_en_segundo_plano():
-                    try:
-                        agregar_log("Iniciando proceso en segundo plano...")
-                        
-                        exito, error = ejecutar_secuencia_completa(
-                            gen_ip=perfil_activo["generador"]["ip"],
-                            gen_puerto=perfil_activo["generador"]["puerto"],
-                            osc_ip=perfil_activo["osciloscopio"]["ip"],
-                            osc_puerto=perfil_activo["osciloscopio"]["puerto"],
-                            amplitud=amplitud,
-                            offset=offset,  # Nuevo parámetro
-                            forma_onda=forma_onda,  # Nuevo parámetro
-                            tiempo_estabilizacion=tiempo_estabilizacion,
-                            tiempo_entre_mediciones=tiempo_entre_mediciones,
-                            progreso_callback=actualizar_progreso,
-                            funcion_verificar_detencion=debe_detenerse
-                        )
-                        
-                        if not exito and error:
-                            agregar_log(f"Error en la secuencia: {error}")
-                        
-                        # Indicar que el proceso ha terminado
-                        agregar_log("Proceso completado")
-                        guardar_estado_progreso("Detenido")
-                        actualizar_control(False, False)
-                    except Exception as e:
-                        # Capturar cualquier excepción
-                        mensaje_error = f"Error inesperado: {str(e)}"
-                        print(mensaje_error)  # Imprimir en consola para debug
-                        
-                        try:
-                            agregar_log(mensaje_error)
-                        except:
-                            pass
-                        
-                        guardar_estado_progreso("Detenido")
-                        actualizar_control(False, False)
-                
-                thread = threading.Thread(target=ejecutar_en_segundo_plano)
-                thread.daemon = True
-                thread.start()
-                
-                # Guardar ID del hilo
-                st.session_state['thread_id'] = thread.ident
-                
-                # Recargar la página para iniciar el proceso
-                time.sleep(0.1)
-                st.rerun()
+                if error:
+                    st.error(f"No se pudo iniciar la secuencia: {error}")
+                else:
+                    # Guardar ID del barrido y empezar con el refresco más rápido
+                    st.session_state['barrido_id'] = id_barrido
+                    st.session_state['intervalo_refresco'] = INTERVALOS_REFRESCO[0]
+                    
+                    # Recargar la página para mostrar el progreso
+                    time.sleep(0.1)
+                    st.rerun()
             
             # Detener proceso en curso
             if stop_button:
-                actualizar_control(None, True)  # Indicar que debe detenerse
-                guardar_estado_progreso("Deteniendo")
-                agregar_log("Deteniendo proceso... Espere mientras se cierran las conexiones")
-                time.sleep(1)  # Dar tiempo para detectar la señal de detención
+                # La cancelación interrumpe esperas y E/S; el panel muestra el cierre
+                servicio_barrido.detener()
                 st.rerun()
             
-            # Auto-refresco si está habilitado y hay un proceso en ejecución
-            if st.session_state['auto_refresh'] and control["ejecutando"]:
-                control_timestamp = datetime.strptime(control["ultimo_update"], "%Y-%m-%d %H:%M:%S")
-                now = datetime.now()
-                
-                # Si hubo una actualización en los últimos 2 segundos, refrescar
-                if (now - control_timestamp).total_seconds() < 2:
-                    time.sleep(0.5)  # Pequeña pausa para evitar recargas demasiado rápidas
-                    st.rerun()
-            
             # Botones rápidos para comandos simples
             st.markdown("---")
             st.subheader("Comandos Rápidos")
@@ -697,6 +981,9 @@ if st.session_state['menu_actual'] == "Automatizacion":
     with tabs[1]:
         st.header("Resultados de Ganancia")
         
+        # Veredicto PASA/FALLA de la última corrida
+        mostrar_veredictos()
+        
         # Mostrar tabla de resultados
         mostrar_tabla_ganancias()
         
@@ -706,7 +993,7 @@ if st.session_state['menu_actual'] == "Automatizacion":
         with col1:
             if st.button("Exportar a CSV", use_container_width=True):
                 # Crear DataFrame
-                df = pd.DataFrame(cargar_datos_ganancia().get("mediciones", []))
+                df = crear_dataframe_ganancias()
                 
                 if not df.empty:
                     # Crear archivo CSV
@@ -725,7 +1012,7 @@ if st.session_state['menu_actual'] == "Automatizacion":
         with col2:
             if st.button("Exportar a Excel", use_container_width=True):
                 # Crear DataFrame
-                df = pd.DataFrame(cargar_datos_ganancia().get("mediciones", []))
+                df = crear_dataframe_ganancias()
                 
                 if not df.empty:
                     try:
@@ -767,6 +1054,15 @@ elif st.session_state['menu_actual'] == "Manual":
     if not perfil_activo:
         st.error("No hay un perfil activo seleccionado.")
     else:
+        # Conexiones persistentes de esta sesión del navegador (se conectan al primer uso)
+        if leer_estado_progreso()["ejecutando"]:
+            st.warning("Hay un barrido automático en curso: el control manual no está disponible hasta que termine.")
+            sesion_osc, error_sesion_osc = None, "Barrido automático en curso"
+            sesion_gen, error_sesion_gen = None, "Barrido automático en curso"
+        else:
+            sesion_osc, error_sesion_osc = obtener_sesion_manual(Osciloscopio, perfil_activo["osciloscopio"])
+            sesion_gen, error_sesion_gen = obtener_sesion_manual(GeneradorFunciones, perfil_activo["generador"])
+        
         with tabs[0]:
             st.header("Control Manual del Osciloscopio")
             
@@ -775,6 +1071,7 @@ elif st.session_state['menu_actual'] == "Manual":
             - IP: {perfil_activo["osciloscopio"]["ip"]}
             - Puerto: {perfil_activo["osciloscopio"]["puerto"]}
             """)
+            mostrar_estado_sesion(sesion_osc, error_sesion_osc, perfil_activo["osciloscopio"], Osciloscopio, "osc")
             
             # Sección para comandos rápidos
             st.subheader("Comandos Rápidos")
@@ -783,72 +1080,44 @@ elif st.session_state['menu_actual'] == "Manual":
             
             with col1:
                 if st.button("Identificar", key="osc_id", use_container_width=True):
-                    osciloscopio = Osciloscopio(
-                        perfil_activo["osciloscopio"]["ip"],
-                        perfil_activo["osciloscopio"]["puerto"]
-                    )
+                    with st.spinner("Consultando..."):
+                        id_info, error = ejecutar_en_sesion(sesion_osc, error_sesion_osc, lambda osc: osc.identificar())
                     
-                    with st.spinner("Conectando..."):
-                        conectado, error = osciloscopio.conectar()
-                        if conectado:
-                            id_info, error = osciloscopio.identificar()
-                            osciloscopio.desconectar()
-                            
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success(f"Identificación: {id_info}")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success(f"Identificación: {id_info}")
             
             with col2:
                 if st.button("AUTOSET", key="osc_auto", use_container_width=True):
-                    osciloscopio = Osciloscopio(
-                        perfil_activo["osciloscopio"]["ip"],
-                        perfil_activo["osciloscopio"]["puerto"]
-                    )
-                    
                     with st.spinner("Configurando..."):
-                        conectado, error = osciloscopio.conectar()
-                        if conectado:
-                            osciloscopio.auto_setup()
-                            time.sleep(1)  # Reducido a 1s
-                            osciloscopio.desconectar()
-                            st.success("AUTOSET completado")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                        resultado, error = ejecutar_en_sesion(sesion_osc, error_sesion_osc, lambda osc: osc.auto_setup(), reintentar=False)
+                        time.sleep(1)  # Reducido a 1s
+                    
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success("AUTOSET completado")
             
             with col3:
                 if st.button("STOP", key="osc_stop", use_container_width=True):
-                    osciloscopio = Osciloscopio(
-                        perfil_activo["osciloscopio"]["ip"],
-                        perfil_activo["osciloscopio"]["puerto"]
-                    )
-                    
                     with st.spinner("Deteniendo..."):
-                        conectado, error = osciloscopio.conectar()
-                        if conectado:
-                            osciloscopio.detener()
-                            osciloscopio.desconectar()
-                            st.success("Adquisición detenida")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                        resultado, error = ejecutar_en_sesion(sesion_osc, error_sesion_osc, lambda osc: osc.detener(), reintentar=False)
+                    
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success("Adquisición detenida")
             
             with col4:
                 if st.button("RUN", key="osc_run", use_container_width=True):
-                    osciloscopio = Osciloscopio(
-                        perfil_activo["osciloscopio"]["ip"],
-                        perfil_activo["osciloscopio"]["puerto"]
-                    )
-                    
                     with st.spinner("Iniciando..."):
-                        conectado, error = osciloscopio.conectar()
-                        if conectado:
-                            osciloscopio.iniciar()
-                            osciloscopio.desconectar()
-                            st.success("Adquisición iniciada")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                        resultado, error = ejecutar_en_sesion(sesion_osc, error_sesion_osc, lambda osc: osc.iniciar(), reintentar=False)
+                    
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success("Adquisición iniciada")
             
             # Sección para configuración de canales
             st.subheader("Configuración de Canales")
@@ -883,24 +1152,22 @@ elif st.session_state['menu_actual'] == "Manual":
                         )
                     
                     if st.button(f"Aplicar Configuración CH{i}", key=f"apply_{i}", use_container_width=True):
-                        osciloscopio = Osciloscopio(
-                            perfil_activo["osciloscopio"]["ip"],
-                            perfil_activo["osciloscopio"]["puerto"]
-                        )
-                        
                         with st.spinner(f"Configurando CH{i}..."):
-                            conectado, error = osciloscopio.conectar()
-                            if conectado:
-                                osciloscopio.configurar_canal(
+                            resultado, error = ejecutar_en_sesion(
+                                sesion_osc, error_sesion_osc,
+                                lambda osc: osc.configurar_canal(
                                     canal=i,
                                     acoplamiento=acoplamiento,
                                     display=display,
                                     posicion=posicion
-                                )
-                                osciloscopio.desconectar()
-                                st.success(f"Configuración de CH{i} aplicada")
-                            else:
-                                st.error(f"Error de conexión: {error}")
+                                ),
+                                reintentar=False
+                            )
+                        
+                        if error:
+                            st.error(f"Error: {error}")
+                        else:
+                            st.success(f"Configuración de CH{i} aplicada")
             
             # Sección para mediciones
             st.subheader("Mediciones")
@@ -922,34 +1189,76 @@ elif st.session_state['menu_actual'] == "Manual":
                 )
             
             if st.button("Realizar Medición", key="btn_medir", use_container_width=True):
-                osciloscopio = Osciloscopio(
-                    perfil_activo["osciloscopio"]["ip"],
-                    perfil_activo["osciloscopio"]["puerto"]
-                )
-                
                 with st.spinner("Realizando medición..."):
-                    conectado, error = osciloscopio.conectar()
+                    valor, error = ejecutar_en_sesion(
+                        sesion_osc, error_sesion_osc,
+                        lambda osc: osc.obtener_medicion(canal=canal_medicion, tipo_medicion=tipo_medicion)
+                    )
+                
+                if error:
+                    st.error(f"Error al medir: {error}")
+                else:
+                    st.success(f"Resultado: {valor}")
+                    
+                    # Mostrar el resultado en una tabla
+                    st.table({
+                        "Canal": [canal_medicion],
+                        "Tipo": [tipo_medicion],
+                        "Valor": [f"{valor:.6f}" if isinstance(valor, (int, float)) else valor]
+                    })
+            
+            # Visor de forma de onda en vivo (sesión persistente con el osciloscopio)
+            st.subheader("Forma de Onda en Vivo")
+            
+            # numpy solo se carga al abrir esta pestaña
+            from modules.visor import VisorFormaOnda
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                canales_visor = st.multiselect("Canales:", options=[1, 2], default=[1, 2],
+                                               format_func=lambda c: f"CH{c}", key="visor_canales")
+            with col2:
+                cuadros_visor = st.slider("Cuadros por segundo:", min_value=0.5, max_value=10.0,
+                                          value=2.0, step=0.5, key="visor_fps")
+            with col3:
+                puntos_visor = st.number_input("Puntos por canal:", min_value=200, max_value=4000,
+                                               value=1000, step=100, key="visor_puntos",
+                                               help="Ancho del gráfico en píxeles; cada captura se reduce a este número de puntos antes de enviarse")
+            with col4:
+                metodo_visor = st.radio("Decimación:", options=["minmax", "lttb"], horizontal=True,
+                                        format_func=lambda m: "Mín/Máx" if m == "minmax" else "LTTB",
+                                        key="visor_metodo")
+            
+            visor = st.session_state.get('visor_forma_onda')
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Iniciar Visor", key="visor_iniciar", use_container_width=True,
+                             disabled=not canales_visor or sesion_osc is None):
+                    if visor is not None:
+                        visor.detener()
+                    visor = VisorFormaOnda(
+                        sesion_osc,
+                        canales=canales_visor,
+                        cuadros_por_segundo=cuadros_visor,
+                        puntos=int(puntos_visor),
+                        metodo=metodo_visor
+                    )
+                    with st.spinner("Conectando..."):
+                        conectado, error = visor.iniciar()
                     if conectado:
-                        valor, error = osciloscopio.obtener_medicion(
-                            canal=canal_medicion,
-                            tipo_medicion=tipo_medicion
-                        )
-                        osciloscopio.desconectar()
-                        
-                        if error:
-                            st.error(f"Error al medir: {error}")
-                        else:
-                            st.success(f"Resultado: {valor}")
-                            
-                            # Mostrar el resultado en una tabla
-                            df = pd.DataFrame({
-                                "Canal": [canal_medicion],
-                                "Tipo": [tipo_medicion],
-                                "Valor": [f"{valor:.6f}" if isinstance(valor, (int, float)) else valor]
-                            })
-                            st.table(df)
+                        st.session_state['visor_forma_onda'] = visor
                     else:
+                        visor = None
                         st.error(f"Error de conexión: {error}")
+            with col2:
+                if st.button("Detener Visor", key="visor_detener", use_container_width=True,
+                             disabled=visor is None or not visor.activo):
+                    visor.detener()
+            
+            # El gráfico se refresca en un fragmento al ritmo de captura
+            intervalo_visor = 1.0 / visor.cuadros_por_segundo if visor is not None and visor.activo else None
+            st.fragment(panel_forma_onda, run_every=intervalo_visor)()
             
             # Sección para comandos manuales
             st.subheader("Comandos SCPI Manuales")
@@ -967,33 +1276,20 @@ elif st.session_state['menu_actual'] == "Manual":
             )
             
             if st.button("Enviar Comando", key="btn_cmd_osc", use_container_width=True):
-                osciloscopio = Osciloscopio(
-                    perfil_activo["osciloscopio"]["ip"],
-                    perfil_activo["osciloscopio"]["puerto"]
-                )
-                
                 with st.spinner(f"Enviando comando: {comando}"):
-                    conectado, error = osciloscopio.conectar()
-                    if conectado:
-                        if tipo_comando == "Query (espera respuesta)":
-                            respuesta, error = osciloscopio.enviar_query(comando)
-                            osciloscopio.desconectar()
-                            
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success("Comando enviado exitosamente")
-                                st.code(respuesta)
-                        else:
-                            resultado, error = osciloscopio.enviar_comando(comando)
-                            osciloscopio.desconectar()
-                            
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success("Comando enviado exitosamente")
+                    if tipo_comando == "Query (espera respuesta)":
+                        respuesta, error = ejecutar_en_sesion(sesion_osc, error_sesion_osc, lambda equipo: equipo.enviar_query(comando))
                     else:
-                        st.error(f"Error de conexión: {error}")
+                        respuesta, error = ejecutar_en_sesion(sesion_osc, error_sesion_osc, lambda equipo: equipo.enviar_comando(comando), reintentar=False)
+                
+                if error:
+                    st.error(f"Error: {error}")
+                else:
+                    st.success("Comando enviado exitosamente")
+                    if tipo_comando == "Query (espera respuesta)":
+                        st.code(respuesta)
+            
+            mostrar_script_scpi(sesion_osc, error_sesion_osc, "osc")
         
         with tabs[1]:
             st.header("Control Manual del Generador de Funciones")
@@ -1003,6 +1299,7 @@ elif st.session_state['menu_actual'] == "Manual":
             - IP: {perfil_activo["generador"]["ip"]}
             - Puerto: {perfil_activo["generador"]["puerto"]}
             """)
+            mostrar_estado_sesion(sesion_gen, error_sesion_gen, perfil_activo["generador"], GeneradorFunciones, "gen")
             
             # Sección para comandos rápidos
             st.subheader("Comandos Rápidos")
@@ -1011,72 +1308,44 @@ elif st.session_state['menu_actual'] == "Manual":
             
             with col1:
                 if st.button("Identificar", key="gen_id", use_container_width=True):
-                    generador = GeneradorFunciones(
-                        perfil_activo["generador"]["ip"],
-                        perfil_activo["generador"]["puerto"]
-                    )
+                    with st.spinner("Consultando..."):
+                        id_info, error = ejecutar_en_sesion(sesion_gen, error_sesion_gen, lambda gen: gen.identificar())
                     
-                    with st.spinner("Conectando..."):
-                        conectado, error = generador.conectar()
-                        if conectado:
-                            id_info, error = generador.identificar()
-                            generador.desconectar()
-                            
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success(f"Identificación: {id_info}")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success(f"Identificación: {id_info}")
             
             with col2:
                 if st.button("RESET", key="gen_reset", use_container_width=True):
-                    generador = GeneradorFunciones(
-                        perfil_activo["generador"]["ip"],
-                        perfil_activo["generador"]["puerto"]
-                    )
-                    
                     with st.spinner("Reseteando..."):
-                        conectado, error = generador.conectar()
-                        if conectado:
-                            generador.reset()
-                            time.sleep(0.5)  # Reducido a 0.5s
-                            generador.desconectar()
-                            st.success("RESET completado")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                        resultado, error = ejecutar_en_sesion(sesion_gen, error_sesion_gen, lambda gen: gen.reset(), reintentar=False)
+                        time.sleep(0.5)  # Reducido a 0.5s
+                    
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success("RESET completado")
             
             with col3:
                 if st.button("Activar Salida", key="gen_on", use_container_width=True):
-                    generador = GeneradorFunciones(
-                        perfil_activo["generador"]["ip"],
-                        perfil_activo["generador"]["puerto"]
-                    )
-                    
                     with st.spinner("Activando salida..."):
-                        conectado, error = generador.conectar()
-                        if conectado:
-                            generador.activar_salida(1)
-                            generador.desconectar()
-                            st.success("Salida activada")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                        resultado, error = ejecutar_en_sesion(sesion_gen, error_sesion_gen, lambda gen: gen.activar_salida(1), reintentar=False)
+                    
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success("Salida activada")
             
             with col4:
                 if st.button("Desactivar Salida", key="gen_off", use_container_width=True):
-                    generador = GeneradorFunciones(
-                        perfil_activo["generador"]["ip"],
-                        perfil_activo["generador"]["puerto"]
-                    )
-                    
                     with st.spinner("Desactivando salida..."):
-                        conectado, error = generador.conectar()
-                        if conectado:
-                            generador.desactivar_salida(1)
-                            generador.desconectar()
-                            st.success("Salida desactivada")
-                        else:
-                            st.error(f"Error de conexión: {error}")
+                        resultado, error = ejecutar_en_sesion(sesion_gen, error_sesion_gen, lambda gen: gen.desactivar_salida(1), reintentar=False)
+                    
+                    if error:
+                        st.error(f"Error: {error}")
+                    else:
+                        st.success("Salida desactivada")
             
             # Sección para configuración de señal
             st.subheader("Configuración de Señal")
@@ -1134,33 +1403,26 @@ elif st.session_state['menu_actual'] == "Manual":
                 )
             
             if submit_button:
-                generador = GeneradorFunciones(
-                    perfil_activo["generador"]["ip"],
-                    perfil_activo["generador"]["puerto"]
-                )
-                
                 with st.spinner("Configurando señal..."):
-                    conectado, error = generador.conectar()
-                    if conectado:
-                        config, error = generador.configuracion_completa(
+                    config, error = ejecutar_en_sesion(
+                        sesion_gen, error_sesion_gen,
+                        lambda gen: gen.configuracion_completa(
                             canal=int(canal),
                             forma=forma_onda,
                             frecuencia=frecuencia,
                             amplitud=amplitud,
                             offset=offset
-                        )
-                        
-                        if error:
-                            st.error(f"Error al configurar: {error}")
-                        else:
-                            st.success("Configuración aplicada")
-                            
-                            # Mostrar configuración actual
-                            st.json(config)
-                        
-                        generador.desconectar()
-                    else:
-                        st.error(f"Error de conexión: {error}")
+                        ),
+                        reintentar=False
+                    )
+                
+                if error:
+                    st.error(f"Error al configurar: {error}")
+                else:
+                    st.success("Configuración aplicada")
+                    
+                    # Mostrar configuración actual
+                    st.json(config)
             
             # Sección para comandos manuales
             st.subheader("Comandos SCPI Manuales")
@@ -1178,101 +1440,77 @@ elif st.session_state['menu_actual'] == "Manual":
             )
             
             if st.button("Enviar Comando", key="btn_cmd_gen", use_container_width=True):
-                generador = GeneradorFunciones(
-                    perfil_activo["generador"]["ip"],
-                    perfil_activo["generador"]["puerto"]
-                )
-                
                 with st.spinner(f"Enviando comando: {comando}"):
-                    conectado, error = generador.conectar()
-                    if conectado:
-                        if tipo_comando == "Query (espera respuesta)":
-                            respuesta, error = generador.enviar_query(comando)
-                            generador.desconectar()
-                            
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success("Comando enviado exitosamente")
-                                st.code(respuesta)
-                        else:
-                            resultado, error = generador.enviar_comando(comando)
-                            generador.desconectar()
-                            
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success("Comando enviado exitosamente")
+                    if tipo_comando == "Query (espera respuesta)":
+                        respuesta, error = ejecutar_en_sesion(sesion_gen, error_sesion_gen, lambda equipo: equipo.enviar_query(comando))
                     else:
-                        st.error(f"Error de conexión: {error}")
+                        respuesta, error = ejecutar_en_sesion(sesion_gen, error_sesion_gen, lambda equipo: equipo.enviar_comando(comando), reintentar=False)
+                
+                if error:
+                    st.error(f"Error: {error}")
+                else:
+                    st.success("Comando enviado exitosamente")
+                    if tipo_comando == "Query (espera respuesta)":
+                        st.code(respuesta)
+            
+            mostrar_script_scpi(sesion_gen, error_sesion_gen, "gen")
 
 elif st.session_state['menu_actual'] == "Graficas":
     st.title("Gráficas de Resultados")
     
-    # Verificar si hay datos disponibles
-    datos = cargar_datos_ganancia()
-    if not "mediciones" in datos or not datos["mediciones"]:
+    from modules.corridas import ultimas_corridas
+    from modules.analisis import analizar_dataframe, analizar_lote
+    
+    # Origen de los datos: todas las mediciones guardadas o una de las últimas
+    # corridas (solo se lee el final del historial, que puede ser muy largo)
+    corridas = ultimas_corridas(100)
+    opciones_origen = ["Todas las mediciones"] + [
+        f"{c['inicio']} · {c.get('plan') or 'barrido'} · {len(c['mediciones'])} puntos ({c['estado']})"
+        for c in corridas
+    ]
+    origen = st.selectbox("Datos a graficar", options=range(len(opciones_origen)),
+                          format_func=lambda i: opciones_origen[i])
+    corrida = corridas[origen - 1] if origen else None
+    
+    # DataFrame en caché o de la corrida, ordenado por frecuencia
+    df = crear_dataframe_ganancias() if corrida is None else dataframe_mediciones(corrida["mediciones"])
+    if df.empty:
         st.warning("No hay datos de mediciones disponibles para graficar.")
     else:
         try:
-            # Crear DataFrame
-            df = pd.DataFrame(datos["mediciones"])
-            
-            # Ordenar por frecuencia
-            if "frecuencia" in df.columns:
-                df = df.sort_values("frecuencia")
-            
-            # Calcular ganancia en dB si no existe
-            if "ganancia_real_db" not in df.columns:
-                import numpy as np
-                df["ganancia_real_db"] = 20 * np.log10(
-                    df["ganancia_real"].apply(lambda x: max(x, 1e-10))  # Evitar log(0)
-                )
+            import plotly.graph_objects as go
             
-            # Crear gráfico de Bode
-            st.subheader("Diagrama de Bode - Respuesta en Frecuencia")
+            # Calcular ganancias en dB si no existen (evitando log(0))
+            agregar_columnas_db(df)
             
-            fig = go.Figure()
+            # Métricas guardadas con la corrida o calculadas sobre todas las mediciones
+            metricas = corrida.get("metricas") if corrida else analizar_dataframe(df)
             
-            fig.add_trace(go.Scatter(
-                x=df["frecuencia"],
-                y=df["ganancia_real_db"],
-                mode="lines+markers",
-                name="Ganancia (dB)",
-                line=dict(color="blue", width=2),
-                marker=dict(size=8, color="blue")
-            ))
-            
-            fig.update_layout(
-                xaxis_title="Frecuencia (Hz)",
-                yaxis_title="Ganancia (dB)",
-                xaxis_type="log",  # Escala logarítmica en X
-                xaxis=dict(
-                    showline=True,
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor="lightgray",
-                    showticklabels=True,
-                    ticks="outside"
-                ),
-                yaxis=dict(
-                    showline=True,
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor="lightgray",
-                    showticklabels=True,
-                    ticks="outside"
-                ),
-                plot_bgcolor="white",
-                legend=dict(
-                    yanchor="top",
-                    y=0.99,
-                    xanchor="left",
-                    x=0.01
-                )
-            )
+            # Crear gráfico de Bode
+            st.subheader("Diagrama de Bode - Respuesta en Frecuencia")
             
-            st.plotly_chart(fig, use_container_width=True)
+            col_grafico, col_metricas = st.columns([3, 1])
+            with col_grafico:
+                fig = generar_grafico_bode(df, metricas)
+                fig.update_layout(title=None)
+                st.plotly_chart(fig, use_container_width=True)
+            with col_metricas:
+                mostrar_metricas_bode(metricas)
+            
+            # Comparación de corridas: todas se analizan en un solo cálculo
+            if len(corridas) > 1:
+                with st.expander(f"Comparar corridas (últimas {len(corridas)})"):
+                    import pandas as pd
+                    
+                    curvas = []
+                    for c in corridas:
+                        df_corrida = agregar_columnas_db(dataframe_mediciones(c["mediciones"]))
+                        curvas.append((df_corrida["frecuencia"].to_numpy(), df_corrida["ganancia_real_db"].to_numpy()))
+                    filas = []
+                    for c, m in zip(corridas, analizar_lote(curvas, ajustar=False)):
+                        filas.append({"inicio": c["inicio"], "plan": c.get("plan"), "estado": c["estado"],
+                                      "puntos": len(c["mediciones"]), **m})
+                    st.dataframe(pd.DataFrame(filas), hide_index=True)
             
             # Selector de visualización
             st.subheader("Opciones de Visualización")
@@ -1292,21 +1530,9 @@ elif st.session_state['menu_actual'] == "Graficas":
                 y_data = df["ganancia_real_db"]
                 titulo = "Ganancia Real (dB)"
             elif tipo_ganancia == "Ganancia Pico a Pico":
-                # Calcular en dB si no existe
-                if "ganancia_pk2pk_db" not in df.columns:
-                    import numpy as np
-                    df["ganancia_pk2pk_db"] = 20 * np.log10(df["ganancia_pk2pk"].apply(
-                        lambda x: max(x, 1e-10)  # Evitar log(0)
-                    ))
                 y_data = df["ganancia_pk2pk_db"]
                 titulo = "Ganancia Pico a Pico (dB)"
             else:  # Ganancia Amplitud
-                # Calcular en dB si no existe
-                if "ganancia_amplitud_db" not in df.columns:
-                    import numpy as np
-                    df["ganancia_amplitud_db"] = 20 * np.log10(df["ganancia_amplitud"].apply(
-                        lambda x: max(x, 1e-10)  # Evitar log(0)
-                    ))
                 y_data = df["ganancia_amplitud_db"]
                 titulo = "Ganancia Amplitud (dB)"
             
@@ -1350,6 +1576,40 @@ elif st.session_state['menu_actual'] == "Graficas":
                 st.dataframe(df)
         except Exception as e:
             st.error(f"Error al generar gráficos: {str(e)}")
+    
+    # Control estadístico: límites y cartas desde los agregados (sin releer el historial)
+    from modules.spc import cargar_spc, limites_control, reconstruir_spc, clave_frecuencia
+    
+    st.subheader("Control Estadístico del Proceso")
+    datos_spc = cargar_spc()
+    limites = limites_control(datos_spc)
+    if not limites:
+        st.info("Aún no hay agregados SPC: se crean con cada corrida registrada.")
+    else:
+        st.caption(f"{datos_spc['corridas']} corridas · {len(limites)} frecuencias · "
+                   f"actualizado {datos_spc['actualizado']}")
+        st.plotly_chart(generar_grafico_spc(limites), use_container_width=True)
+        
+        indice = st.selectbox("Frecuencia para la carta de control:", options=range(len(limites)),
+                              index=len(limites) // 2,
+                              format_func=lambda i: f"{limites[i]['frecuencia']:.6g} Hz (n={limites[i]['n']})")
+        fila = limites[indice]
+        recientes = datos_spc["frecuencias"][clave_frecuencia(fila["frecuencia"])]["recientes"]
+        col_carta, col_limites = st.columns([3, 1])
+        with col_carta:
+            st.plotly_chart(generar_carta_control(fila, recientes), use_container_width=True)
+        with col_limites:
+            st.metric("Media", f"{fila['media']:.2f} dB")
+            st.metric("σ", f"{fila['sigma']:.3f} dB")
+            st.metric("LCL / UCL", f"{fila['lcl']:.2f} / {fila['ucl']:.2f}")
+            st.metric("p5 / p50 / p95", f"{fila['p5']:.2f} / {fila['p50']:.2f} / {fila['p95']:.2f}")
+    
+    if st.button("Reconstruir agregados desde el historial", help="Recorre todas las corridas registradas"):
+        with st.spinner("Recalculando agregados..."):
+            if reconstruir_spc():
+                st.rerun()
+            else:
+                st.error("No se pudieron guardar los agregados SPC")
 
 elif st.session_state['menu_actual'] == "Configuracion":
     st.title("Configuración de Perfiles")
@@ -1363,8 +1623,8 @@ elif st.session_state['menu_actual'] == "Configuracion":
         st.subheader("Perfiles Configurados")
         
         if perfiles["perfiles"]:
-            # Crear DataFrame para mostrar los perfiles
-            perfiles_df = pd.DataFrame([
+            # Tabla de perfiles
+            perfiles_tabla = [
                 {
                     "Nombre": p["nombre"],
                     "Osciloscopio IP": p["osciloscopio"]["ip"],
@@ -1373,9 +1633,9 @@ elif st.session_state['menu_actual'] == "Configuracion":
                     "Generador Puerto": p["generador"]["puerto"],
                     "Estado": "Activo" if p["activo"] else "Inactivo"
                 } for p in perfiles["perfiles"]
-            ])
+            ]
             
-            st.dataframe(perfiles_df, use_container_width=True)
+            st.dataframe(perfiles_tabla, use_container_width=True)
             
             # Seleccionar perfil para editar
             perfil_names = [p["nombre"] for p in perfiles["perfiles"]]
@@ -1549,6 +1809,51 @@ elif st.session_state['menu_actual'] == "Configuracion":
                     else:
                         st.error("Error al guardar los cambios")
         
+        # Durante un barrido no se abren conexiones de prueba con los equipos
+        barrido_en_curso = leer_estado_progreso()["ejecutando"]
+        aviso_barrido = "Hay un barrido automático en curso: disponible cuando termine."
+        
+        # Búsqueda de equipos en la red local
+        st.subheader("Buscar Equipos en la Red")
+        from modules.descubrimiento import red_local, escanear_red, perfiles_desde_equipos
+
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            subred = st.text_input(
+                "Subred:",
+                value=red_local() or "172.118.1.0/24",
+                help="Notación CIDR; se prueban los puertos 3000 (osciloscopios) y 1026 (generadores)"
+            )
+        with col2:
+            actualizar = st.checkbox("Ignorar caché", value=False,
+                                     help="Repetir la búsqueda aunque haya un resultado reciente")
+
+        if barrido_en_curso:
+            st.caption(aviso_barrido)
+        if st.button("Buscar Equipos", use_container_width=True, disabled=barrido_en_curso):
+            with st.spinner(f"Buscando equipos en {subred}..."):
+                encontrados, error = escanear_red(subred, usar_cache=not actualizar)
+            if error:
+                st.error(error)
+            else:
+                st.session_state['equipos_descubiertos'] = encontrados
+
+        encontrados = st.session_state.get('equipos_descubiertos')
+        if encontrados is not None:
+            if not encontrados:
+                st.info("No se encontraron equipos")
+            else:
+                st.dataframe(encontrados, use_container_width=True, hide_index=True)
+                nuevos = perfiles_desde_equipos(encontrados, perfiles["perfiles"])
+                if nuevos and st.button(f"Crear {len(nuevos)} perfil(es) con los equipos encontrados",
+                                        use_container_width=True):
+                    perfiles["perfiles"].extend(nuevos)
+                    if guardar_perfiles_red(perfiles):
+                        st.success(f"Perfiles añadidos: {', '.join(p['nombre'] for p in nuevos)}")
+                        st.rerun()
+                    else:
+                        st.error("Error al guardar los cambios")
+
         # Botón para probar conexión
         st.subheader("Probar Conexión")
         
@@ -1605,6 +1910,21 @@ elif st.session_state['menu_actual'] == "Configuracion":
                             st.error(f"Error de conexión: {error}")
                 else:
                     st.error("No hay un perfil activo seleccionado")
+        
+        # Todos los equipos de todos los perfiles a la vez
+        if barrido_en_curso:
+            st.caption(aviso_barrido)
+        if st.button("Probar Conexión de Todos los Perfiles", use_container_width=True, disabled=barrido_en_curso):
+            from modules.conexiones import probar_perfiles
+            
+            with st.spinner("Probando conexiones..."):
+                filas = probar_perfiles(perfiles["perfiles"])
+            correctas = sum(1 for fila in filas if fila["conectado"])
+            if correctas == len(filas):
+                st.success(f"Los {len(filas)} equipos respondieron")
+            else:
+                st.warning(f"{len(filas) - correctas} de {len(filas)} equipos sin respuesta")
+            st.dataframe(filas, use_container_width=True, hide_index=True)
     
     with tabs[1]:
         st.header("Configuración de Frecuencias")
@@ -1617,9 +1937,8 @@ elif st.session_state['menu_actual'] == "Configuracion":
         st.subheader("Frecuencias Configuradas")
         
         if frecuencias:
-            # Convertir a DataFrame para mejor visualización
-            df_frecuencias = pd.DataFrame({"Frecuencia (Hz)": frecuencias})
-            st.dataframe(df_frecuencias, use_container_width=True)
+            # Mostrar como tabla
+            st.dataframe({"Frecuencia (Hz)": list(frecuencias)}, use_container_width=True)
             
             # Información sobre la configuración
             st.info(f"""
@@ -1677,33 +1996,16 @@ elif st.session_state['menu_actual'] == "Configuracion":
             )
             
             if submit_button:
-                import numpy as np
-                
                 if freq_min >= freq_max:
                     st.error("La frecuencia mínima debe ser menor que la máxima")
                 else:
                     try:
-                        # Generar frecuencias según la escala seleccionada
-                        if escala == "Logarítmica":
-                            nuevas_frecuencias = np.logspace(
-                                np.log10(freq_min),
-                                np.log10(freq_max),
-                                num_puntos
-                            ).tolist()
-                        else:  # Lineal
-                            nuevas_frecuencias = np.linspace(
-                                freq_min,
-                                freq_max,
-                                num_puntos
-                            ).tolist()
-                        
-                        # Redondear a 2 decimales
-                        nuevas_frecuencias = [round(f, 2) for f in nuevas_frecuencias]
+                        # Generar frecuencias según la escala seleccionada (redondeadas a 2 decimales)
+                        nuevas_frecuencias = generar_frecuencias(freq_min, freq_max, num_puntos, escala)
                         
                         # Guardar en archivo
-                        os.makedirs("data", exist_ok=True)  # Asegurar que exista el directorio
-                        with open(os.path.join("data", "frecuencias.json"), "w") as f:
-                            json.dump({"frecuencias": nuevas_frecuencias}, f, indent=4)
+                        if not guardar_frecuencias(nuevas_frecuencias):
+                            raise IOError("No se pudo escribir frecuencias.json")
                         
                         st.success(f"Se generaron {num_puntos} frecuencias correctamente")
                         # Recargar página
@@ -1720,9 +2022,8 @@ elif st.session_state['menu_actual'] == "Configuracion":
             # Exportar a CSV
             if st.button("Exportar a CSV", key="export_freq", use_container_width=True):
                 if frecuencias:
-                    # Crear CSV
-                    df_export = pd.DataFrame({"Frecuencia": frecuencias})
-                    csv = df_export.to_csv(index=False)
+                    # Crear CSV (una columna, no hace falta pandas)
+                    csv = "Frecuencia\n" + "".join(f"{f}\n" for f in frecuencias)
                     
                     # Botón de descarga
                     st.download_button(
@@ -1741,6 +2042,7 @@ elif st.session_state['menu_actual'] == "Configuracion":
             if uploaded_file is not None:
                 try:
                     # Leer CSV
+                    import pandas as pd
                     df_import = pd.read_csv(uploaded_file)
                     
                     # Verificar formato
@@ -1748,9 +2050,8 @@ elif st.session_state['menu_actual'] == "Configuracion":
                         frecuencias_importadas = df_import["Frecuencia"].tolist()
                         
                         # Guardar en archivo
-                        os.makedirs("data", exist_ok=True)  # Asegurar que exista el directorio
-                        with open(os.path.join("data", "frecuencias.json"), "w") as f:
-                            json.dump({"frecuencias": frecuencias_importadas}, f, indent=4)
+                        if not guardar_frecuencias(frecuencias_importadas):
+                            raise IOError("No se pudo escribir frecuencias.json")
                         
                         st.success(f"Se importaron {len(frecuencias_importadas)} frecuencias correctamente")
                         # Recargar página
@@ -0,0 +1,155 @@
+# Archivo benchmarks/reproduccion_scpi.py - Reproducción de sesiones SCPI grabadas
+#
+# Reproduce sin equipos una sesión grabada con `python -m modules.barrido
+# --grabar` a través del mismo motor (ejecutar_secuencia_completa) y comprueba
+# que las mediciones salen iguales que en la corrida real: sirve de prueba de
+# regresión del motor y de los analizadores, y de benchmark reproducible.
+# Uso, desde proyectoInstrumentos/:
+#
+#   python benchmarks/reproduccion_scpi.py data/sesion.jsonl.gz                 # sin esperas
+#   python benchmarks/reproduccion_scpi.py data/sesion.jsonl.gz --velocidad grabada
+#   python benchmarks/reproduccion_scpi.py data/sesion.jsonl.gz --repeticiones 10
+#
+# Cada repetición se ejecuta en un directorio temporal: las corridas,
+# calibraciones y referencias de data/ no se tocan.
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+# Campos de cada medición que dependen del tiempo real transcurrido (el
+# establecimiento adaptativo con confirmación mide su propia espera)
+CAMPOS_IGNORADOS = ("establecimiento_s",)
+
+def comparar_mediciones(grabadas, reproducidas, tolerancia=1e-9):
+    """
+    Compara las mediciones de la corrida real con las de la reproducción
+
+    Returns:
+        list: Diferencias encontradas (vacía si coinciden)
+    """
+    diferencias = []
+    if len(grabadas) != len(reproducidas):
+        diferencias.append(f"{len(reproducidas)} mediciones en lugar de {len(grabadas)}")
+    for i, (grabada, reproducida) in enumerate(zip(grabadas, reproducidas)):
+        for campo, esperado in grabada.items():
+            if campo in CAMPOS_IGNORADOS:
+                continue
+            obtenido = reproducida.get(campo)
+            # Los no finitos se grabaron como null
+            if isinstance(obtenido, float) and not math.isfinite(obtenido):
+                obtenido = None
+            if isinstance(esperado, (int, float)) and isinstance(obtenido, (int, float)) \
+                    and not isinstance(esperado, bool):
+                iguales = math.isclose(esperado, obtenido, rel_tol=tolerancia, abs_tol=tolerancia)
+            else:
+                iguales = esperado == obtenido
+            if not iguales:
+                diferencias.append(f"punto {i} ({grabada.get('frecuencia')} Hz), {campo}: "
+                                   f"grabado {esperado!r}, reproducido {obtenido!r}")
+    return diferencias
+
+def reproducir(archivo, velocidad="maxima"):
+    """
+    Reproduce una grabación una vez
+
+    Returns:
+        dict: duracion (s), operaciones, pendientes (operaciones grabadas no
+            pedidas), desincronizacion, exito, error y mediciones
+    """
+    from modules.config import invalidar_cache
+    from modules.grabacion import Reproductor, activar_transporte, desactivar_transporte
+    from modules.automatizacion import ejecutar_secuencia_completa
+
+    reproductor = Reproductor(archivo, velocidad=velocidad)
+    meta = reproductor.meta
+    mediciones = []
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="reproduccion-") as directorio:
+        os.chdir(directorio)
+        try:
+            os.makedirs("data")
+            if meta.get("calibracion"):
+                # La calibración aplicada al grabar se aplica igual aunque ya haya caducado
+                calibracion = dict(meta["calibracion"])
+                calibracion["caduca"] = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+                with open(os.path.join("data", "calibraciones.json"), "w") as f:
+                    json.dump({"calibraciones": [calibracion]}, f)
+            invalidar_cache()
+
+            activar_transporte(reproductor)
+            inicio = time.perf_counter()
+            # Los mensajes del motor no interesan aquí
+            with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+                exito, error = ejecutar_secuencia_completa(
+                    meta["generador"]["ip"], meta["generador"]["puerto"],
+                    meta["osciloscopio"]["ip"], meta["osciloscopio"]["puerto"],
+                    progreso_callback=lambda *a, **k: None, resultado_callback=mediciones.append,
+                    token=reproductor.token(), plan=meta["plan"],
+                    referencia=meta.get("referencia"),
+                    perfil=meta.get("perfil"), calibrar=meta.get("calibrar", False),
+                    corregir=meta.get("corregir", True), capturar_pantalla=meta.get("capturar_pantalla")
+                )
+            duracion = time.perf_counter() - inicio
+        finally:
+            desactivar_transporte()
+            invalidar_cache()
+            os.chdir(anterior)
+
+    return {"duracion": duracion, "operaciones": reproductor.operaciones, "pendientes": reproductor.pendientes,
+            "desincronizacion": reproductor.desincronizacion, "exito": exito, "error": error, "mediciones": mediciones}
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducción de sesiones SCPI grabadas (regresión y benchmark)")
+    parser.add_argument("grabacion", help="Archivo de python -m modules.barrido --grabar")
+    parser.add_argument("--velocidad", choices=("maxima", "grabada"), default="maxima")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=1e-9, help="Diferencia relativa admitida")
+    args = parser.parse_args()
+
+    from modules.grabacion import cargar_grabacion
+    meta = cargar_grabacion(args.grabacion)["meta"]
+    if "plan" not in meta:
+        print(f"{args.grabacion} no es una grabación de un barrido (falta el plan)")
+        return 2
+
+    duraciones = []
+    fallos = 0
+    for repeticion in range(args.repeticiones):
+        resultado = reproducir(args.grabacion, args.velocidad)
+        duraciones.append(resultado["duracion"])
+        diferencias = comparar_mediciones(meta.get("mediciones", []), resultado["mediciones"], args.tolerancia)
+        if resultado["error"] != meta.get("error"):
+            diferencias.insert(0, f"error {resultado['error']!r} (grabado {meta.get('error')!r})")
+        if resultado["desincronizacion"]:
+            diferencias.insert(0, f"desincronización: {resultado['desincronizacion']}")
+        if resultado["pendientes"]:
+            diferencias.append(f"{resultado['pendientes']} operaciones grabadas sin reproducir")
+
+        linea = (f"Repetición {repeticion + 1}: {resultado['duracion'] * 1000:.1f} ms, "
+                 f"{resultado['operaciones']} operaciones "
+                 f"({resultado['operaciones'] / resultado['duracion']:.0f} op/s), "
+                 f"{len(resultado['mediciones'])} mediciones")
+        print(linea + (" - coinciden" if not diferencias else " - DIFIEREN"))
+        for diferencia in diferencias[:10]:
+            print(f"    {diferencia}")
+        fallos += bool(diferencias)
+
+    duraciones.sort()
+    print(f"Mínima {duraciones[0] * 1000:.1f} ms, mediana {duraciones[len(duraciones) // 2] * 1000:.1f} ms "
+          f"({args.velocidad})")
+
+    # Código de salida distinto de cero si alguna repetición no reproduce la corrida
+    return 1 if fallos else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
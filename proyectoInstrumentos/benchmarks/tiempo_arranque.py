@@ -0,0 +1,143 @@
+# Archivo benchmarks/tiempo_arranque.py - Auditoría del tiempo de arranque
+#
+# Mide con `python -X importtime` lo que cuesta importar cada punto de entrada
+# en un intérprete nuevo (arranque en frío). Uso, desde proyectoInstrumentos/:
+#
+#   python benchmarks/tiempo_arranque.py                  # medir y mostrar
+#   python benchmarks/tiempo_arranque.py --guardar        # guardar línea base
+#   python benchmarks/tiempo_arranque.py --comparar       # comparar con la línea base
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVO_LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_arranque.json")
+
+# Bibliotecas que un barrido sin interfaz nunca debería cargar
+BIBLIOTECAS_GRAFICAS = ("matplotlib", "plotly", "streamlit", "pandas")
+
+def imports_de_nivel_superior(archivo):
+    """
+    Extrae las sentencias import de nivel superior de un script
+
+    Permite medir lo que cuesta arrancar app.py sin ejecutar la interfaz.
+    """
+    with open(archivo, "r", encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    sentencias = [n for n in arbol.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(n) for n in sentencias)
+
+# Escenarios: nombre -> (código a ejecutar, bibliotecas prohibidas)
+def escenarios():
+    return {
+        "app.py (imports de nivel superior)": (
+            imports_de_nivel_superior(os.path.join(DIRECTORIO_PROYECTO, "app.py")), ()
+        ),
+        "modules.config": ("import modules.config", BIBLIOTECAS_GRAFICAS),
+        "modules.automatizacion (barrido sin interfaz)": (
+            "import modules.automatizacion", BIBLIOTECAS_GRAFICAS
+        ),
+        "modules.visualizacion": ("import modules.visualizacion", ()),
+        "automatizacion_integrada.py": (
+            "import automatizacion_integrada", ("matplotlib",)
+        ),
+    }
+
+def medir(codigo, prohibidas=(), repeticiones=3):
+    """
+    Mide el tiempo acumulado de importación en un intérprete nuevo
+
+    Args:
+        codigo: Código Python con los imports a medir
+        prohibidas: Bibliotecas que no deben quedar cargadas
+        repeticiones: Número de ejecuciones (se toma la mínima)
+
+    Returns:
+        dict: Tiempo total (ms), módulos más costosos y bibliotecas prohibidas cargadas
+    """
+    comprobacion = (
+        "\nimport sys\n"
+        f"print(','.join(m for m in {tuple(prohibidas)!r} if m in sys.modules))"
+    )
+    entorno = dict(os.environ)
+    entorno["PYTHONPATH"] = os.pathsep.join(
+        [DIRECTORIO_PROYECTO, os.path.dirname(DIRECTORIO_PROYECTO), entorno.get("PYTHONPATH", "")]
+    )
+
+    mejor = None
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", codigo + comprobacion],
+            cwd=DIRECTORIO_PROYECTO, env=entorno, capture_output=True, text=True
+        )
+        if proceso.returncode != 0:
+            return {"error": proceso.stderr.strip().splitlines()[-1] if proceso.stderr else "error"}
+
+        # Formato de cada línea: "import time: self [us] | cumulative | imported package"
+        paquetes = {}
+        for linea in proceso.stderr.splitlines():
+            if not linea.startswith("import time:") or "cumulative" in linea:
+                continue
+            partes = linea[len("import time:"):].split("|")
+            acumulado = int(partes[1])
+            nombre = partes[2][1:]
+            # Solo los imports de primer nivel (sin sangría) suman al total
+            if not nombre.startswith(" "):
+                paquetes[nombre.strip()] = acumulado / 1000.0
+
+        total = sum(paquetes.values())
+        if mejor is None or total < mejor["total_ms"]:
+            mejor = {
+                "total_ms": round(total, 1),
+                "mas_costosos": sorted(
+                    ({"modulo": k, "ms": round(v, 1)} for k, v in paquetes.items()),
+                    key=lambda x: -x["ms"]
+                )[:8],
+                "prohibidas_cargadas": [m for m in proceso.stdout.strip().split(",") if m],
+            }
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description="Auditoría de tiempo de arranque (python -X importtime)")
+    parser.add_argument("--guardar", action="store_true", help="Guardar los resultados como línea base")
+    parser.add_argument("--comparar", action="store_true", help="Comparar con la línea base guardada")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    resultados = {}
+    for nombre, (codigo, prohibidas) in escenarios().items():
+        resultados[nombre] = medir(codigo, prohibidas, args.repeticiones)
+
+    linea_base = {}
+    if args.comparar and os.path.exists(ARCHIVO_LINEA_BASE):
+        with open(ARCHIVO_LINEA_BASE, "r") as f:
+            linea_base = json.load(f).get("escenarios", {})
+
+    for nombre, resultado in resultados.items():
+        if "error" in resultado:
+            print(f"{nombre}: ERROR {resultado['error']}")
+            continue
+        linea = f"{nombre}: {resultado['total_ms']:.1f} ms"
+        if nombre in linea_base and "total_ms" in linea_base[nombre]:
+            anterior = linea_base[nombre]["total_ms"]
+            linea += f" (línea base {anterior:.1f} ms, {resultado['total_ms'] - anterior:+.1f} ms)"
+        print(linea)
+        for paquete in resultado["mas_costosos"][:5]:
+            print(f"    {paquete['ms']:8.1f} ms  {paquete['modulo']}")
+        if resultado["prohibidas_cargadas"]:
+            print(f"    AVISO: carga {', '.join(resultado['prohibidas_cargadas'])}")
+
+    if args.guardar:
+        with open(ARCHIVO_LINEA_BASE, "w") as f:
+            json.dump({"python": sys.version.split()[0], "escenarios": resultados}, f, indent=4)
+        print(f"Línea base guardada en {ARCHIVO_LINEA_BASE}")
+
+    # Código de salida distinto de cero si un escenario carga bibliotecas prohibidas
+    return 1 if any(r.get("prohibidas_cargadas") for r in resultados.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
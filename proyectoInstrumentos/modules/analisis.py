@@ -0,0 +1,298 @@
+# Archivo modules/analisis.py - Métricas de la respuesta en frecuencia (Bode)
+#
+# Todas las funciones trabajan sobre matrices (una fila por corrida) para
+# analizar muchas corridas a la vez sin bucles de Python por punto. Las
+# curvas de distinta longitud se rellenan con NaN.
+
+import numpy as np
+
+# Métricas escalares que devuelve analizar_curvas (en este orden)
+METRICAS = (
+    "ganancia_max_db", "frecuencia_pico", "ganancia_referencia_db", "realce_db",
+    "f_inferior_3db", "f_superior_3db", "ancho_banda_3db",
+    "f_inferior_6db", "f_superior_6db", "q",
+    "pendiente_alta_db_dec", "pendiente_baja_db_dec",
+)
+
+def preparar_curvas(curvas):
+    """
+    Convierte una lista de curvas (frecuencias, ganancias_db) en matrices
+
+    Se descartan los puntos no finitos (ganancia nula = -inf dB), se ordena
+    por frecuencia y se promedian las frecuencias repetidas. Un plan que
+    barre también la amplitud o el offset mide cada frecuencia varias veces:
+    las métricas, las referencias y los veredictos usan la media de esos
+    puntos, no cada combinación por separado.
+
+    Returns:
+        tuple: (F, G) de forma (corridas, puntos), rellenas con NaN
+    """
+    limpias = []
+    for frecuencias, ganancias in curvas:
+        f = np.asarray(frecuencias, dtype=float)
+        g = np.asarray(ganancias, dtype=float)
+        validos = np.isfinite(f) & np.isfinite(g) & (f > 0)
+        f, g = f[validos], g[validos]
+        unicas, inversa = np.unique(f, return_inverse=True)
+        medias = np.bincount(inversa, weights=g, minlength=len(unicas)) / np.bincount(inversa, minlength=len(unicas))
+        limpias.append((unicas, medias))
+
+    puntos = max((len(f) for f, _ in limpias), default=0)
+    F = np.full((len(limpias), puntos), np.nan)
+    G = np.full((len(limpias), puntos), np.nan)
+    for i, (f, g) in enumerate(limpias):
+        F[i, :len(f)] = f
+        G[i, :len(g)] = g
+    return F, G
+
+def _rellenar(F, G, columnas=2):
+    """
+    Añade columnas NaN hasta tener al menos `columnas`: los cálculos por
+    fila (pico, cruces) necesitan dos puntos aunque la curva tenga menos
+    """
+    faltan = columnas - F.shape[1]
+    if faltan <= 0:
+        return F, G
+    relleno = np.full((F.shape[0], faltan), np.nan)
+    return np.hstack([F, relleno]), np.hstack([G, relleno])
+
+def _interpolar_cruce(X, G, indice, nivel, filas):
+    """
+    Frecuencia (interpolada en log-f) donde la curva cruza `nivel` entre los
+    puntos indice-1 e indice de cada fila
+    """
+    x0, x1 = X[filas, indice - 1], X[filas, indice]
+    g0, g1 = G[filas, indice - 1], G[filas, indice]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(g1 != g0, (nivel - g0) / (g1 - g0), 0.0)
+    return 10 ** (x0 + np.clip(t, 0, 1) * (x1 - x0))
+
+def cruces(F, G, caida_db, referencia=None):
+    """
+    Frecuencias inferior y superior donde la ganancia cae `caida_db` dB
+    por debajo de la referencia (por defecto, el máximo de cada curva)
+
+    Se busca a ambos lados del pico el primer punto por debajo del nivel.
+    Si la curva no llega a caer en un lado, el resultado es NaN.
+
+    Returns:
+        tuple: (f_inferior, f_superior), vectores con una entrada por corrida
+    """
+    F, G = _rellenar(F, G)
+    filas = np.arange(F.shape[0])
+    X = np.log10(F)
+    Gm = np.where(np.isnan(G), -np.inf, G)
+    pico = Gm.argmax(axis=1)
+    if referencia is None:
+        referencia = Gm[filas, pico]
+    nivel = referencia - caida_db
+
+    columnas = np.arange(F.shape[1])[None, :]
+    debajo = (Gm < nivel[:, None]) & ~np.isnan(G)
+
+    # Lado alto: primer índice tras el pico por debajo del nivel
+    alto = debajo & (columnas > pico[:, None])
+    hay_alto = alto.any(axis=1)
+    indice_alto = np.where(hay_alto, alto.argmax(axis=1), 1)
+    f_superior = np.where(hay_alto, _interpolar_cruce(X, G, indice_alto, nivel, filas), np.nan)
+
+    # Lado bajo: último índice antes del pico por debajo del nivel
+    bajo = debajo & (columnas < pico[:, None])
+    hay_bajo = bajo.any(axis=1)
+    ultimo_bajo = F.shape[1] - 1 - bajo[:, ::-1].argmax(axis=1)
+    indice_bajo = np.where(hay_bajo, ultimo_bajo + 1, 1)
+    f_inferior = np.where(hay_bajo, _interpolar_cruce(X, G, indice_bajo, nivel, filas), np.nan)
+
+    return f_inferior, f_superior
+
+def pendiente_por_decada(F, G, mascara):
+    """
+    Pendiente (dB/década) de la recta de mínimos cuadrados de G frente a
+    log10(F), usando solo los puntos de `mascara` (NaN si hay menos de 2)
+    """
+    X = np.log10(F)
+    peso = (mascara & ~np.isnan(G)).astype(float)
+    n = peso.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_x = np.nansum(peso * X, axis=1) / n
+        media_g = np.nansum(peso * G, axis=1) / n
+        dx = np.where(peso > 0, X - media_x[:, None], 0.0)
+        dg = np.where(peso > 0, G - media_g[:, None], 0.0)
+        pendiente = (dx * dg).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, pendiente, np.nan)
+
+def analizar_curvas(F, G, margen_rolloff_db=10.0):
+    """
+    Métricas de un lote de curvas de Bode (una fila por corrida)
+
+    Args:
+        F, G: Matrices de preparar_curvas (Hz y dB)
+        margen_rolloff_db: La pendiente se ajusta con los puntos que están al
+            menos este margen por debajo del máximo (banda de rechazo)
+
+    Las corridas con menos de dos puntos válidos (vacías, con ganancia nula
+    o con una sola frecuencia) tienen todas las métricas a NaN.
+
+    Returns:
+        dict: Vector por métrica (ver METRICAS)
+    """
+    F, G = _rellenar(F, G)
+    filas = np.arange(F.shape[0])
+    Gm = np.where(np.isnan(G), -np.inf, G)
+    pico = Gm.argmax(axis=1)
+    ganancia_max = Gm[filas, pico]
+    frecuencia_pico = F[filas, pico]
+    # Ganancia de referencia: la del primer punto (banda de paso de un paso bajo)
+    referencia = G[filas, 0]
+
+    f_inf_3, f_sup_3 = cruces(F, G, 3.0)
+    f_inf_6, f_sup_6 = cruces(F, G, 6.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ancho_banda = np.where(np.isnan(f_inf_3), f_sup_3, f_sup_3 - f_inf_3)
+        # Q de un paso banda: frecuencia central / ancho de banda a -3 dB
+        q = np.sqrt(f_inf_3 * f_sup_3) / (f_sup_3 - f_inf_3)
+
+    columnas = np.arange(F.shape[1])[None, :]
+    rechazo = G <= (ganancia_max - margen_rolloff_db)[:, None]
+    pendiente_alta = pendiente_por_decada(F, G, rechazo & (columnas > pico[:, None]))
+    pendiente_baja = pendiente_por_decada(F, G, rechazo & (columnas < pico[:, None]))
+
+    metricas = {
+        "ganancia_max_db": ganancia_max,
+        "frecuencia_pico": frecuencia_pico,
+        "ganancia_referencia_db": referencia,
+        "realce_db": ganancia_max - referencia,
+        "f_inferior_3db": f_inf_3,
+        "f_superior_3db": f_sup_3,
+        "ancho_banda_3db": ancho_banda,
+        "f_inferior_6db": f_inf_6,
+        "f_superior_6db": f_sup_6,
+        "q": q,
+        "pendiente_alta_db_dec": pendiente_alta,
+        "pendiente_baja_db_dec": pendiente_baja,
+    }
+    insuficientes = (~np.isnan(G)).sum(axis=1) < 2
+    return {clave: np.where(insuficientes, np.nan, valores) for clave, valores in metricas.items()}
+
+def _mitad_estable(raices):
+    # Las raíces de un polinomio par en s aparecen como ±p: se toma la mitad
+    # con menor parte real (semiplano izquierdo: sistema estable y de fase mínima)
+    raices = np.sort_complex(raices)
+    return raices[:len(raices) // 2]
+
+def ajustar_funcion_transferencia(frecuencias, ganancias_db, orden_numerador=0, orden_denominador=2):
+    """
+    Ajusta |H(jw)|^2 = N(w^2) / D(w^2) por mínimos cuadrados lineales
+
+    Solo se mide la magnitud, así que se ajusta |H|^2 (lineal en los
+    coeficientes tras multiplicar por D) y los polos y ceros se obtienen por
+    factorización espectral suponiendo un sistema estable de fase mínima.
+
+    Args:
+        orden_numerador, orden_denominador: Número de ceros y de polos
+
+    Returns:
+        dict: polos_hz, ceros_hz (listas de [real, imag]), ganancia_dc,
+            frecuencia_natural_hz y q del par de polos complejos dominante
+            (None si no hay) y error_rms_db, o None si no hay puntos suficientes
+    """
+    f = np.asarray(frecuencias, dtype=float)
+    g = np.asarray(ganancias_db, dtype=float)
+    validos = np.isfinite(f) & np.isfinite(g) & (f > 0)
+    f, g = f[validos], g[validos]
+    if len(f) < orden_numerador + orden_denominador + 2:
+        return None
+
+    # Frecuencia normalizada (w / w_ref) para que la matriz esté bien condicionada
+    w_ref = 2 * np.pi * np.sqrt(f.min() * f.max())
+    x = (2 * np.pi * f / w_ref) ** 2
+    m = 10 ** (g / 10)  # |H|^2
+
+    # N(x) - m * (D(x) - 1) = m, con D(0) = 1; cada ecuación se divide por m
+    # para que los puntos de la banda de rechazo pesen igual que los demás
+    columnas = [x ** k for k in range(orden_numerador + 1)]
+    columnas += [-m * x ** k for k in range(1, orden_denominador + 1)]
+    A = np.stack(columnas, axis=1) / m[:, None]
+    b = np.ones_like(m)
+    coeficientes, *_ = np.linalg.lstsq(A, b, rcond=None)
+    n = coeficientes[:orden_numerador + 1]
+    d = np.concatenate([[1.0], coeficientes[orden_numerador + 1:]])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        modelo = np.polyval(n[::-1], x) / np.polyval(d[::-1], x)
+        error = 10 * np.log10(np.abs(modelo)) - g
+    error_rms = float(np.sqrt(np.nanmean(error ** 2)))
+
+    def raices_en_s(c):
+        # P(w^2) con w^2 = -s^2: polinomio en s con potencias pares
+        polinomio = np.zeros(2 * len(c) - 1)
+        polinomio[::2] = c * (-1.0) ** np.arange(len(c))
+        return _mitad_estable(np.roots(polinomio[::-1])) * w_ref / (2 * np.pi) if len(c) > 1 else np.array([])
+
+    polos = raices_en_s(d)
+    # Par de polos complejos dominante: frecuencia natural y Q del modelo
+    complejos = polos[(np.abs(polos.imag) > 1e-9 * np.abs(polos)) & (polos.real != 0)]
+    dominante = complejos[np.abs(complejos).argmin()] if len(complejos) else None
+
+    return {
+        "polos_hz": [[float(r.real), float(r.imag)] for r in polos],
+        "ceros_hz": [[float(r.real), float(r.imag)] for r in raices_en_s(n)],
+        "ganancia_dc": float(np.sqrt(abs(n[0]))),
+        "frecuencia_natural_hz": float(abs(dominante)) if dominante is not None else None,
+        "q": float(abs(dominante) / (2 * abs(dominante.real))) if dominante is not None else None,
+        "error_rms_db": error_rms,
+    }
+
+def ajustar_mejor_orden(frecuencias, ganancias_db, orden_max=4, tolerancia_db=0.5):
+    """
+    Prueba órdenes crecientes (polos 1..orden_max, ceros 0..polos) y se queda
+    con el primero cuyo error RMS baja de tolerancia_db (o con el mejor)
+    """
+    mejor = None
+    for polos in range(1, orden_max + 1):
+        for ceros in range(polos + 1):
+            ajuste = ajustar_funcion_transferencia(frecuencias, ganancias_db, ceros, polos)
+            if ajuste is None or not np.isfinite(ajuste["error_rms_db"]):
+                continue
+            if mejor is None or ajuste["error_rms_db"] < mejor["error_rms_db"]:
+                mejor = ajuste
+            if ajuste["error_rms_db"] < tolerancia_db:
+                return ajuste
+    return mejor
+
+def _a_lista(metricas, indice):
+    return {
+        clave: (float(valores[indice]) if np.isfinite(valores[indice]) else None)
+        for clave, valores in metricas.items()
+    }
+
+def analizar_lote(curvas, ajustar=True):
+    """
+    Analiza varias corridas a la vez
+
+    Args:
+        curvas: Lista de (frecuencias, ganancias_db)
+        ajustar: Incluir el ajuste de función de transferencia (por corrida)
+
+    Returns:
+        list: Un diccionario de métricas por curva (None donde no aplica)
+    """
+    if not curvas:
+        return []
+    F, G = preparar_curvas(curvas)
+    metricas = analizar_curvas(F, G)
+
+    resultados = []
+    for i in range(F.shape[0]):
+        resultado = _a_lista(metricas, i)
+        if ajustar:
+            resultado["ajuste"] = ajustar_mejor_orden(F[i], G[i])
+        resultados.append(resultado)
+    return resultados
+
+def analizar_dataframe(df, columna="ganancia_real_db", ajustar=True):
+    """Métricas de las mediciones de un DataFrame (frecuencia y ganancia en dB)"""
+    if df.empty or columna not in df.columns:
+        return None
+    return analizar_lote([(df["frecuencia"].to_numpy(), df[columna].to_numpy())], ajustar)[0]
@@ -1,13 +1,81 @@
 # Archivo modules/automatizacion.py - Versión actualizada
 
-import time
+import itertools
+import math
+from datetime import datetime
 from modules.equipos import Osciloscopio, GeneradorFunciones
 from modules.config import cargar_frecuencias, agregar_medicion_ganancia
+from modules.persistencia import EscritorResultados
+from modules.capturas import GuardadoCapturas, directorio_corrida
+from modules.tuberia import Tuberia
+from modules.conexiones import preparar_en_paralelo
+from modules.reservas import ReservaEquipos
+from modules.cancelacion import TokenCancelacion, OperacionCancelada
+from modules.planes import plan_desde_parametros, compilar_plan, resumen_programa
+from modules.establecimiento import PoliticaEstablecimiento
+from modules.calibracion import (
+    buscar_calibracion, estado_calibracion, crear_calibracion, guardar_calibracion,
+    correcciones, aplicar_correccion
+)
+from modules.scripts_scpi import ejecutar_script
+from modules.sesiones import es_error_conexion
+from modules.corridas import registrar_corrida
+from modules.referencia import FallaReferencia, referencia_activa, comprobar_punto, evaluar_mediciones
+
+class _ErrorPaso(Exception):
+    """Error de un paso de la medición; se informa tal cual al llamador"""
+
+def calcular_ganancia(frecuencia, canal1_pk2pk, canal1_amplitud, canal2_pk2pk, canal2_amplitud):
+    """
+    Ganancia CH2/CH1 (lineal y en dB) a partir de las medidas de ambos canales
+
+    Returns:
+        dict: Resultado de la medición o None si las medidas no son válidas
+    """
+    if not (canal1_pk2pk and canal2_pk2pk):
+        return None
+    
+    ganancia_pk2pk = canal2_pk2pk / canal1_pk2pk if canal1_pk2pk != 0 else 0
+    ganancia_amplitud = canal2_amplitud / canal1_amplitud if canal1_amplitud != 0 else 0
+    ganancia_real = (ganancia_pk2pk + ganancia_amplitud) / 2
+    
+    def en_db(ganancia):
+        return 20 * math.log10(ganancia) if ganancia > 0 else float('-inf')
+    
+    return {
+        "frecuencia": frecuencia,
+        "canal1_pk2pk": canal1_pk2pk,
+        "canal1_amplitud": canal1_amplitud,
+        "canal2_pk2pk": canal2_pk2pk,
+        "canal2_amplitud": canal2_amplitud,
+        "ganancia_pk2pk": ganancia_pk2pk,
+        "ganancia_amplitud": ganancia_amplitud,
+        "ganancia_real": ganancia_real,
+        "ganancia_pk2pk_db": en_db(ganancia_pk2pk),
+        "ganancia_amplitud_db": en_db(ganancia_amplitud),
+        "ganancia_real_db": en_db(ganancia_real)
+    }
+
+# Campos que se guardan en datos_ganancia.json (los valores en dB se recalculan al leer)
+CAMPOS_GUARDADO = (
+    "frecuencia", "canal1_pk2pk", "canal1_amplitud", "canal2_pk2pk", "canal2_amplitud",
+    "ganancia_pk2pk", "ganancia_amplitud", "ganancia_real"
+)
+
+# Parámetros barridos además de la frecuencia: se guardan solo si el plan los
+# barre y forman parte de la clave de cada medición en datos_ganancia.json
+CAMPOS_BARRIDOS = ("amplitud", "offset")
+
+def campos_guardado(resultado):
+    campos = {campo: resultado[campo] for campo in CAMPOS_GUARDADO}
+    campos.update({campo: resultado[campo] for campo in CAMPOS_BARRIDOS if campo in resultado})
+    return campos
 
 def ejecutar_medicion_automatica(gen_ip, gen_puerto, osc_ip, osc_puerto, 
                                 frecuencia, amplitud=0.05, progreso_callback=None,
                                 tiempo_estabilizacion=0.5, offset=0.0, forma_onda="SINusoid",
-                                funcion_verificar_detencion=None):
+                                funcion_verificar_detencion=None, escritor_resultados=None,
+                                token=None, capturas=None):
     """
     Ejecuta una medición automática para una frecuencia específica
     
@@ -23,137 +91,69 @@ def ejecutar_medicion_automatica(gen_ip, gen_puerto, osc_ip, osc_puerto,
         offset: Offset de la señal en V
         forma_onda: Forma de onda (SINusoid, SQUare, etc.)
         funcion_verificar_detencion: Función para verificar si debe detenerse
+            (se ignora si se pasa token)
+        escritor_resultados: EscritorResultados para guardado diferido; si es None
+            se guarda en el momento
+        token: TokenCancelacion que interrumpe esperas y E/S en curso
+        capturas: GuardadoCapturas (modules.capturas) para guardar la pantalla
+            del osciloscopio al terminar (siempre o solo si la medición falla)
         
     Returns:
         dict: Resultados de la medición o None en caso de error
         str: Mensaje de error o None en caso de éxito
     """
-    # Inicializar equipos
-    generador = None
-    osciloscopio = None
+    if token is None:
+        token = TokenCancelacion(funcion_verificar_detencion)
+    
+    def informar(mensaje):
+        if progreso_callback:
+            progreso_callback(mensaje)
+    
+    generador = GeneradorFunciones(gen_ip, gen_puerto, token=token)
+    osciloscopio = Osciloscopio(osc_ip, osc_puerto, token=token)
     
-    resultados = {}
+    resultados = None
     error_msg = None
     
     try:
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            return None, "Proceso detenido por el usuario"
-            
-        generador = GeneradorFunciones(gen_ip, gen_puerto)
-        osciloscopio = Osciloscopio(osc_ip, osc_puerto)
-        
-        # Conectar generador
-        if progreso_callback:
-            progreso_callback(f"Conectando al generador de funciones ({gen_ip}:{gen_puerto})...")
-        
-        conectado, error = generador.conectar()
-        if not conectado:
-            return None, f"Error al conectar con el generador: {error}"
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desconectar()
-            return None, "Proceso detenido por el usuario"
-        
-        # Identificar generador
-        id_gen, error = generador.identificar()
-        if error:
-            generador.desconectar()
-            return None, f"Error al identificar el generador: {error}"
+        token.verificar()
+        
+        # Generador y osciloscopio se preparan a la vez: la conexión e
+        # identificación del osciloscopio se solapan con la configuración y
+        # la estabilización del generador
+        def configurar_generador(generador):
+            informar(f"Configurando generador a {frecuencia} Hz (forma: {forma_onda}, amplitud: {amplitud}V, offset: {offset}V)...")
+            config, error = generador.configuracion_completa(
+                canal=1, 
+                forma=forma_onda,
+                frecuencia=frecuencia,
+                amplitud=amplitud,
+                offset=offset
+            )
+            token.verificar()
+            if error:
+                return error
             
-        if progreso_callback:
-            progreso_callback(f"Generador identificado: {id_gen}")
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desconectar()
-            return None, "Proceso detenido por el usuario"
-        
-        # Configurar generador con los nuevos parámetros
-        if progreso_callback:
-            progreso_callback(f"Configurando generador a {frecuencia} Hz (forma: {forma_onda}, amplitud: {amplitud}V, offset: {offset}V)...")
-        
-        config, error = generador.configuracion_completa(
-            canal=1, 
-            forma=forma_onda,  # Usar el parámetro de forma de onda
-            frecuencia=frecuencia,
-            amplitud=amplitud,
-            offset=offset  # Usar el parámetro de offset
-        )
-        
-        if error:
-            generador.desconectar()
-            return None, f"Error al configurar el generador: {error}"
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            return None, "Proceso detenido por el usuario"
-        
-        # Activar salida del generador
-        if progreso_callback:
-            progreso_callback("Activando salida del generador...")
-        
-        generador.activar_salida(1)
-        time.sleep(tiempo_estabilizacion)  # Tiempo personalizado
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            return None, "Proceso detenido por el usuario"
-        
-        # Conectar osciloscopio
-        if progreso_callback:
-            progreso_callback(f"Conectando al osciloscopio ({osc_ip}:{osc_puerto})...")
-        
-        conectado, error = osciloscopio.conectar()
-        if not conectado:
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            return None, f"Error al conectar con el osciloscopio: {error}"
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
-        
-        # Identificar osciloscopio
-        id_osc, error = osciloscopio.identificar()
+            # Activar salida del generador
+            informar("Activando salida del generador...")
+            generador.activar_salida(1)
+            token.dormir(tiempo_estabilizacion)  # Tiempo personalizado
+            return None
+        
+        identificaciones, error = preparar_en_paralelo([
+            ("generador de funciones", generador, configurar_generador),
+            ("osciloscopio", osciloscopio, None),
+        ], informar)
+        token.verificar()
         if error:
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, f"Error al identificar el osciloscopio: {error}"
-            
-        if progreso_callback:
-            progreso_callback(f"Osciloscopio identificado: {id_osc}")
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
+            raise _ErrorPaso(error)
         
         # Configurar osciloscopio
-        if progreso_callback:
-            progreso_callback("Configurando osciloscopio...")
+        informar("Configurando osciloscopio...")
         
         # Auto setup para ajustar escala y trigger - tiempo reducido
         osciloscopio.auto_setup()
-        time.sleep(tiempo_estabilizacion)  # Tiempo personalizado
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
+        token.dormir(tiempo_estabilizacion)  # Tiempo personalizado
         
         # Configurar canales
         osciloscopio.configurar_canal(1, acoplamiento="AC", display="ON", posicion=0)
@@ -161,155 +161,332 @@ def ejecutar_medicion_automatica(gen_ip, gen_puerto, osc_ip, osc_puerto,
         
         # Detener adquisición para mediciones más precisas
         osciloscopio.detener()
-        time.sleep(0.2)  # Tiempo reducido
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
-        
-        # Realizar mediciones
-        if progreso_callback:
-            progreso_callback("Realizando mediciones en Canal 1...")
-        
-        # Mediciones en Canal 1 (entrada)
-        canal1_pk2pk, error = osciloscopio.obtener_medicion("CH1", "PK2PK")
-        if error:
-            if progreso_callback:
-                progreso_callback(f"Error en medición PK2PK CH1: {error}")
-            canal1_pk2pk = 0
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
-            
-        canal1_amplitud, error = osciloscopio.obtener_medicion("CH1", "AMPLITUDE")
-        if error:
-            if progreso_callback:
-                progreso_callback(f"Error en medición AMPLITUDE CH1: {error}")
-            canal1_amplitud = 0
-        
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
-            
-        if progreso_callback:
-            progreso_callback("Realizando mediciones en Canal 2...")
-            
-        # Mediciones en Canal 2 (salida)
-        canal2_pk2pk, error = osciloscopio.obtener_medicion("CH2", "PK2PK")
-        if error:
-            if progreso_callback:
-                progreso_callback(f"Error en medición PK2PK CH2: {error}")
-            canal2_pk2pk = 0
+        token.dormir(0.2)  # Tiempo reducido
+        
+        # Realizar mediciones: CH1 (entrada) y CH2 (salida)
+        valores = {}
+        for canal in ("CH1", "CH2"):
+            informar(f"Realizando mediciones en Canal {canal[-1]}...")
+            for tipo in ("PK2PK", "AMPLITUDE"):
+                valor, error = osciloscopio.obtener_medicion(canal, tipo)
+                token.verificar()
+                if error:
+                    informar(f"Error en medición {tipo} {canal}: {error}")
+                    valor = 0
+                valores[(canal, tipo)] = valor
         
-        # Verificar si debemos detener la ejecución
-        if funcion_verificar_detencion and funcion_verificar_detencion():
-            generador.desactivar_salida(1)
-            generador.desconectar()
-            osciloscopio.desconectar()
-            return None, "Proceso detenido por el usuario"
-            
-        canal2_amplitud, error = osciloscopio.obtener_medicion("CH2", "AMPLITUDE")
-        if error:
-            if progreso_callback:
-                progreso_callback(f"Error en medición AMPLITUDE CH2: {error}")
-            canal2_amplitud = 0
+        canal1_pk2pk = valores[("CH1", "PK2PK")]
+        canal1_amplitud = valores[("CH1", "AMPLITUDE")]
+        canal2_pk2pk = valores[("CH2", "PK2PK")]
+        canal2_amplitud = valores[("CH2", "AMPLITUDE")]
         
         # Calcular ganancia
-        if canal1_pk2pk and canal2_pk2pk:
-            ganancia_pk2pk = canal2_pk2pk / canal1_pk2pk if canal1_pk2pk != 0 else 0
-            ganancia_amplitud = canal2_amplitud / canal1_amplitud if canal1_amplitud != 0 else 0
-            ganancia_real = (ganancia_pk2pk + ganancia_amplitud) / 2
-            
-            # También calcular en dB
-            import math
-            ganancia_pk2pk_db = 20 * math.log10(ganancia_pk2pk) if ganancia_pk2pk > 0 else float('-inf')
-            ganancia_amplitud_db = 20 * math.log10(ganancia_amplitud) if ganancia_amplitud > 0 else float('-inf')
-            ganancia_real_db = 20 * math.log10(ganancia_real) if ganancia_real > 0 else float('-inf')
-            
-            # Resultados
-            resultados = {
-                "frecuencia": frecuencia,
-                "canal1_pk2pk": canal1_pk2pk,
-                "canal1_amplitud": canal1_amplitud,
-                "canal2_pk2pk": canal2_pk2pk,
-                "canal2_amplitud": canal2_amplitud,
-                "ganancia_pk2pk": ganancia_pk2pk,
-                "ganancia_amplitud": ganancia_amplitud,
-                "ganancia_real": ganancia_real,
-                "ganancia_pk2pk_db": ganancia_pk2pk_db,
-                "ganancia_amplitud_db": ganancia_amplitud_db,
-                "ganancia_real_db": ganancia_real_db
-            }
-            
-            # Guardar resultados
-            if progreso_callback:
-                progreso_callback("Guardando resultados...")
-                
-            # Guardar en el archivo JSON de ganancias
-            try:
-                guardado = agregar_medicion_ganancia(
-                    frecuencia=frecuencia,
-                    canal1_pk2pk=canal1_pk2pk,
-                    canal1_amplitud=canal1_amplitud,
-                    canal2_pk2pk=canal2_pk2pk,
-                    canal2_amplitud=canal2_amplitud,
-                    ganancia_pk2pk=ganancia_pk2pk,
-                    ganancia_amplitud=ganancia_amplitud,
-                    ganancia_real=ganancia_real
-                )
+        resultados = calcular_ganancia(frecuencia, canal1_pk2pk, canal1_amplitud, canal2_pk2pk, canal2_amplitud)
+        if resultados:
+            if escritor_resultados is not None:
+                # Guardado diferido: el hilo escritor persiste fuera del camino de medición
+                escritor_resultados.agregar(campos_guardado(resultados))
+            else:
+                # Guardar resultados
+                informar("Guardando resultados...")
                 
-                if not guardado and progreso_callback:
-                    progreso_callback("Advertencia: No se pudieron guardar los resultados en el archivo.")
-            except Exception as e:
-                if progreso_callback:
-                    progreso_callback(f"Error al guardar resultados: {str(e)}")
+                # Guardar en el archivo JSON de ganancias
+                try:
+                    guardado = agregar_medicion_ganancia(**campos_guardado(resultados))
+                    
+                    if not guardado:
+                        informar("Advertencia: No se pudieron guardar los resultados en el archivo.")
+                except Exception as e:
+                    informar(f"Error al guardar resultados: {str(e)}")
         else:
             error_msg = "No se pudieron obtener mediciones válidas para calcular la ganancia."
         
+    except OperacionCancelada:
+        resultados = None
+        error_msg = "Proceso detenido por el usuario"
+    except _ErrorPaso as e:
+        error_msg = str(e)
     except Exception as e:
+        resultados = None
         error_msg = f"Error durante la medición automática: {str(e)}"
     finally:
-        # Limpiar
-        try:
-            if generador is not None and hasattr(generador, 'instrumento') and generador.instrumento:
-                if progreso_callback:
-                    progreso_callback("Desactivando salida del generador...")
-                generador.desactivar_salida(1)
-                generador.desconectar()
-        except Exception as e:
-            if progreso_callback:
-                progreso_callback(f"Error al desconectar generador: {str(e)}")
-            
-        try:
-            if osciloscopio is not None and hasattr(osciloscopio, 'instrumento') and osciloscopio.instrumento:
-                osciloscopio.desconectar()
-        except Exception as e:
-            if progreso_callback:
-                progreso_callback(f"Error al desconectar osciloscopio: {str(e)}")
+        # Apagado seguro: la salida se desactiva aunque se haya cancelado,
+        # reconectando si la sesión se abortó
+        if generador.instrumento or generador.salidas_activas:
+            informar("Desactivando salida del generador...")
+            apagada, error = generador.apagar_salida_segura(1)
+            if not apagada and generador.salidas_activas:
+                informar(f"Error al desactivar la salida del generador: {error}")
+            generador.desconectar()
+        # Con la salida ya apagada: la pantalla conserva la adquisición detenida
+        _capturar_pantalla(capturas, osciloscopio, f"{frecuencia:g}Hz", error_msg is not None, token)
+        osciloscopio.desconectar()
+        
+        if error_msg:
+            informar(f"Proceso completado con errores: {error_msg}")
+        else:
+            informar("Proceso completado exitosamente.")
+    
+    return resultados, error_msg
+
+def _capturar_pantalla(capturas, osciloscopio, etiqueta, falla, token):
+    # Solo con el osciloscopio aún conectado y sin cancelación pendiente
+    if capturas is None or not osciloscopio.instrumento or token.cancelado:
+        return
+    try:
+        capturas.capturar(osciloscopio, etiqueta, falla)
+    except Exception as e:
+        print(f"Error al capturar la pantalla: {e}")
+
+def _leer_numero(equipo, consulta):
+    respuesta, error = equipo.enviar_query(consulta)
+    try:
+        return float(respuesta) if not error else None
+    except (TypeError, ValueError):
+        return None
+
+def _ejecutar_instrucciones(instrucciones, equipos, token, informar, politica=None):
+    """
+    Ejecuta las instrucciones compiladas de un punto del plan
+
+    Args:
+        politica: PoliticaEstablecimiento para las esperas adaptativas (sin
+            ella se espera el mínimo compilado)
+
+    Returns:
+        dict: Medidas por (rol, medida), p. ej. ("entrada", "PK2PK"), más el
+            tiempo de establecimiento usado en ("establecimiento", "segundos")
+            y sus lecturas de confirmación en ("establecimiento", "lecturas")
+    """
+    valores = {("establecimiento", "segundos"): 0.0, ("establecimiento", "lecturas"): 0}
+    # Los comandos consecutivos para un mismo equipo se envían juntos
+    # (ejecutar_script los une con ';' cuando es seguro)
+    for (nombre, tipo), grupo in itertools.groupby(instrucciones, key=lambda i: (i["equipo"], i["tipo"])):
+        grupo = list(grupo)
+        if tipo == "comando":
+            _, error = ejecutar_script(equipos[nombre], grupo, token=token, detener_en_error=True)
+            token.verificar()
+            if error:
+                raise _ErrorPaso(f"Error en {nombre}: {error}")
+            continue
+        
+        for instruccion in grupo:
+            if tipo == "espera":
+                token.dormir(instruccion["ms"] / 1000)
+                if instruccion.get("establecimiento"):
+                    valores[("establecimiento", "segundos")] += instruccion["ms"] / 1000
+            elif tipo == "establecimiento":
+                if politica is None:
+                    segundos, lecturas = instruccion["ms"] / 1000, 0
+                    token.dormir(segundos)
+                else:
+                    leer = None
+                    if instruccion["confirmar"]:
+                        osciloscopio = equipos["osciloscopio"]
+                        leer = lambda: _leer_numero(osciloscopio, instruccion["consulta"])
+                    segundos, lecturas = politica.esperar(instruccion["frecuencia"], token, leer)
+                    token.verificar()
+                valores[("establecimiento", "segundos")] += segundos
+                valores[("establecimiento", "lecturas")] += lecturas
+            elif tipo == "salida":
+                _, error = equipos["generador"].activar_salida(instruccion["canal"])
+                token.verificar()
+                if error:
+                    raise _ErrorPaso(f"Error al activar la salida del generador: {error}")
+            elif tipo == "medicion":
+                respuesta, error = equipos["osciloscopio"].enviar_query(instruccion["texto"])
+                token.verificar()
+                try:
+                    valor = float(respuesta) if not error else 0
+                except (TypeError, ValueError):
+                    error, valor = f"respuesta no numérica '{respuesta}'", 0
+                if error:
+                    informar(f"Error en medición {instruccion['medida']} ({instruccion['rol']}): {error}")
+                valores[(instruccion["rol"], instruccion["medida"])] = valor
+    return valores
+
+def ejecutar_programa(programa, gen_ip, gen_puerto, osc_ip, osc_puerto, progreso_callback,
+                      resultado_callback=None, escritor_resultados=None, token=None, calibracion=None,
+                      capturas=None, esperar_entrega=False):
+    """
+    Ejecuta un plan compilado (modules.planes) sobre una sola conexión por equipo
+    
+    El barrido es una tubería (modules.tuberia): este hilo solo habla con los
+    equipos y, en cuanto tiene las lecturas de un punto, las entrega a la
+    etapa de análisis (ganancia y dB) y pasa a la siguiente frecuencia. Una
+    tercera etapa guarda cada resultado y avisa a resultado_callback, en el
+    orden de medición.
+    
+    Cada punto envía solo los comandos que cambian respecto al anterior. Si un
+    punto falla, el siguiente reenvía la configuración completa (reconectando
+    si se perdió la conexión). La salida del generador se apaga al terminar,
+    también si se cancela; las lecturas ya tomadas se analizan y guardan igual.
+    
+    Con una calibración (modules.calibracion), la etapa de análisis corrige
+    cada punto con la tabla de correcciones calculada al empezar para todas
+    las frecuencias del programa.
+    
+    Con capturas (modules.capturas), la pantalla del osciloscopio se lee al
+    terminar cada punto (o solo los puntos que fallan) y se guarda en segundo plano.
+    
+    Los dos equipos se reservan (modules.reservas) mientras dura el barrido;
+    si otro proceso ya los tiene reservados, el barrido no empieza.
+    
+    Lanza OperacionCancelada si se detiene, y el error de resultado_callback si
+    este falla (por ejemplo, FallaReferencia); el llamador los gestiona. Con
+    esperar_entrega, cada punto se analiza y entrega antes de medir el
+    siguiente: el barrido se detiene siempre en el punto que falla (la
+    reproducción de una sesión grabada se aborta en el mismo sitio).
+    
+    Returns:
+        list: Resultados de los puntos medidos
+    """
+    if token is None:
+        token = TokenCancelacion()
+    
+    generador = GeneradorFunciones(gen_ip, gen_puerto, token=token)
+    osciloscopio = Osciloscopio(osc_ip, osc_puerto, token=token)
+    equipos = {"generador": generador, "osciloscopio": osciloscopio}
+    canal = programa["plan"]["estimulo"]["canal"]
+    entre_mediciones = programa["plan"]["adquisicion"]["entre_mediciones"]
+    ejes = {eje["parametro"] for eje in programa["plan"]["ejes"]}
+    politica = None
+    if programa["plan"]["establecimiento"]["modo"] == "adaptativo":
+        # La espera de cada punto ya se adapta a la frecuencia: sin pausa fija
+        politica = PoliticaEstablecimiento(programa["plan"]["establecimiento"])
+        entre_mediciones = 0
+    tabla_correccion = None
+    if calibracion is not None:
+        tabla_correccion = correcciones(calibracion, [paso["punto"]["frecuencia"] for paso in programa["puntos"]])
+    
+    def conectar(nombres):
+        # Los equipos pendientes se conectan e identifican en paralelo
+        _, error = preparar_en_paralelo([(nombre, equipos[nombre], None) for nombre in nombres],
+                                        progreso_callback)
+        token.verificar()
+        if error:
+            raise _ErrorPaso(error)
+    
+    resultados = []
+    total = len(programa["puntos"])
+    
+    def analizar(lectura):
+        punto, valores = lectura["punto"], lectura["valores"]
+        resultado = calcular_ganancia(
+            punto["frecuencia"], valores[("entrada", "PK2PK")], valores[("entrada", "AMPLITUDE")],
+            valores[("salida", "PK2PK")], valores[("salida", "AMPLITUDE")]
+        )
+        if not resultado:
+            progreso_callback(f"Error en frecuencia {punto['frecuencia']} Hz: "
+                              "No se pudieron obtener mediciones válidas para calcular la ganancia.")
+            return None
+        # Parámetros barridos además de la frecuencia (amplitud, offset)
+        resultado.update({clave: punto[clave] for clave in ejes if clave != "frecuencia"})
+        resultado["establecimiento_s"] = round(valores[("establecimiento", "segundos")], 4)
+        resultado["lecturas_establecimiento"] = valores[("establecimiento", "lecturas")]
+        fase = valores.get(("salida", "PHASE"))
+        if fase is not None and abs(fase) <= 360:
+            resultado["fase"] = fase
+        if tabla_correccion is not None:
+            aplicar_correccion(resultado, tabla_correccion[lectura["indice"]], calibracion["id"])
+        return resultado
+    
+    def entregar(resultado):
+        if escritor_resultados is not None:
+            escritor_resultados.agregar(campos_guardado(resultado))
+        else:
+            agregar_medicion_ganancia(**campos_guardado(resultado))
+        resultados.append(resultado)
+        if resultado_callback:
+            resultado_callback(resultado)
+        progreso_callback(f"Medición completada para {resultado['frecuencia']} Hz")
+    
+    # Mientras dura el barrido, el monitor, el control manual y la búsqueda de
+    # equipos (también los de otros procesos) no tocan estos equipos
+    reserva = ReservaEquipos([("generador", gen_ip, gen_puerto), ("osciloscopio", osc_ip, osc_puerto)])
+    tuberia = Tuberia([("analisis", analizar), ("entrega", entregar)], token=token).iniciar()
+    try:
+        reservado, error = reserva.tomar()
+        if not reservado:
+            raise _ErrorPaso(error)
+        conectar(["generador", "osciloscopio"])
+        
+        recuperar = False
+        for i, paso in enumerate(programa["puntos"]):
+            token.verificar()
+            tuberia.verificar()
+            punto = paso["punto"]
+            frecuencia = punto["frecuencia"]
+            progreso_callback(f"Iniciando medición {i+1}/{total}: Frecuencia {frecuencia} Hz", i+1, total)
             
-        if progreso_callback:
-            if error_msg:
-                progreso_callback(f"Proceso completado con errores: {error_msg}")
+            try:
+                if recuperar:
+                    # Estado de los equipos desconocido tras el error: configuración completa
+                    desconectados = [nombre for nombre, equipo in equipos.items() if not equipo.instrumento]
+                    if desconectados:
+                        conectar(desconectados)
+                valores = _ejecutar_instrucciones(paso["completo"] if recuperar else paso["instrucciones"],
+                                                  equipos, token, progreso_callback, politica)
+                recuperar = False
+                if politica is not None and valores.get(("entrada", "PK2PK")):
+                    # La constante de tiempo aprendida de este punto fija la espera del siguiente
+                    fase = valores.get(("salida", "PHASE"))
+                    politica.observar(frecuencia, valores[("salida", "PK2PK")] / valores[("entrada", "PK2PK")],
+                                      fase if fase is not None and abs(fase) <= 360 else None)
+            except _ErrorPaso as e:
+                progreso_callback(f"Error en frecuencia {frecuencia} Hz: {e}")
+                recuperar = True
+                if es_error_conexion(e):
+                    # Se reconecta al empezar el siguiente punto
+                    generador.desconectar()
+                    osciloscopio.desconectar()
+                _capturar_pantalla(capturas, osciloscopio, f"{i:03d}_{frecuencia:g}Hz", True, token)
             else:
-                progreso_callback("Proceso completado exitosamente.")
+                # El análisis y el guardado siguen en segundo plano
+                tuberia.enviar({"indice": i, "punto": punto, "valores": valores})
+                # Sin ambas amplitudes el punto no tendrá ganancia: cuenta como
+                # falla y el siguiente punto se configura completo
+                falla = not (valores.get(("entrada", "PK2PK")) and valores.get(("salida", "PK2PK")))
+                recuperar = falla
+                _capturar_pantalla(capturas, osciloscopio, f"{i:03d}_{frecuencia:g}Hz", falla, token)
+                if esperar_entrega:
+                    tuberia.esperar()
+            
+            if i < total - 1:
+                # Pausa entre mediciones (se interrumpe al detener)
+                token.dormir(entre_mediciones)
+    finally:
+        # Apagado seguro: la salida se desactiva aunque se haya cancelado,
+        # reconectando si la sesión se abortó
+        if generador.instrumento or generador.salidas_activas:
+            progreso_callback("Desactivando salida del generador...")
+            apagada, error = generador.apagar_salida_segura(canal)
+            if not apagada and generador.salidas_activas:
+                progreso_callback(f"Error al desactivar la salida del generador: {error}")
+            generador.desconectar()
+        osciloscopio.desconectar()
+        reserva.liberar()
+        # Las lecturas ya tomadas terminan de analizarse y guardarse
+        tuberia.cerrar()
     
-    return resultados, error_msg
+    tuberia.verificar()
+    return resultados
+
+def _describir_veredicto(veredicto):
+    texto = f"Veredicto frente a '{veredicto['referencia']}': {veredicto['veredicto']}"
+    if veredicto["margen_db"] is not None:
+        texto += (f" (peor punto {veredicto['frecuencia_peor']:.6g} Hz, desviación "
+                  f"{veredicto['desviacion_peor_db']:+.2f} dB, margen {veredicto['margen_db']:+.2f} dB)")
+    return texto
 
 def ejecutar_secuencia_completa(gen_ip, gen_puerto, osc_ip, osc_puerto, 
                               amplitud=0.05, offset=0.0, forma_onda="SINusoid",
                               tiempo_estabilizacion=0.5, 
                               tiempo_entre_mediciones=0.5, progreso_callback=None,
-                              funcion_verificar_detencion=None):
+                              funcion_verificar_detencion=None, resultado_callback=None,
+                              token=None, frecuencias=None, plan=None, referencia=None,
+                              establecimiento=None, perfil=None, calibrar=False, corregir=True,
+                              capturar_pantalla=None):
     """
     Ejecuta una secuencia completa de mediciones para todas las frecuencias definidas
     
@@ -325,6 +502,25 @@ def ejecutar_secuencia_completa(gen_ip, gen_puerto, osc_ip, osc_puerto,
         tiempo_entre_mediciones: Tiempo de espera entre mediciones
         progreso_callback: Función callback para informar progreso
         funcion_verificar_detencion: Función para verificar si debe detenerse
+        resultado_callback: Función que recibe cada resultado en cuanto se mide
+        token: TokenCancelacion; si es None se crea uno a partir de
+            funcion_verificar_detencion
+        frecuencias: Lista de frecuencias a medir; si es None se usan las de
+            frecuencias.json
+        plan: Plan de barrido (modules.planes); si se indica, sustituye a
+            frecuencias y a los parámetros de la señal y de tiempos
+        referencia: Referencia para el veredicto (modules.referencia); si es
+            None se usa la referencia activa, si la hay
+        establecimiento: Configuración de establecimiento (modules.establecimiento);
+            en modo adaptativo sustituye a los tiempos fijos
+        perfil: Nombre del perfil de red, para buscar y guardar su calibración
+            (si es None, se usa la dirección del osciloscopio)
+        calibrar: Barrido de calibración con conexión directa: al completarse
+            guarda la corrección del perfil y par de canales (sin referencia)
+        corregir: Aplicar la calibración vigente del perfil, si la hay
+        capturar_pantalla: "punto" o "falla" para guardar la pantalla del
+            osciloscopio en data/capturas/<inicio>/ en cada punto o solo en
+            los que fallan (modules.capturas)
         
     Returns:
         bool: True si todo fue exitoso, False en caso contrario
@@ -332,64 +528,162 @@ def ejecutar_secuencia_completa(gen_ip, gen_puerto, osc_ip, osc_puerto,
     """
     # Asegurar que el callback exista
     if progreso_callback is None:
-        def progreso_callback(mensaje):
+        def progreso_callback(mensaje, progreso=None, total=None):
             print(mensaje)  # Solo imprime a consola si no hay callback
     
-    # Cargar lista de frecuencias
+    # Escritor en segundo plano para que el guardado no extienda cada medición
+    escritor = EscritorResultados(progreso_callback).iniciar()
+    
+    # Mediciones de esta corrida, para registrarla con sus métricas al terminar
+    inicio = datetime.now()
+    
+    # Capturas de pantalla: se leen en el barrido y se guardan en segundo plano
+    capturas = None
+    if capturar_pantalla:
+        try:
+            capturas = GuardadoCapturas(capturar_pantalla, directorio_corrida(inicio),
+                                        progreso_callback=progreso_callback)
+        except ValueError as e:
+            escritor.cerrar()
+            progreso_callback(str(e))
+            return False, str(e)
+        capturas.iniciar()
+    medidas = []
+    estado = "error"
+    resumen = None
+    calibracion = None
+    nombre_perfil = perfil or f"{osc_ip}:{osc_puerto}"
+    if calibrar:
+        # La conexión directa no es el dispositivo: sin veredicto ni aborto
+        referencia = None
+    elif referencia is None:
+        referencia = referencia_activa()
+    
+    def registrar_resultado(resultado):
+        medidas.append(resultado)
+        if resultado_callback:
+            resultado_callback(resultado)
+        if referencia:
+            # Falla dura: se aborta el barrido (FallaReferencia)
+            comprobar_punto(referencia, resultado)
+    
     try:
-        datos_frecuencias = cargar_frecuencias()
-        frecuencias = datos_frecuencias.get("frecuencias", [])
+        # Los parámetros clásicos se traducen a un plan equivalente
+        if plan is None:
+            if frecuencias is None:
+                datos_frecuencias = cargar_frecuencias()
+                frecuencias = datos_frecuencias.get("frecuencias", [])
+            
+            if not frecuencias:
+                progreso_callback("No hay frecuencias definidas para medir.")
+                return False, "No hay frecuencias definidas para medir."
+            
+            plan = plan_desde_parametros(frecuencias, amplitud, offset, forma_onda,
+                                         tiempo_estabilizacion, tiempo_entre_mediciones, establecimiento)
         
-        if not frecuencias:
-            progreso_callback("No hay frecuencias definidas para medir.")
-            return False, "No hay frecuencias definidas para medir."
+        programa, error = compilar_plan(plan)
+        if error:
+            progreso_callback(f"Plan no válido: {error}")
+            return False, error
+        
+        resumen = resumen_programa(programa)
+        total_frecuencias = resumen["puntos"]
+        progreso_callback(
+            f"Plan '{resumen['nombre']}': {total_frecuencias} puntos, {resumen['comandos']} comandos "
+            f"({resumen['comandos_sin_deltas']} sin deltas), duración estimada {resumen['duracion_estimada']:.0f} s"
+        )
         
-        total_frecuencias = len(frecuencias)
-        resultados_completos = []
+        if token is None:
+            token = TokenCancelacion(funcion_verificar_detencion)
+        
+        canales = programa["plan"]["canales"]
+        if corregir and not calibrar:
+            calibracion = buscar_calibracion(nombre_perfil, canales["entrada"], canales["salida"],
+                                             solo_vigente=False)
+            if calibracion is not None:
+                vigencia = estado_calibracion(calibracion)
+                if vigencia["vigente"]:
+                    progreso_callback(f"Aplicando calibración {calibracion['id']} "
+                                      f"(hace {vigencia['edad_horas']:.1f} h)")
+                else:
+                    progreso_callback(f"La calibración {calibracion['id']} caducó hace "
+                                      f"{-vigencia['restante_horas']:.1f} h: se mide sin corregir")
+                    calibracion = None
+        
+        resultados_completos = ejecutar_programa(
+            programa, gen_ip, gen_puerto, osc_ip, osc_puerto, progreso_callback,
+            registrar_resultado, escritor, token, calibracion, capturas,
+            # Una referencia que aborta decide en cada punto antes del siguiente
+            esperar_entrega=bool(referencia and referencia.get("abortar")
+                                 and referencia.get("limite_duro_db") is not None)
+        )
         
-        for i, frecuencia in enumerate(frecuencias):
-            # Verificar si debemos detener la ejecución
-            if funcion_verificar_detencion and funcion_verificar_detencion():
-                progreso_callback("Secuencia detenida por el usuario.")
-                return False, "Secuencia detenida por el usuario"
-                
-            progreso_callback(f"Iniciando medición {i+1}/{total_frecuencias}: Frecuencia {frecuencia} Hz", i+1, total_frecuencias)
-            
-            # Ejecutar medición para esta frecuencia
-            try:
-                resultado, error = ejecutar_medicion_automatica(
-                    gen_ip, gen_puerto, osc_ip, osc_puerto, 
-                    frecuencia, amplitud, progreso_callback,
-                    tiempo_estabilizacion, offset, forma_onda,
-                    funcion_verificar_detencion
-                )
-                
-                if funcion_verificar_detencion and funcion_verificar_detencion():
-                    progreso_callback("Secuencia detenida por el usuario.")
-                    return False, "Secuencia detenida por el usuario"
-                
-                if error:
-                    progreso_callback(f"Error en frecuencia {frecuencia} Hz: {error}")
-                
-                if resultado:
-                    resultados_completos.append(resultado)
-                    progreso_callback(f"Medición completada para {frecuencia} Hz")
-            except Exception as e:
-                progreso_callback(f"Excepción al medir frecuencia {frecuencia} Hz: {str(e)}")
-                
-            # Verificar si debemos detener la ejecución
-            if funcion_verificar_detencion and funcion_verificar_detencion():
-                progreso_callback("Secuencia detenida por el usuario.")
-                return False, "Secuencia detenida por el usuario"
-                
-            # Pequeña pausa entre mediciones
-            time.sleep(tiempo_entre_mediciones)
+        # Fin de la secuencia: asegurar que todo quede en disco antes de informar
+        escritor.vaciar()
         
         progreso_callback(f"Secuencia completa finalizada. Se realizaron {len(resultados_completos)}/{total_frecuencias} mediciones.", total_frecuencias, total_frecuencias)
         
+        if calibrar:
+            calibracion, error = crear_calibracion(nombre_perfil, resultados_completos,
+                                                   canales["entrada"], canales["salida"])
+            if error or not guardar_calibracion(calibracion):
+                error = error or "No se pudo guardar la calibración"
+                progreso_callback(f"Calibración no guardada: {error}")
+                return False, error
+            progreso_callback(f"Calibración {calibracion['id']} guardada para '{nombre_perfil}' "
+                              f"CH{canales['entrada']}-CH{canales['salida']} (válida hasta {calibracion['caduca']})")
+        # Una calibración que no se pudo guardar deja la corrida en "error"
+        estado = "completa"
         return True, None
     
+    except OperacionCancelada:
+        estado = "detenida"
+        progreso_callback("Secuencia detenida por el usuario.")
+        return False, "Secuencia detenida por el usuario"
+    except FallaReferencia as e:
+        estado = "rechazada"
+        progreso_callback(f"Secuencia abortada. {e}")
+        return False, str(e)
+    except _ErrorPaso as e:
+        progreso_callback(str(e))
+        return False, str(e)
     except Exception as e:
         error_msg = f"Error en la secuencia completa: {str(e)}"
         progreso_callback(error_msg)
         return False, error_msg
+    finally:
+        # Guarda lo pendiente también si la secuencia se detuvo o falló
+        escritor.cerrar()
+        resumen_capturas = None
+        if capturas is not None:
+            capturas.cerrar()
+            resumen_capturas = capturas.resumen()
+            if resumen_capturas["capturadas"] or resumen_capturas["omitidas"]:
+                progreso_callback(
+                    f"Capturas de pantalla: {resumen_capturas['guardadas']} guardadas en "
+                    f"{resumen_capturas['directorio']} ({resumen_capturas['bytes'] / 1024:.0f} KB, "
+                    f"{resumen_capturas['segundos']:.1f} s de transferencia), "
+                    f"{resumen_capturas['omitidas']} omitidas por el presupuesto"
+                )
+        veredicto = None
+        if referencia and medidas:
+            try:
+                veredicto = evaluar_mediciones(referencia, medidas)
+                if estado == "rechazada":
+                    veredicto.update(veredicto="FALLA", falla_dura=True)
+                progreso_callback(_describir_veredicto(veredicto))
+            except Exception as e:
+                print(f"Error al evaluar la corrida contra la referencia: {e}")
+        if medidas:
+            registrar_corrida(
+                medidas, inicio, estado,
+                veredicto=veredicto,
+                plan=resumen["nombre"] if resumen else None,
+                puntos_plan=resumen["puntos"] if resumen else None,
+                generador=f"{gen_ip}:{gen_puerto}",
+                osciloscopio=f"{osc_ip}:{osc_puerto}",
+                perfil=perfil,
+                tipo="calibracion" if calibrar else "medicion",
+                calibracion=calibracion["id"] if calibracion else None,
+                capturas=resumen_capturas,
+            )
@@ -0,0 +1,314 @@
+# Archivo modules/barrido.py - Barrido de frecuencias desde la línea de comandos
+#
+# Ejecuta el mismo motor que la interfaz (ejecutar_secuencia_completa) sin
+# navegador ni servidor de Streamlit, para lanzar barridos desde scripts o
+# tareas programadas:
+#
+#   python -m modules.barrido --perfil "Perfil Prueba" --frecuencias frecuencias.json --salida corrida.csv
+#   python -m modules.barrido --plan bode.yaml --estimar
+#   python -m modules.barrido --perfil "Perfil Prueba" --grabar data/sesion.jsonl.gz
+#
+# La salida estándar es JSON Lines (un evento por línea). Cualquier otro print
+# de los módulos se desvía a stderr para no romper ese formato.
+
+import argparse
+import contextlib
+import csv
+import json
+import math
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from modules.config import cargar_perfiles_red, cargar_frecuencias, escribir_json_atomico, descongelar
+from modules.cancelacion import TokenCancelacion
+from modules.automatizacion import ejecutar_secuencia_completa
+from modules.planes import cargar_plan, plan_desde_parametros, compilar_plan, resumen_programa
+from modules.referencia import cargar_referencias, referencia_activa, evaluar_mediciones, FALLA
+from modules.calibracion import buscar_calibracion
+from modules.capturas import MODOS_CAPTURA
+from modules.grabacion import Grabadora, activar_transporte, desactivar_transporte
+
+# Códigos de salida
+SALIDA_OK = 0            # Todas las frecuencias medidas
+SALIDA_PARCIAL = 1       # Barrido terminado con frecuencias sin medir
+SALIDA_CONFIGURACION = 2 # Perfil, archivo de frecuencias o argumentos no válidos
+SALIDA_ERROR = 3         # El barrido falló o no midió ninguna frecuencia
+SALIDA_FALLA = 4         # La corrida no pasa la máscara de la referencia
+SALIDA_CANCELADO = 130   # Detenido con Ctrl+C / SIGTERM
+
+def buscar_perfil(nombre=None):
+    """
+    Busca un perfil de perfiles_red.json (el perfil actual si no se indica)
+
+    Returns:
+        dict: Perfil o None si no existe
+        str: Mensaje de error o None en caso de éxito
+    """
+    perfiles = cargar_perfiles_red()
+    nombre = nombre or perfiles.get("perfil_actual")
+    for perfil in perfiles.get("perfiles", []):
+        if perfil["nombre"] == nombre:
+            return perfil, None
+    disponibles = ", ".join(p["nombre"] for p in perfiles.get("perfiles", []))
+    return None, f"Perfil '{nombre}' no encontrado (disponibles: {disponibles})"
+
+def cargar_lista_frecuencias(ruta=None):
+    """
+    Lee las frecuencias de un JSON ({"frecuencias": [...]} o una lista).
+    Sin ruta, usa data/frecuencias.json.
+
+    Returns:
+        list: Frecuencias en Hz o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    if ruta is None:
+        return list(cargar_frecuencias().get("frecuencias", [])), None
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError) as e:
+        return None, f"No se pudo leer {ruta}: {e}"
+
+    frecuencias = datos.get("frecuencias") if isinstance(datos, dict) else datos
+    try:
+        frecuencias = [float(f) for f in frecuencias]
+    except (TypeError, ValueError):
+        return None, f"{ruta} no contiene una lista de frecuencias"
+    if not frecuencias:
+        return None, f"{ruta} no contiene frecuencias"
+    return frecuencias, None
+
+def buscar_referencia(nombre=None):
+    """
+    Busca una referencia por nombre (la activa si no se indica)
+
+    Returns:
+        dict: Referencia o None si no hay ninguna activa
+        str: Mensaje de error o None en caso de éxito
+    """
+    if nombre is None:
+        return referencia_activa(), None
+    for referencia in cargar_referencias()["referencias"]:
+        if referencia["nombre"] == nombre:
+            return referencia, None
+    return None, f"Referencia '{nombre}' no encontrada"
+
+def _finito(valor):
+    # JSON estricto: -inf (ganancia nula en dB) y NaN se escriben como null
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+def _limpiar(registro):
+    return {clave: _finito(valor) for clave, valor in registro.items()}
+
+class SalidaEventos:
+    """Escribe eventos JSON Lines en un flujo desde varios hilos"""
+
+    def __init__(self, flujo):
+        self.flujo = flujo
+        self._lock = threading.Lock()
+
+    def emitir(self, evento, **datos):
+        linea = json.dumps({"evento": evento, "tiempo": round(time.time(), 3), **_limpiar(datos)},
+                           ensure_ascii=False)
+        with self._lock:
+            self.flujo.write(linea + "\n")
+            self.flujo.flush()
+
+def guardar_salida(ruta, mediciones, metadatos):
+    """
+    Guarda las mediciones en CSV (.csv), JSON Lines (.jsonl) o JSON (resto)
+
+    Returns:
+        bool: True si se guardó correctamente
+        str: Mensaje de error o None en caso de éxito
+    """
+    mediciones = [_limpiar(m) for m in mediciones]
+    try:
+        if ruta.endswith(".csv"):
+            campos = list(dict.fromkeys(clave for m in mediciones for clave in m)) or ["frecuencia"]
+            with open(ruta, "w", newline="", encoding="utf-8") as f:
+                escritor = csv.DictWriter(f, fieldnames=campos)
+                escritor.writeheader()
+                escritor.writerows(mediciones)
+        elif ruta.endswith(".jsonl"):
+            with open(ruta, "w", encoding="utf-8") as f:
+                for medicion in mediciones:
+                    f.write(json.dumps(medicion, ensure_ascii=False) + "\n")
+        else:
+            escribir_json_atomico(ruta, {**metadatos, "mediciones": mediciones})
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m modules.barrido",
+        description="Barrido de frecuencias GW Instek sin interfaz (salida JSON Lines)"
+    )
+    parser.add_argument("--perfil", help="Nombre del perfil de perfiles_red.json (por defecto, el actual)")
+    parser.add_argument("--frecuencias", help="JSON con las frecuencias (por defecto, data/frecuencias.json)")
+    parser.add_argument("--amplitud", type=float, default=0.05, help="Amplitud en Vpp (por defecto 0.05)")
+    parser.add_argument("--offset", type=float, default=0.0, help="Offset en V")
+    parser.add_argument("--forma-onda", default="SINusoid", help="Forma de onda SCPI (SINusoid, SQUare...)")
+    parser.add_argument("--estabilizacion", type=float, default=0.5, help="Tiempo de estabilización (s)")
+    parser.add_argument("--entre-mediciones", type=float, default=0.5, help="Pausa entre frecuencias (s)")
+    parser.add_argument("--adaptativo", action="store_true",
+                        help="Espera de establecimiento según la frecuencia y el dispositivo (sustituye a los tiempos fijos)")
+    parser.add_argument("--periodos", type=float, default=10, help="Periodos mínimos a esperar en modo adaptativo")
+    parser.add_argument("--confirmar", action="store_true", help="Confirmar el establecimiento con lecturas repetidas")
+    parser.add_argument("--tolerancia", type=float, default=0.01,
+                        help="Diferencia relativa máxima entre lecturas de confirmación")
+    parser.add_argument("--calibrar", action="store_true",
+                        help="Barrido de calibración con conexión directa: guarda la corrección del perfil")
+    parser.add_argument("--sin-calibracion", action="store_true", help="No aplicar la calibración del perfil")
+    parser.add_argument("--capturas", choices=MODOS_CAPTURA,
+                        help="Guardar la pantalla del osciloscopio en cada punto o solo en los que fallan")
+    parser.add_argument("--plan", help="Plan de barrido JSON/YAML (sustituye a --frecuencias y a las opciones del estímulo)")
+    parser.add_argument("--estimar", action="store_true", help="Compilar el plan, mostrar la duración estimada y salir")
+    parser.add_argument("--referencia", help="Referencia para el veredicto PASA/FALLA (por defecto, la activa)")
+    parser.add_argument("--salida", help="Archivo de resultados (.csv, .jsonl o .json)")
+    parser.add_argument("--grabar", help="Grabar la sesión SCPI para reproducirla sin equipos (.jsonl o .jsonl.gz)")
+    return parser
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    eventos = SalidaEventos(sys.stdout)
+
+    perfil, error = buscar_perfil(args.perfil)
+    if error is None and args.plan:
+        plan, error = cargar_plan(args.plan)
+    elif error is None:
+        frecuencias, error = cargar_lista_frecuencias(args.frecuencias)
+        if error is None:
+            establecimiento = None
+            if args.adaptativo:
+                establecimiento = {"modo": "adaptativo", "periodos": args.periodos,
+                                   "confirmar": args.confirmar, "tolerancia": args.tolerancia}
+            plan = plan_desde_parametros(frecuencias, args.amplitud, args.offset, args.forma_onda,
+                                         args.estabilizacion, args.entre_mediciones, establecimiento)
+    if error is None:
+        programa, error = compilar_plan(plan)
+    if error is None:
+        referencia, error = buscar_referencia(args.referencia)
+    if error:
+        eventos.emitir("error", mensaje=error)
+        return SALIDA_CONFIGURACION
+    if args.calibrar:
+        # La conexión directa no es el dispositivo: sin veredicto ni aborto
+        referencia = None
+
+    plan = programa["plan"]
+    frecuencias = [p["punto"]["frecuencia"] for p in programa["puntos"]]
+    eventos.emitir("plan", **resumen_programa(programa))
+    if args.estimar:
+        return SALIDA_OK
+
+    inicio = datetime.now()
+    eventos.emitir("inicio", perfil=perfil["nombre"], frecuencias=len(frecuencias),
+                   estimulo=plan["estimulo"], adquisicion=plan["adquisicion"], rango=plan["rango"],
+                   establecimiento=plan["establecimiento"])
+
+    mediciones = []
+    resultado = {}
+    token = TokenCancelacion()
+
+    grabadora = None
+    if args.grabar:
+        try:
+            grabadora = Grabadora(args.grabar)
+        except Exception as e:
+            eventos.emitir("error", mensaje=f"No se pudo crear {args.grabar}: {e}")
+            return SALIDA_CONFIGURACION
+        # Con la calibración aplicada, la reproducción corrige igual que la corrida
+        calibracion = None
+        if not args.calibrar and not args.sin_calibracion:
+            calibracion = buscar_calibracion(perfil["nombre"], plan["canales"]["entrada"], plan["canales"]["salida"])
+        grabadora.anotar(**descongelar({
+            "plan": plan, "perfil": perfil["nombre"],
+            "generador": perfil["generador"], "osciloscopio": perfil["osciloscopio"],
+            "calibrar": args.calibrar, "corregir": not args.sin_calibracion, "calibracion": calibracion,
+            "capturar_pantalla": args.capturas,
+            # La reproducción comprueba los puntos contra la misma referencia
+            # (una corrida abortada por FallaReferencia se repite igual)
+            "referencia": referencia,
+        }))
+        activar_transporte(grabadora)
+
+    def progreso(mensaje, progreso=None, total=None):
+        eventos.emitir("progreso", mensaje=mensaje, progreso=progreso, total=total)
+
+    def medicion(registro):
+        mediciones.append(registro)
+        eventos.emitir("medicion", **registro)
+
+    def ejecutar():
+        # Los print de equipos y automatización van a stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            resultado["exito"], resultado["error"] = ejecutar_secuencia_completa(
+                perfil["generador"]["ip"], perfil["generador"]["puerto"],
+                perfil["osciloscopio"]["ip"], perfil["osciloscopio"]["puerto"],
+                progreso_callback=progreso, resultado_callback=medicion,
+                token=token, plan=plan, referencia=referencia,
+                perfil=perfil["nombre"], calibrar=args.calibrar, corregir=not args.sin_calibracion,
+                capturar_pantalla=args.capturas
+            )
+
+    # El barrido corre en un hilo: el principal solo atiende las señales y
+    # cancela el token, que aborta la E/S en curso y apaga la salida
+    def cancelar(numero, marco):
+        token.cancelar()
+
+    signal.signal(signal.SIGINT, cancelar)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, cancelar)
+
+    hilo = threading.Thread(target=ejecutar, name="barrido-cli")
+    hilo.start()
+    while hilo.is_alive():
+        hilo.join(0.2)
+
+    if grabadora is not None:
+        # Las mediciones obtenidas se guardan con la sesión: al reproducirla
+        # deben salir iguales (prueba de regresión)
+        desactivar_transporte()
+        grabadora.anotar(mediciones=[_limpiar(m) for m in mediciones], error=resultado.get("error"))
+        grabadora.cerrar()
+
+    error = resultado.get("error")
+    if token.cancelado:
+        codigo = SALIDA_CANCELADO
+    elif not resultado.get("exito") or not mediciones:
+        codigo = SALIDA_ERROR
+    elif len(mediciones) < len(frecuencias):
+        codigo = SALIDA_PARCIAL
+    else:
+        codigo = SALIDA_OK
+
+    if referencia and mediciones:
+        veredicto = evaluar_mediciones(referencia, mediciones)
+        eventos.emitir("veredicto", **veredicto)
+        if veredicto["veredicto"] == FALLA and not token.cancelado:
+            codigo = SALIDA_FALLA
+
+    if args.salida:
+        guardado, error_salida = guardar_salida(args.salida, mediciones, {
+            "perfil": perfil["nombre"],
+            "inicio": inicio.strftime("%Y-%m-%d %H:%M:%S"),
+            "fin": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "plan": plan,
+        })
+        if not guardado:
+            eventos.emitir("error", mensaje=f"No se pudo guardar {args.salida}: {error_salida}")
+            codigo = max(codigo, SALIDA_ERROR)
+
+    eventos.emitir("fin", codigo=codigo, mediciones=len(mediciones), total=len(frecuencias),
+                   error=error, salida=args.salida, grabacion=args.grabar, duracion=round((datetime.now() - inicio).total_seconds(), 3))
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# Archivo modules/calibracion.py - Calibración "through" y corrección de la ganancia
+#
+# Con los dos canales del osciloscopio conectados al mismo punto (conexión
+# directa, sin dispositivo), CH2/CH1 debería valer 1 (0 dB, 0°). Lo que se
+# mide es el desajuste de sondas y canales: H_thru(f) = |H| e^(j fase). Esa
+# corrección compleja se guarda por perfil y par de canales, y en los
+# barridos siguientes cada punto se divide por H_thru interpolada en
+# log-frecuencia. Una calibración se reutiliza hasta que caduca.
+
+import math
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from modules.config import (
+    DATA_DIR, ensure_data_dir, escribir_json_atomico, invalidar_cache,
+    _cargar_json_cacheado, congelar, descongelar
+)
+
+ARCHIVO_CALIBRACIONES = os.path.join(DATA_DIR, "calibraciones.json")
+
+# Horas que una calibración se considera válida
+VIGENCIA_HORAS = 24.0
+
+# Corrección máxima admitida (dB): más indica un error de conexión, no un desajuste
+CORRECCION_MAXIMA_DB = 20.0
+
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+# Tablas numpy por calibración (id), para no reconstruirlas en cada barrido
+_tablas = {}
+_tablas_lock = threading.Lock()
+
+def clave_calibracion(perfil, entrada=1, salida=2):
+    return f"{perfil}|CH{entrada}-CH{salida}"
+
+def cargar_calibraciones():
+    """
+    Carga las calibraciones guardadas (instantánea inmutable)
+
+    Returns:
+        dict: {"calibraciones": [...]} con una calibración por perfil y par de canales
+    """
+    ensure_data_dir()
+    if os.path.exists(ARCHIVO_CALIBRACIONES):
+        try:
+            return _cargar_json_cacheado(ARCHIVO_CALIBRACIONES)
+        except Exception as e:
+            print(f"Error al cargar calibraciones: {e}")
+    return congelar({"calibraciones": []})
+
+def guardar_calibraciones(datos):
+    ensure_data_dir()
+    try:
+        escribir_json_atomico(ARCHIVO_CALIBRACIONES, descongelar(datos))
+        return True
+    except Exception as e:
+        print(f"Error al guardar calibraciones: {e}")
+        return False
+    finally:
+        invalidar_cache(ARCHIVO_CALIBRACIONES)
+
+def crear_calibracion(perfil, mediciones, entrada=1, salida=2, vigencia_horas=VIGENCIA_HORAS, corrida=None):
+    """
+    Crea una calibración a partir de un barrido con conexión directa
+
+    Args:
+        perfil: Nombre del perfil de red
+        mediciones: Mediciones del barrido (frecuencia, ganancia_real y, si
+            se midió, fase)
+        entrada, salida: Canales del osciloscopio
+        vigencia_horas: Horas hasta que caduca
+        corrida: Identificador de la corrida de origen
+
+    Returns:
+        dict: Calibración o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    puntos = {}
+    for medicion in mediciones:
+        ganancia = medicion.get("ganancia_real")
+        if medicion.get("frecuencia") and ganancia and ganancia > 0 and math.isfinite(ganancia):
+            # Frecuencias repetidas: se conserva la última
+            puntos[float(medicion["frecuencia"])] = (20 * math.log10(ganancia), medicion.get("fase"))
+    if len(puntos) < 2:
+        return None, "La calibración necesita al menos dos frecuencias con ganancia válida"
+
+    frecuencias = sorted(puntos)
+    ganancia_db = [puntos[f][0] for f in frecuencias]
+    peor = max(ganancia_db, key=abs)
+    if abs(peor) > CORRECCION_MAXIMA_DB:
+        return None, (f"Corrección de {peor:+.1f} dB: comprobar que ambos canales estén conectados "
+                      f"al mismo punto (límite ±{CORRECCION_MAXIMA_DB:g} dB)")
+    fases = [puntos[f][1] for f in frecuencias]
+
+    creada = datetime.now()
+    return {
+        "id": f"{creada.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}",
+        "clave": clave_calibracion(perfil, entrada, salida),
+        "perfil": perfil,
+        "entrada": entrada,
+        "salida": salida,
+        "creada": creada.strftime(_FORMATO_FECHA),
+        "caduca": (creada + timedelta(hours=vigencia_horas)).strftime(_FORMATO_FECHA),
+        "corrida": corrida,
+        "frecuencias": frecuencias,
+        "ganancia_db": ganancia_db,
+        # Sin fase medida en todos los puntos solo se corrige la magnitud
+        "fase": fases if all(f is not None for f in fases) else None,
+    }, None
+
+def guardar_calibracion(calibracion):
+    """
+    Guarda una calibración, reemplazando la anterior del mismo perfil y par de canales
+
+    Returns:
+        bool: True si se guardó correctamente
+    """
+    datos = descongelar(cargar_calibraciones())
+    datos["calibraciones"] = [c for c in datos["calibraciones"] if c["clave"] != calibracion["clave"]]
+    datos["calibraciones"].append(descongelar(calibracion))
+    return guardar_calibraciones(datos)
+
+def estado_calibracion(calibracion, ahora=None):
+    """
+    Returns:
+        dict: edad_horas, restante_horas y vigente
+    """
+    ahora = ahora or datetime.now()
+    creada = datetime.strptime(calibracion["creada"], _FORMATO_FECHA)
+    caduca = datetime.strptime(calibracion["caduca"], _FORMATO_FECHA)
+    return {
+        "edad_horas": (ahora - creada).total_seconds() / 3600,
+        "restante_horas": (caduca - ahora).total_seconds() / 3600,
+        "vigente": ahora < caduca,
+    }
+
+def buscar_calibracion(perfil, entrada=1, salida=2, solo_vigente=True):
+    """
+    Calibración de un perfil y par de canales
+
+    Returns:
+        dict: Calibración (instantánea) o None si no hay (o si caducó y se
+            pide solo_vigente)
+    """
+    clave = clave_calibracion(perfil, entrada, salida)
+    for calibracion in cargar_calibraciones()["calibraciones"]:
+        if calibracion["clave"] == clave:
+            if solo_vigente and not estado_calibracion(calibracion)["vigente"]:
+                return None
+            return calibracion
+    return None
+
+def _tabla(calibracion):
+    import numpy as np
+
+    with _tablas_lock:
+        tabla = _tablas.get(calibracion["id"])
+        if tabla is None:
+            fase = calibracion.get("fase")
+            tabla = (
+                np.log10(np.asarray(calibracion["frecuencias"], dtype=float)),
+                np.asarray(calibracion["ganancia_db"], dtype=float),
+                np.unwrap(np.radians(np.asarray(fase, dtype=float))) if fase else None,
+            )
+            _tablas[calibracion["id"]] = tabla
+    return tabla
+
+def correcciones(calibracion, frecuencias):
+    """
+    Corrección para muchas frecuencias en un solo cálculo (interpolación en
+    log-frecuencia; fuera del rango calibrado no se corrige)
+
+    Returns:
+        list: Por frecuencia, (factor lineal por el que dividir la ganancia,
+            fase en grados a restar o None) o None si está fuera del rango
+    """
+    import numpy as np
+
+    X, G, P = _tabla(calibracion)
+    x = np.log10(np.asarray(frecuencias, dtype=float))
+    dentro = (x >= X[0] - 1e-12) & (x <= X[-1] + 1e-12)
+    factor = 10 ** (np.interp(x, X, G) / 20)
+    fase = np.degrees(np.interp(x, X, P)) if P is not None else None
+    return [
+        (float(factor[i]), float(fase[i]) if fase is not None else None) if dentro[i] else None
+        for i in range(len(x))
+    ]
+
+def aplicar_correccion(resultado, correccion, calibracion_id=None):
+    """
+    Divide las ganancias de un resultado por la corrección (y le resta la
+    fase); los valores medidos se conservan en los campos *_sin_corregir
+
+    Returns:
+        dict: El mismo resultado, corregido
+    """
+    if correccion is None:
+        resultado["calibrado"] = False
+        return resultado
+    factor, fase = correccion
+    for campo in ("ganancia_pk2pk", "ganancia_amplitud", "ganancia_real"):
+        resultado[f"{campo}_sin_corregir"] = resultado[campo]
+        resultado[campo] = resultado[campo] / factor
+        en_db = f"{campo}_db"
+        if en_db in resultado:
+            resultado[en_db] = 20 * math.log10(resultado[campo]) if resultado[campo] > 0 else float("-inf")
+    if fase is not None and resultado.get("fase") is not None:
+        resultado["fase_sin_corregir"] = resultado["fase"]
+        resultado["fase"] = (resultado["fase"] - fase + 180) % 360 - 180
+    resultado["correccion_db"] = 20 * math.log10(factor)
+    resultado["calibrado"] = True
+    resultado["calibracion"] = calibracion_id
+    return resultado
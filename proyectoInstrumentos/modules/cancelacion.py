@@ -0,0 +1,109 @@
+# Archivo modules/cancelacion.py - Cancelación de barridos con esperas interrumpibles
+
+import itertools
+import threading
+import time
+
+class OperacionCancelada(BaseException):
+    """
+    Se lanza cuando el usuario detiene la operación en curso.
+
+    Hereda de BaseException (como asyncio.CancelledError) para que los bloques
+    `except Exception` de los equipos y de la automatización no la absorban.
+    """
+
+class TokenCancelacion:
+    """
+    Señal de cancelación compartida por el barrido y los equipos.
+
+    - esperar()/dormir() sustituyen a time.sleep y terminan en cuanto se cancela.
+    - verificar() lanza OperacionCancelada si ya se canceló.
+    - al_cancelar() registra acciones que abortan la E/S en curso (por ejemplo,
+      cerrar la sesión VISA bloqueada en una lectura).
+
+    Args:
+        funcion: Función opcional sin argumentos que devuelve True si hay que
+            detenerse (compatibilidad con funcion_verificar_detencion)
+        intervalo_sondeo: Periodo (s) con que se consulta la función mientras se espera
+    """
+
+    def __init__(self, funcion=None, intervalo_sondeo=0.05):
+        self._evento = threading.Event()
+        self._funcion = funcion
+        self._intervalo_sondeo = intervalo_sondeo
+        self._lock = threading.Lock()
+        self._acciones = {}
+        self._ids = itertools.count()
+
+    @property
+    def cancelado(self):
+        if not self._evento.is_set() and self._funcion is not None and self._funcion():
+            self.cancelar()
+        return self._evento.is_set()
+
+    def __call__(self):
+        # Permite usar el token donde se espera funcion_verificar_detencion
+        return self.cancelado
+
+    def cancelar(self):
+        """Marca la cancelación y ejecuta las acciones registradas (una sola vez)"""
+        with self._lock:
+            if self._evento.is_set():
+                return
+            self._evento.set()
+            acciones = list(self._acciones.values())
+            self._acciones.clear()
+
+        for accion in acciones:
+            try:
+                accion()
+            except Exception as e:
+                print(f"Error al abortar operación: {e}")
+
+    def verificar(self):
+        if self.cancelado:
+            raise OperacionCancelada()
+
+    def esperar(self, segundos):
+        """
+        Espera hasta `segundos` o hasta que se cancele
+
+        Returns:
+            bool: True si se canceló durante la espera
+        """
+        if self._funcion is None:
+            return self._evento.wait(segundos)
+
+        limite = time.monotonic() + segundos
+        while not self.cancelado:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return False
+            self._evento.wait(min(restante, self._intervalo_sondeo))
+        return True
+
+    def dormir(self, segundos):
+        """Como time.sleep, pero lanza OperacionCancelada si se cancela"""
+        if self.esperar(segundos):
+            raise OperacionCancelada()
+
+    def al_cancelar(self, accion):
+        """
+        Registra una acción que se ejecuta al cancelar
+
+        Si el token ya está cancelado, la acción se ejecuta en el momento.
+
+        Returns:
+            int: Identificador para retirar la acción con retirar()
+        """
+        with self._lock:
+            if not self._evento.is_set():
+                identificador = next(self._ids)
+                self._acciones[identificador] = accion
+                return identificador
+        accion()
+        return None
+
+    def retirar(self, identificador):
+        with self._lock:
+            self._acciones.pop(identificador, None)
@@ -0,0 +1,216 @@
+# Archivo modules/capturas.py - Capturas de pantalla del osciloscopio durante un barrido
+#
+# La imagen se lee en el hilo de medición (la conexión es suya), pero la
+# conversión a PNG y la escritura en disco van en un hilo aparte: capturar
+# solo prolonga el barrido lo que tarda la transferencia.
+#
+# Para que esa transferencia no domine el barrido hay un presupuesto:
+#   - tamaño máximo por imagen (una mayor se descarta sin leerla entera);
+#   - ancho de banda medio (bytes/s, con una ráfaga inicial): si se agota,
+#     los puntos siguientes no se capturan hasta que se recupere;
+#   - total máximo por barrido.
+
+import io
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from modules.config import DATA_DIR
+from modules.grabacion import transporte_activo
+
+DIRECTORIO_CAPTURAS = os.path.join(DATA_DIR, "capturas")
+
+# Modos: "punto" captura cada punto; "falla", solo los puntos que fallan
+MODOS_CAPTURA = ("punto", "falla")
+
+TAMANO_MAXIMO = 2 * 1024 * 1024        # bytes por imagen (una BMP de 800x480 a 24 bits ocupa ~1.1 MB)
+BYTES_POR_SEGUNDO = 256 * 1024         # media admitida durante el barrido
+RAFAGA = 4 * 1024 * 1024               # crédito inicial (las primeras capturas no esperan)
+TOTAL_MAXIMO = 64 * 1024 * 1024        # bytes por barrido
+
+# Marcador interno de la cola
+_CERRAR = object()
+
+def _reloj():
+    # Al reproducir una sesión grabada cuenta el tiempo de la grabación
+    transporte = transporte_activo()
+    return transporte.reloj() if hasattr(transporte, "reloj") else time.monotonic()
+
+class GuardadoCapturas:
+    """
+    Captura la pantalla del osciloscopio en los puntos de un barrido y la
+    guarda en segundo plano.
+
+    Args:
+        modo: "punto" (cada punto) o "falla" (solo los que fallan)
+        directorio: Carpeta de las imágenes (se crea al guardar la primera)
+        tamano_maximo: Bytes como máximo por imagen
+        bytes_por_segundo: Ancho de banda medio para capturas
+        rafaga: Bytes que se pueden capturar de golpe antes de limitar
+        total_maximo: Bytes como máximo en todo el barrido
+        capacidad: Imágenes pendientes de guardar como máximo (si la cola
+            está llena, la captura se omite en lugar de esperar al disco)
+        progreso_callback: Función callback para informar avisos y errores
+    """
+
+    def __init__(self, modo="falla", directorio=DIRECTORIO_CAPTURAS, tamano_maximo=TAMANO_MAXIMO,
+                 bytes_por_segundo=BYTES_POR_SEGUNDO, rafaga=RAFAGA, total_maximo=TOTAL_MAXIMO,
+                 capacidad=8, progreso_callback=None):
+        if modo not in MODOS_CAPTURA:
+            raise ValueError(f"Modo de captura no válido: {modo} (usar {', '.join(MODOS_CAPTURA)})")
+        self.modo = modo
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        self.bytes_por_segundo = bytes_por_segundo
+        self.rafaga = rafaga
+        self.total_maximo = total_maximo
+        self.progreso_callback = progreso_callback
+
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._hilo = None
+        self._credito = float(rafaga)
+        self._ultima_recarga = _reloj()
+        self.capturadas = 0
+        self.omitidas = 0
+        self.guardadas = 0
+        self.errores = 0
+        self.bytes = 0
+        self.segundos = 0.0
+        self.archivos = []
+
+    def _informar(self, mensaje):
+        if self.progreso_callback:
+            try:
+                self.progreso_callback(mensaje)
+            except Exception as e:
+                print(f"Error en callback de capturas: {e}")
+        else:
+            print(mensaje)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name="guardado-capturas", daemon=True)
+            self._hilo.start()
+        return self
+
+    def _con_presupuesto(self):
+        # Crédito que se recupera a bytes_por_segundo, hasta la ráfaga. Se
+        # permite una captura mientras quede crédito; su tamaño real se
+        # descuenta después (el crédito puede quedar negativo)
+        ahora = _reloj()
+        self._credito = min(self.rafaga, self._credito + (ahora - self._ultima_recarga) * self.bytes_por_segundo)
+        self._ultima_recarga = ahora
+        return self._credito > 0 and self.bytes < self.total_maximo
+
+    def capturar(self, osciloscopio, etiqueta, falla=False):
+        """
+        Captura la pantalla si el modo y el presupuesto lo permiten y la
+        encola para guardarla
+
+        Args:
+            osciloscopio: Osciloscopio conectado
+            etiqueta: Nombre del punto en el archivo (p. ej. "003_1000Hz")
+            falla: El punto ha fallado
+
+        Returns:
+            bool: True si se capturó y encoló la imagen
+        """
+        if self.modo == "falla" and not falla:
+            return False
+        if not self._con_presupuesto() or self._cola.full():
+            self.omitidas += 1
+            return False
+
+        inicio = time.perf_counter()
+        imagen, error = osciloscopio.capturar_pantalla(self.tamano_maximo)
+        self.segundos += time.perf_counter() - inicio
+        if error:
+            self.errores += 1
+            self._informar(f"No se pudo capturar la pantalla ({etiqueta}): {error}")
+            return False
+
+        self._credito -= len(imagen)
+        self.bytes += len(imagen)
+        self.capturadas += 1
+        try:
+            self._cola.put_nowait((imagen, etiqueta + ("_falla" if falla else "")))
+            return True
+        except queue.Full:
+            self.omitidas += 1
+            return False
+
+    def cerrar(self, timeout=None):
+        """Guarda las imágenes pendientes y detiene el hilo"""
+        if self._hilo is None:
+            return True
+
+        self._cola.put((_CERRAR, None))
+        self._hilo.join(timeout)
+        terminado = not self._hilo.is_alive()
+        self._hilo = None
+        return terminado
+
+    def resumen(self):
+        """
+        Returns:
+            dict: capturadas, guardadas, omitidas, errores, bytes, segundos
+                (tiempo de transferencia, el que se añade al barrido) y directorio
+        """
+        return {
+            "capturadas": self.capturadas, "guardadas": self.guardadas, "omitidas": self.omitidas,
+            "errores": self.errores, "bytes": self.bytes, "segundos": round(self.segundos, 3),
+            "directorio": self.directorio,
+        }
+
+    def _guardar(self, imagen, nombre):
+        datos, extension = convertir_imagen(imagen)
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = os.path.join(self.directorio, nombre + extension)
+        temporal = ruta + ".tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+        self.archivos.append(ruta)
+        self.guardadas += 1
+
+    def _ejecutar(self):
+        while True:
+            imagen, nombre = self._cola.get()
+            if imagen is _CERRAR:
+                return
+            try:
+                self._guardar(imagen, nombre)
+            except Exception as e:
+                self.errores += 1
+                self._informar(f"Error al guardar la captura {nombre}: {e}")
+
+def convertir_imagen(imagen):
+    """
+    Comprime a PNG la imagen de la pantalla (los osciloscopios GDS envían BMP)
+
+    Returns:
+        bytes: Imagen para guardar
+        str: Extensión del archivo
+    """
+    if imagen.startswith(b"\x89PNG"):
+        return imagen, ".png"
+    if not imagen.startswith(b"BM"):
+        return imagen, ".bin"
+    try:
+        # Pillow es opcional: sin él se guarda el BMP tal cual
+        from PIL import Image
+    except ImportError:
+        return imagen, ".bmp"
+    try:
+        salida = io.BytesIO()
+        Image.open(io.BytesIO(imagen)).save(salida, format="PNG", optimize=False)
+        return salida.getvalue(), ".png"
+    except Exception:
+        return imagen, ".bmp"
+
+def directorio_corrida(inicio=None):
+    """Carpeta de las capturas de un barrido (una por fecha y hora de inicio)"""
+    inicio = inicio or datetime.now()
+    return os.path.join(DIRECTORIO_CAPTURAS, inicio.strftime("%Y%m%d-%H%M%S"))
@@ -0,0 +1,131 @@
+# Archivo modules/conexiones.py - Conexión de varios equipos en paralelo
+#
+# El generador y el osciloscopio son equipos independientes (IPs distintas):
+# conectar, identificar y configurar uno no tiene por qué esperar al otro.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.cancelacion import OperacionCancelada
+from modules.equipos import Osciloscopio, GeneradorFunciones
+from modules.reservas import reserva_equipo, describir_reserva
+
+# Hilos máximos para probar las conexiones de todos los perfiles
+MAX_HILOS_PRUEBA = 16
+
+def _preparar(nombre, equipo, configurar, informar):
+    informar(f"Conectando al {nombre} ({equipo.ip}:{equipo.puerto})...")
+    conectado, error = equipo.conectar()
+    if not conectado:
+        return None, f"Error al conectar con el {nombre}: {error}"
+    identificacion, error = equipo.identificar()
+    if equipo.token is not None:
+        equipo.token.verificar()
+    if error:
+        return None, f"Error al identificar el {nombre}: {error}"
+    informar(f"{nombre.capitalize()} identificado: {identificacion}")
+    if configurar is not None:
+        error = configurar(equipo)
+        if error:
+            return None, f"Error al configurar el {nombre}: {error}"
+    return identificacion, None
+
+def preparar_en_paralelo(tareas, informar=None):
+    """
+    Conecta, identifica y (opcionalmente) configura varios equipos a la vez
+
+    Si alguno falla, se informan todos los errores juntos y se desconectan
+    todos los equipos (el llamador sigue siendo responsable de apagar la
+    salida del generador si su configuración llegó a activarla). Una
+    cancelación en cualquiera de ellos se relanza tras la limpieza.
+
+    Args:
+        tareas: Lista de (nombre, equipo, configurar); configurar(equipo)
+            devuelve un mensaje de error o None, y puede ser None
+        informar: Función para los mensajes de progreso
+
+    Returns:
+        dict: Identificación por nombre o None en caso de error
+        str: Errores combinados o None en caso de éxito
+    """
+    informar = informar or print
+    with ThreadPoolExecutor(max_workers=len(tareas), thread_name_prefix="conexion") as ejecutor:
+        futuros = [(nombre, equipo, ejecutor.submit(_preparar, nombre, equipo, configurar, informar))
+                   for nombre, equipo, configurar in tareas]
+
+    identificaciones = {}
+    errores = []
+    cancelacion = None
+    for nombre, equipo, futuro in futuros:
+        try:
+            identificacion, error = futuro.result()
+        except OperacionCancelada as e:
+            cancelacion = e
+            continue
+        except Exception as e:
+            identificacion, error = None, f"Error al preparar el {nombre}: {e}"
+        if error:
+            errores.append(error)
+        else:
+            identificaciones[nombre] = identificacion
+
+    if errores or cancelacion is not None:
+        for _, equipo, _ in tareas:
+            equipo.desconectar()
+        if cancelacion is not None:
+            raise cancelacion
+        return None, "; ".join(errores)
+    return identificaciones, None
+
+def _probar(clase, ip, puerto, timeout):
+    reserva = reserva_equipo(ip, puerto)
+    if reserva is not None:
+        # Un barrido lo está usando: conectar le cortaría la sesión
+        return {"conectado": False, "identificacion": None, "error": describir_reserva(reserva), "ms": None}
+    equipo = clase(ip, puerto, timeout=timeout)
+    inicio = time.perf_counter()
+    conectado, error = equipo.conectar()
+    identificacion = None
+    if conectado:
+        identificacion, error = equipo.identificar()
+        equipo.desconectar()
+    return {
+        "conectado": conectado and not error,
+        "identificacion": identificacion,
+        "error": error,
+        "ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+def probar_perfiles(perfiles, timeout=3000):
+    """
+    Prueba a la vez la conexión de los equipos de todos los perfiles
+
+    Cada dirección (IP:puerto) se prueba una sola vez aunque la compartan
+    varios perfiles. Los equipos reservados por un barrido (modules.reservas)
+    no se conectan: su fila lo indica en el error.
+
+    Args:
+        perfiles: Lista de perfiles (perfiles_red.json)
+        timeout: Timeout de cada conexión en ms
+
+    Returns:
+        list: Una fila por perfil y equipo (perfil, equipo, ip, puerto,
+            conectado, identificacion, error, ms)
+    """
+    equipos = []
+    for perfil in perfiles:
+        for rol, clase in (("osciloscopio", Osciloscopio), ("generador", GeneradorFunciones)):
+            equipos.append((perfil["nombre"], rol, clase, perfil[rol]["ip"], perfil[rol]["puerto"]))
+
+    direcciones = {(clase, ip, puerto) for _, _, clase, ip, puerto in equipos}
+    if not direcciones:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_HILOS_PRUEBA, len(direcciones)),
+                            thread_name_prefix="prueba") as ejecutor:
+        futuros = {direccion: ejecutor.submit(_probar, *direccion, timeout) for direccion in direcciones}
+
+    return [
+        {"perfil": nombre, "equipo": rol, "ip": ip, "puerto": puerto,
+         **futuros[(clase, ip, puerto)].result()}
+        for nombre, rol, clase, ip, puerto in equipos
+    ]
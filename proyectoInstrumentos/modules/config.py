@@ -1,28 +1,144 @@
 import os
 import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
 from datetime import datetime
 
 # Directorio de datos
 DATA_DIR = "data"
 
+# Archivos de configuración y resultados
+ARCHIVO_PERFILES = os.path.join(DATA_DIR, "perfiles_red.json")
+ARCHIVO_FRECUENCIAS = os.path.join(DATA_DIR, "frecuencias.json")
+ARCHIVO_DATOS_GANANCIA = os.path.join(DATA_DIR, "datos_ganancia.json")
+
+# Caché de archivos JSON validada por (ruta, mtime, tamaño). Guarda instantáneas
+# inmutables para que Streamlit no vuelva a parsear los archivos en cada rerun.
+_cache_json = {}
+_cache_lock = threading.Lock()
+_generacion_cache = 0
+
 # Asegurar que el directorio de datos exista
 def ensure_data_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
+# Escribir un JSON de forma atómica (archivo temporal + rename) para que un
+# lector nunca vea un archivo a medio escribir
+def escribir_json_atomico(archivo, datos):
+    directorio = os.path.dirname(archivo) or "."
+    descriptor, temporal = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "w") as f:
+            json.dump(datos, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, archivo)
+    except Exception:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+
+# Bloqueo exclusivo entre procesos (la interfaz y `python -m modules.barrido`)
+# sobre <archivo>.lock mientras dura el bloque: para leer, modificar y
+# guardar un archivo sin perder las escrituras de otro proceso
+@contextmanager
+def bloqueo_archivo(archivo):
+    with open(archivo + ".lock", "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK reintenta durante unos 10 s y luego falla
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+# Firma de un archivo para validar la caché; None si no existe
+def firma_archivo(archivo):
+    try:
+        estado = os.stat(archivo)
+    except OSError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size)
+
+# Versión de la caché; cambia con cada invalidación explícita
+def generacion_cache():
+    return _generacion_cache
+
+# Convertir datos JSON en una instantánea inmutable (dict -> mappingproxy, list -> tuple)
+def congelar(valor):
+    if isinstance(valor, dict):
+        return MappingProxyType({k: congelar(v) for k, v in valor.items()})
+    if isinstance(valor, (list, tuple)):
+        return tuple(congelar(v) for v in valor)
+    return valor
+
+# Copia modificable de una instantánea (para editar y volver a guardar)
+def descongelar(valor):
+    if isinstance(valor, (dict, MappingProxyType)):
+        return {k: descongelar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [descongelar(v) for v in valor]
+    return valor
+
+# Invalidar la caché de un archivo (o de todos si archivo es None)
+def invalidar_cache(archivo=None):
+    global _generacion_cache
+    with _cache_lock:
+        if archivo is None:
+            _cache_json.clear()
+        else:
+            _cache_json.pop(archivo, None)
+        _generacion_cache += 1
+
+# Cargar un JSON usando la caché; devuelve None si el archivo no existe
+def _cargar_json_cacheado(archivo):
+    firma = firma_archivo(archivo)
+    if firma is None:
+        return None
+    
+    with _cache_lock:
+        entrada = _cache_json.get(archivo)
+        if entrada is not None and entrada[0] == firma:
+            return entrada[1]
+    
+    with open(archivo, "r") as f:
+        instantanea = congelar(json.load(f))
+    
+    with _cache_lock:
+        _cache_json[archivo] = (firma, instantanea)
+    return instantanea
+
 # Función para cargar perfiles de red
 def cargar_perfiles_red():
     ensure_data_dir()
-    archivo = os.path.join(DATA_DIR, "perfiles_red.json")
+    archivo = ARCHIVO_PERFILES
     
     if os.path.exists(archivo):
         try:
-            with open(archivo, "r") as f:
-                return json.load(f)
+            return _cargar_json_cacheado(archivo)
         except Exception as e:
             print(f"Error al cargar perfiles de red: {e}")
     
     # Perfil por defecto si no existe el archivo
-    return {
+    return congelar({
         "perfiles": [
             {
                 "nombre": "Perfil Predeterminado",
@@ -38,20 +154,21 @@ def cargar_perfiles_red():
             }
         ],
         "perfil_actual": "Perfil Predeterminado"
-    }
+    })
 
 # Función para guardar perfiles de red
 def guardar_perfiles_red(perfiles):
     ensure_data_dir()
-    archivo = os.path.join(DATA_DIR, "perfiles_red.json")
+    archivo = ARCHIVO_PERFILES
     
     try:
-        with open(archivo, "w") as f:
-            json.dump(perfiles, f, indent=4)
+        escribir_json_atomico(archivo, descongelar(perfiles))
         return True
     except Exception as e:
         print(f"Error al guardar perfiles de red: {e}")
         return False
+    finally:
+        invalidar_cache(archivo)
 
 # Función para cargar lista de frecuencias
 
@@ -59,88 +176,87 @@ def guardar_perfiles_red(perfiles):
 
 def cargar_frecuencias():
     ensure_data_dir()
-    archivo = os.path.join(DATA_DIR, "frecuencias.json")
+    archivo = ARCHIVO_FRECUENCIAS
     
     if os.path.exists(archivo):
         try:
-            with open(archivo, "r") as f:
-                return json.load(f)
+            return _cargar_json_cacheado(archivo)
         except Exception as e:
             print(f"Error al cargar frecuencias: {e}")
     
     # Generar frecuencias logarítmicas si no existe el archivo - cambiado a 30
-    import numpy as np
-    frecuencias = np.logspace(1, 6, 30).tolist()  # 30 frecuencias de 10Hz a 1MHz
-    frecuencias = [round(f, 2) for f in frecuencias]
+    frecuencias = generar_frecuencias(10, 1000000, 30)  # 30 frecuencias de 10Hz a 1MHz
     
     # Guardar las frecuencias generadas
+    if not guardar_frecuencias(frecuencias):
+        print("Error al guardar frecuencias generadas")
+    
+    return congelar({"frecuencias": frecuencias})
+
+# Función para generar una lista de frecuencias redondeadas a 2 decimales
+def generar_frecuencias(freq_min, freq_max, num_puntos, escala="Logarítmica"):
+    import numpy as np
+    
+    if escala == "Logarítmica":
+        frecuencias = np.logspace(np.log10(freq_min), np.log10(freq_max), int(num_puntos))
+    else:  # Lineal
+        frecuencias = np.linspace(freq_min, freq_max, int(num_puntos))
+    
+    return [round(f, 2) for f in frecuencias.tolist()]
+
+# Función para guardar lista de frecuencias
+def guardar_frecuencias(frecuencias):
+    ensure_data_dir()
+    archivo = ARCHIVO_FRECUENCIAS
+    
     try:
-        with open(archivo, "w") as f:
-            json.dump({"frecuencias": frecuencias}, f, indent=4)
+        escribir_json_atomico(archivo, {"frecuencias": list(frecuencias)})
+        return True
     except Exception as e:
-        print(f"Error al guardar frecuencias generadas: {e}")
-    
-    return {"frecuencias": frecuencias}
+        print(f"Error al guardar frecuencias: {e}")
+        return False
+    finally:
+        invalidar_cache(archivo)
 
 # Función para cargar datos de ganancia
 def cargar_datos_ganancia():
     ensure_data_dir()
-    archivo = os.path.join(DATA_DIR, "datos_ganancia.json")
+    archivo = ARCHIVO_DATOS_GANANCIA
     
     if os.path.exists(archivo):
         try:
-            with open(archivo, "r") as f:
-                return json.load(f)
+            return _cargar_json_cacheado(archivo)
         except Exception as e:
             print(f"Error al cargar datos de ganancia: {e}")
     
     # Estructura inicial si no existe el archivo
-    return {
+    return congelar({
         "mediciones": [],
         "ultima_actualizacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
+    })
 
 # Función para guardar datos de ganancia
 def guardar_datos_ganancia(datos_ganancia):
     ensure_data_dir()
-    archivo = os.path.join(DATA_DIR, "datos_ganancia.json")
+    archivo = ARCHIVO_DATOS_GANANCIA
     
     # Actualizar fecha de última modificación
     datos_ganancia["ultima_actualizacion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     try:
-        with open(archivo, "w") as f:
-            json.dump(datos_ganancia, f, indent=4)
+        escribir_json_atomico(archivo, datos_ganancia)
         return True
     except Exception as e:
         print(f"Error al guardar datos de ganancia: {e}")
         return False
+    finally:
+        invalidar_cache(archivo)
 
 # Función para agregar una nueva medición de ganancia
-def agregar_medicion_ganancia(frecuencia, canal1_pk2pk, canal1_amplitud, 
-                             canal2_pk2pk, canal2_amplitud, ganancia_pk2pk, 
-                             ganancia_amplitud, ganancia_real):
-    datos = cargar_datos_ganancia()
-    
-    # Verificar si ya existe una medición para esta frecuencia
-    for i, medicion in enumerate(datos["mediciones"]):
-        if medicion["frecuencia"] == frecuencia:
-            # Actualizar medición existente
-            datos["mediciones"][i] = {
-                "frecuencia": frecuencia,
-                "canal1_pk2pk": canal1_pk2pk,
-                "canal1_amplitud": canal1_amplitud,
-                "canal2_pk2pk": canal2_pk2pk,
-                "canal2_amplitud": canal2_amplitud,
-                "ganancia_pk2pk": ganancia_pk2pk,
-                "ganancia_amplitud": ganancia_amplitud,
-                "ganancia_real": ganancia_real,
-                "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            return guardar_datos_ganancia(datos)
-    
-    # Agregar nueva medición
-    datos["mediciones"].append({
+def agregar_medicion_ganancia(frecuencia, canal1_pk2pk, canal1_amplitud,
+                             canal2_pk2pk, canal2_amplitud, ganancia_pk2pk,
+                             ganancia_amplitud, ganancia_real, amplitud=None, offset=None):
+    return agregar_mediciones_ganancia([{
         "frecuencia": frecuencia,
         "canal1_pk2pk": canal1_pk2pk,
         "canal1_amplitud": canal1_amplitud,
@@ -149,7 +265,53 @@ def agregar_medicion_ganancia(frecuencia, canal1_pk2pk, canal1_amplitud,
         "ganancia_pk2pk": ganancia_pk2pk,
         "ganancia_amplitud": ganancia_amplitud,
         "ganancia_real": ganancia_real,
-        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+        "amplitud": amplitud,
+        "offset": offset
+    }])
+
+# Función para agregar un lote de mediciones con una sola lectura y escritura.
+# La interfaz, el servicio de barridos y `python -m modules.barrido` escriben
+# en el mismo archivo: la lectura y la escritura van bajo bloqueo_archivo
+def agregar_mediciones_ganancia(mediciones):
+    ensure_data_dir()
+    with bloqueo_archivo(ARCHIVO_DATOS_GANANCIA):
+        return _agregar_mediciones_ganancia(mediciones)
+
+def _clave_medicion(medicion):
+    # Un plan que barre la amplitud o el offset mide varias veces cada
+    # frecuencia: esos parámetros forman parte de la clave
+    return (medicion["frecuencia"], medicion.get("amplitud"), medicion.get("offset"))
+
+def _agregar_mediciones_ganancia(mediciones):
+    datos = descongelar(cargar_datos_ganancia())
+    
+    # Índice por frecuencia (y amplitud y offset barridos) para reemplazar
+    # mediciones existentes
+    indice = {_clave_medicion(m): i for i, m in enumerate(datos["mediciones"])}
+    
+    for medicion in mediciones:
+        registro = {
+            "frecuencia": medicion["frecuencia"],
+            "canal1_pk2pk": medicion["canal1_pk2pk"],
+            "canal1_amplitud": medicion["canal1_amplitud"],
+            "canal2_pk2pk": medicion["canal2_pk2pk"],
+            "canal2_amplitud": medicion["canal2_amplitud"],
+            "ganancia_pk2pk": medicion["ganancia_pk2pk"],
+            "ganancia_amplitud": medicion["ganancia_amplitud"],
+            "ganancia_real": medicion["ganancia_real"],
+            "fecha": medicion.get("fecha") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        for campo in ("amplitud", "offset"):
+            if medicion.get(campo) is not None:
+                registro[campo] = medicion[campo]
+        
+        clave = _clave_medicion(registro)
+        if clave in indice:
+            # Actualizar medición existente
+            datos["mediciones"][indice[clave]] = registro
+        else:
+            # Agregar nueva medición
+            indice[clave] = len(datos["mediciones"])
+            datos["mediciones"].append(registro)
     
     return guardar_datos_ganancia(datos)
@@ -0,0 +1,170 @@
+# Archivo modules/corridas.py - Historial de corridas (barridos) con sus métricas
+#
+# Cada barrido deja una línea en data/corridas.jsonl con sus mediciones y las
+# métricas de la curva de Bode (modules.analisis), y actualiza los agregados
+# de control estadístico (modules.spc). El archivo solo se amplía
+# (una escritura por corrida), así que la interfaz, el servicio y la línea de
+# comandos pueden registrar corridas a la vez sin reescribirlo.
+
+import json
+import math
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from modules.config import DATA_DIR, ensure_data_dir, firma_archivo
+
+ARCHIVO_CORRIDAS = os.path.join(DATA_DIR, "corridas.jsonl")
+
+_lock = threading.Lock()
+_cache = {"firma": None, "corridas": []}
+
+def _finito(valor):
+    # JSON estricto: -inf (ganancia nula en dB) y NaN se guardan como null
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    if isinstance(valor, dict):
+        return {clave: _finito(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_finito(v) for v in valor]
+    return valor
+
+def calcular_metricas(mediciones, columna="ganancia_real"):
+    """
+    Métricas de Bode de una lista de mediciones (modules.analisis)
+
+    Returns:
+        dict: Métricas o None si no hay datos suficientes
+    """
+    from modules.analisis import analizar_lote
+
+    puntos = [(m["frecuencia"], m[columna]) for m in mediciones if m.get(columna)]
+    if len(puntos) < 2:
+        return None
+    frecuencias = [f for f, _ in puntos]
+    ganancias_db = [20 * math.log10(g) if g > 0 else float("-inf") for _, g in puntos]
+    return analizar_lote([(frecuencias, ganancias_db)])[0]
+
+def registrar_corrida(mediciones, inicio, estado="completa", **datos):
+    """
+    Añade una corrida al historial, con sus métricas
+
+    Args:
+        mediciones: Resultados de la corrida (como los de ejecutar_medicion_automatica)
+        inicio: datetime de inicio
+        estado: "completa", "detenida" o "error"
+        **datos: Campos adicionales (plan, equipos, error...)
+
+    Returns:
+        dict: Registro guardado o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    fin = datetime.now()
+    registro = {
+        "id": f"{inicio.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}",
+        "inicio": inicio.strftime("%Y-%m-%d %H:%M:%S"),
+        "fin": fin.strftime("%Y-%m-%d %H:%M:%S"),
+        "duracion": round((fin - inicio).total_seconds(), 1),
+        "estado": estado,
+        **datos,
+        "mediciones": [dict(m) for m in mediciones],
+    }
+
+    try:
+        registro["metricas"] = calcular_metricas(mediciones)
+    except Exception as e:
+        print(f"Error al calcular las métricas de la corrida: {e}")
+        registro["metricas"] = None
+
+    try:
+        ensure_data_dir()
+        linea = json.dumps(_finito(registro), ensure_ascii=False)
+        with _lock, open(ARCHIVO_CORRIDAS, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+    except Exception as e:
+        print(f"Error al registrar la corrida: {e}")
+        return None, str(e)
+
+    # Agregados de control estadístico: se actualizan con cada corrida
+    try:
+        from modules.spc import actualizar_spc
+        actualizar_spc(registro)
+    except Exception as e:
+        print(f"Error al actualizar los agregados SPC: {e}")
+    return registro, None
+
+def cargar_corridas():
+    """
+    Lee el historial de corridas (de la más antigua a la más reciente)
+
+    Se relee solo si el archivo cambió; las líneas dañadas se ignoran.
+
+    Returns:
+        list: Registros de corridas
+    """
+    firma = firma_archivo(ARCHIVO_CORRIDAS)
+    with _lock:
+        if firma == _cache["firma"]:
+            return list(_cache["corridas"])
+
+    corridas = []
+    if firma is not None:
+        try:
+            with open(ARCHIVO_CORRIDAS, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        corridas.append(json.loads(linea))
+                    except ValueError:
+                        continue
+        except OSError as e:
+            print(f"Error al cargar el historial de corridas: {e}")
+
+    with _lock:
+        _cache["firma"] = firma
+        _cache["corridas"] = corridas
+    return list(corridas)
+
+def ultimas_corridas(cantidad=1, bloque=65536):
+    """
+    Lee solo las últimas corridas del historial, desde el final del archivo
+
+    Para mostrar el último veredicto sin parsear todo el historial.
+
+    Returns:
+        list: Hasta `cantidad` registros, del más reciente al más antiguo
+    """
+    try:
+        with open(ARCHIVO_CORRIDAS, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            posicion = f.tell()
+            resto = b""
+            lineas = []
+            # Retroceder por bloques hasta tener cantidad líneas completas
+            while posicion > 0 and len(lineas) <= cantidad:
+                leer = min(bloque, posicion)
+                posicion -= leer
+                f.seek(posicion)
+                partes = (f.read(leer) + resto).split(b"\n")
+                resto = partes[0]
+                lineas = partes[1:] + lineas
+            if posicion == 0:
+                lineas = [resto] + lineas
+    except OSError:
+        return []
+
+    corridas = []
+    for linea in reversed(lineas):
+        if len(corridas) == cantidad:
+            break
+        try:
+            corridas.append(json.loads(linea))
+        except ValueError:
+            continue
+    return corridas
+
+def buscar_corrida(id_corrida):
+    for corrida in cargar_corridas():
+        if corrida["id"] == id_corrida:
+            return corrida
+    return None
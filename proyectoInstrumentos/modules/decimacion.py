@@ -0,0 +1,91 @@
+# Archivo modules/decimacion.py - Reducción de formas de onda al ancho del gráfico
+#
+# Una captura del osciloscopio tiene miles de puntos y el gráfico solo unos
+# cientos de píxeles de ancho: se reduce antes de enviarla al navegador.
+
+import numpy as np
+
+METODOS_DECIMACION = ("minmax", "lttb")
+
+def decimar_min_max(x, y, puntos):
+    """
+    Conserva el mínimo y el máximo de cada intervalo, en su orden original
+
+    Mantiene los picos (una señal ruidosa o con glitches se ve igual que con
+    todos los puntos). Devuelve como mucho `puntos` puntos.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    intervalos = max(puntos // 2, 1)
+    if n <= puntos or n < 2 * intervalos:
+        return x, y
+
+    # Intervalos de igual tamaño; los puntos sobrantes al final se descartan
+    tamano = n // intervalos
+    bloques = y[:tamano * intervalos].reshape(intervalos, tamano)
+    base = np.arange(intervalos) * tamano
+    indice_min = base + bloques.argmin(axis=1)
+    indice_max = base + bloques.argmax(axis=1)
+
+    # Ordenar cada par para que la línea recorra min y max en el orden temporal
+    indices = np.sort(np.stack([indice_min, indice_max], axis=1), axis=1).ravel()
+    return x[indices], y[indices]
+
+def decimar_lttb(x, y, puntos):
+    """
+    Largest Triangle Three Buckets: elige en cada intervalo el punto que forma
+    el triángulo de mayor área con el punto elegido antes y la media del
+    intervalo siguiente. Conserva mejor la forma visual que un submuestreo.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if puntos >= n or puntos < 3:
+        return x, y
+
+    # Primer y último punto fijos; el resto se reparte en puntos - 2 intervalos
+    limites = np.linspace(1, n - 1, puntos - 1).astype(int)
+    indices = np.empty(puntos, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    anterior = 0
+    for i in range(puntos - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        # Media del intervalo siguiente (el último punto para el último intervalo)
+        if i < puntos - 3:
+            siguiente_inicio, siguiente_fin = limites[i + 1], limites[i + 2]
+            media_x = x[siguiente_inicio:siguiente_fin].mean()
+            media_y = y[siguiente_inicio:siguiente_fin].mean()
+        else:
+            media_x, media_y = x[-1], y[-1]
+
+        # Área (doble) de los triángulos; se elige la mayor
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(areas.argmax())
+        indices[i + 1] = anterior
+
+    return x[indices], y[indices]
+
+def decimar(x, y, puntos, metodo="minmax"):
+    """
+    Reduce una forma de onda a como mucho `puntos` puntos
+
+    Args:
+        x: Tiempos
+        y: Valores
+        puntos: Número máximo de puntos (normalmente el ancho del gráfico en píxeles)
+        metodo: "minmax" o "lttb"
+
+    Returns:
+        tuple: (x, y) reducidos
+    """
+    if metodo == "lttb":
+        return decimar_lttb(x, y, puntos)
+    if metodo == "minmax":
+        return decimar_min_max(x, y, puntos)
+    raise ValueError(f"Método de decimación no reconocido: {metodo}")
@@ -0,0 +1,205 @@
+# Archivo modules/descubrimiento.py - Búsqueda de equipos GW Instek en la red local
+#
+# Se prueban a la vez (asyncio) todas las direcciones de una subred en los
+# puertos de socket SCPI conocidos: 3000 (osciloscopios GDS) y 1026
+# (generadores MFG). A cada equipo que acepta la conexión se le pide *IDN? y
+# se clasifica por modelo. Los resultados se guardan en memoria durante
+# TTL_CACHE segundos para no repetir el barrido de red en cada recarga.
+#
+# Los equipos aceptan una sola conexión: no conviene buscar mientras se mide.
+# Los equipos reservados por un barrido (modules.reservas) no se sondean; se
+# incluyen con los datos de la reserva.
+
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+
+from modules.reservas import reservas_vigentes, describir_reserva
+
+# Puerto de socket SCPI -> tipo de equipo que lo usa
+PUERTOS_SCPI = {3000: "osciloscopio", 1026: "generador"}
+
+# Prefijo del modelo (*IDN?) -> tipo de equipo
+MODELOS = {
+    "GDS": "osciloscopio", "MSO": "osciloscopio", "MDO": "osciloscopio", "DSO": "osciloscopio",
+    "MFG": "generador", "AFG": "generador", "SFG": "generador", "GFG": "generador",
+}
+
+TIMEOUT_CONEXION = 0.4   # s; en una LAN un equipo responde en milisegundos
+TIMEOUT_IDN = 1.0
+# Conexiones abiertas a la vez: una /24 en los dos puertos (508) va de una
+# sola tanda sin acercarse al límite habitual de 1024 descriptores
+CONCURRENCIA = 512
+TTL_CACHE = 300          # s
+MAX_DIRECCIONES = 4096   # Una /20 como mucho
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def red_local():
+    """
+    Subred /24 de la interfaz con la ruta por defecto (p. ej. "172.118.1.0/24"),
+    o None si no se puede determinar
+    """
+    try:
+        # UDP sin enviar nada: solo para que el sistema elija la interfaz
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("192.0.2.1", 9))
+            ip = s.getsockname()[0]
+    except OSError:
+        return None
+    return str(ipaddress.ip_network(f"{ip}/24", strict=False))
+
+def clasificar(identificacion, puerto=None):
+    """
+    Clasifica un equipo por su respuesta a *IDN? ("GW,GDS-1102B,SN,V1.0")
+
+    Returns:
+        dict: tipo (osciloscopio, generador o None), fabricante, modelo y serie
+    """
+    partes = [parte.strip() for parte in (identificacion or "").split(",")]
+    partes += [""] * (4 - len(partes))
+    fabricante, modelo, serie = partes[0], partes[1], partes[2]
+    tipo = next((t for prefijo, t in MODELOS.items() if modelo.upper().startswith(prefijo)), None)
+    if tipo is None and puerto in PUERTOS_SCPI and identificacion:
+        # Modelo desconocido: el puerto indica el tipo más probable
+        tipo = PUERTOS_SCPI[puerto]
+    return {"tipo": tipo, "fabricante": fabricante, "modelo": modelo, "serie": serie}
+
+async def _sondear(ip, puerto, semaforo, timeout_conexion, timeout_idn):
+    async with semaforo:
+        inicio = time.perf_counter()
+        try:
+            lector, escritor = await asyncio.wait_for(asyncio.open_connection(ip, puerto), timeout_conexion)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        try:
+            escritor.write(b"*IDN?\n")
+            await escritor.drain()
+            respuesta = await asyncio.wait_for(lector.readline(), timeout_idn)
+            identificacion = respuesta.decode("ascii", errors="replace").strip()
+        except (OSError, asyncio.TimeoutError):
+            identificacion = ""
+        finally:
+            escritor.close()
+            try:
+                await escritor.wait_closed()
+            except OSError:
+                pass
+        if not identificacion:
+            return None  # Acepta conexiones pero no habla SCPI
+        return {"ip": ip, "puerto": puerto, "identificacion": identificacion,
+                **clasificar(identificacion, puerto),
+                "ms": round((time.perf_counter() - inicio) * 1000, 1)}
+
+async def _escanear(direcciones, puertos, timeout_conexion, timeout_idn, concurrencia, excluidas=()):
+    semaforo = asyncio.Semaphore(concurrencia)
+    resultados = await asyncio.gather(*(
+        _sondear(ip, puerto, semaforo, timeout_conexion, timeout_idn)
+        for ip in direcciones for puerto in puertos if (ip, puerto) not in excluidas
+    ))
+    return [r for r in resultados if r is not None]
+
+def escanear_red(red=None, puertos=None, timeout_conexion=TIMEOUT_CONEXION, timeout_idn=TIMEOUT_IDN,
+                 concurrencia=CONCURRENCIA, usar_cache=True):
+    """
+    Busca equipos SCPI en una subred
+
+    Args:
+        red: Subred en notación CIDR ("172.118.1.0/24") o una IP; por
+            defecto, la /24 local
+        puertos: Puertos a probar (por defecto, PUERTOS_SCPI)
+        timeout_conexion: Tiempo máximo para aceptar la conexión (s)
+        timeout_idn: Tiempo máximo para responder a *IDN? (s)
+        concurrencia: Conexiones simultáneas como máximo
+        usar_cache: Devolver el resultado anterior si tiene menos de TTL_CACHE s
+
+    Returns:
+        list: Equipos encontrados (ip, puerto, identificacion, tipo, fabricante,
+            modelo, serie, ms), ordenados por IP y puerto; None en caso de error.
+            Los reservados por un barrido no se sondean: identificacion
+            describe la reserva y ms es None
+        str: Mensaje de error o None en caso de éxito
+    """
+    red = red or red_local()
+    if not red:
+        return None, "No se pudo determinar la red local; indicar la subred"
+    try:
+        subred = ipaddress.ip_network(red, strict=False)
+    except ValueError as e:
+        return None, f"Subred no válida: {e}"
+    if subred.version != 4:
+        return None, "Solo se admiten subredes IPv4"
+    if subred.num_addresses > MAX_DIRECCIONES:
+        return None, f"La subred tiene {subred.num_addresses} direcciones (máximo {MAX_DIRECCIONES})"
+    puertos = tuple(puertos or PUERTOS_SCPI)
+
+    clave = (str(subred), puertos)
+    if usar_cache:
+        with _cache_lock:
+            guardado = _cache.get(clave)
+        if guardado and time.monotonic() - guardado[0] < TTL_CACHE:
+            return guardado[1], None
+
+    direcciones = [str(ip) for ip in (subred.hosts() if subred.num_addresses > 2 else subred)]
+    reservados = {
+        clave: reserva for clave, reserva in reservas_vigentes().items()
+        if clave[1] in puertos and clave[0] in direcciones
+    }
+    try:
+        encontrados = asyncio.run(_escanear(direcciones, puertos, timeout_conexion, timeout_idn, concurrencia,
+                                            excluidas=reservados))
+    except Exception as e:
+        return None, f"Error al buscar equipos: {e}"
+    for (ip, puerto), reserva in reservados.items():
+        encontrados.append({"ip": ip, "puerto": puerto, "identificacion": describir_reserva(reserva),
+                            "tipo": reserva.get("rol") or PUERTOS_SCPI[puerto],
+                            "fabricante": "", "modelo": "", "serie": "", "ms": None})
+    encontrados.sort(key=lambda e: (ipaddress.ip_address(e["ip"]), e["puerto"]))
+
+    with _cache_lock:
+        _cache[clave] = (time.monotonic(), encontrados)
+    return encontrados, None
+
+def invalidar_descubrimiento():
+    with _cache_lock:
+        _cache.clear()
+
+def perfiles_desde_equipos(equipos, existentes=()):
+    """
+    Forma perfiles de red emparejando osciloscopios y generadores encontrados
+    (en orden de IP), sin repetir los que ya tengan las mismas direcciones
+
+    Args:
+        equipos: Resultado de escanear_red
+        existentes: Perfiles ya configurados
+
+    Returns:
+        list: Perfiles nuevos con el formato de perfiles_red.json
+    """
+    osciloscopios = [e for e in equipos if e["tipo"] == "osciloscopio"]
+    generadores = [e for e in equipos if e["tipo"] == "generador"]
+    usadas = {((p["osciloscopio"]["ip"], int(p["osciloscopio"]["puerto"])),
+               (p["generador"]["ip"], int(p["generador"]["puerto"]))) for p in existentes}
+    nombres = {p["nombre"] for p in existentes}
+
+    perfiles = []
+    for osciloscopio, generador in zip(osciloscopios, generadores):
+        direcciones = ((osciloscopio["ip"], osciloscopio["puerto"]), (generador["ip"], generador["puerto"]))
+        if direcciones in usadas:
+            continue
+        nombre = base = f"{osciloscopio['modelo'] or 'Osciloscopio'} + {generador['modelo'] or 'Generador'}"
+        sufijo = 2
+        while nombre in nombres:
+            nombre = f"{base} ({sufijo})"
+            sufijo += 1
+        nombres.add(nombre)
+        perfiles.append({
+            "nombre": nombre,
+            "osciloscopio": {"ip": osciloscopio["ip"], "puerto": osciloscopio["puerto"]},
+            "generador": {"ip": generador["ip"], "puerto": generador["puerto"]},
+            "activo": True,
+        })
+    return perfiles
@@ -1,34 +1,63 @@
 # Archivo modules/equipos.py - Optimizado para comunicaciones más rápidas
 
-import pyvisa
+import socket
 import time
 
+from modules.grabacion import transporte_activo
+
+# Cuentas del ADC por división vertical en los datos de :ACQuire<X>:MEMory?
+CUENTAS_POR_DIVISION = 25.0
+
 class Equipo:
-    def __init__(self, ip, puerto, timeout=5000):  # Reducido el timeout por defecto
+    def __init__(self, ip, puerto, timeout=5000, token=None):  # Reducido el timeout por defecto
         self.ip = ip
         self.puerto = puerto
         self.timeout = timeout
         self.instrumento = None
         self.resource_manager = None
+        # TokenCancelacion opcional: interrumpe esperas y aborta la E/S en curso
+        self.token = token
+        self._id_aborto = None
+    
+    def _abrir_visa(self):
+        """Abre y configura la sesión VISA real del equipo"""
+        # Reutilizar el resource manager si ya existe
+        if not self.resource_manager:
+            # PyVISA se importa al conectar para no penalizar el arranque
+            import pyvisa
+            self.resource_manager = pyvisa.ResourceManager('@py')
+            
+        cadena_recurso = f'TCPIP0::{self.ip}::{self.puerto}::SOCKET'
+        
+        instrumento = self.resource_manager.open_resource(cadena_recurso)
+        instrumento.timeout = self.timeout
+        instrumento.read_termination = '\n'
+        instrumento.write_termination = '\n'
+        return instrumento
     
     def conectar(self):
         try:
-            # Reutilizar el resource manager si ya existe
-            if not self.resource_manager:
-                self.resource_manager = pyvisa.ResourceManager('@py')
-                
-            cadena_recurso = f'TCPIP0::{self.ip}::{self.puerto}::SOCKET'
+            # Con un transporte activo (grabación o reproducción de sesiones
+            # SCPI, modules/grabacion.py) la sesión se abre a través de él
+            transporte = transporte_activo()
+            if transporte is not None:
+                self.instrumento = transporte.abrir(self)
+            else:
+                self.instrumento = self._abrir_visa()
             
-            self.instrumento = self.resource_manager.open_resource(cadena_recurso)
-            self.instrumento.timeout = self.timeout
-            self.instrumento.read_termination = '\n'
-            self.instrumento.write_termination = '\n'
+            # Al cancelar, cerrar la sesión para cortar una lectura bloqueada
+            if self.token is not None:
+                self._id_aborto = self.token.al_cancelar(self.abortar)
             
             return True, None
         except Exception as e:
             return False, str(e)
     
     def desconectar(self):
+        if self.token is not None and self._id_aborto is not None:
+            self.token.retirar(self._id_aborto)
+            self._id_aborto = None
+        
         if self.instrumento:
             try:
                 self.instrumento.close()
@@ -38,6 +67,33 @@ class Equipo:
                 return False
         return True
     
+    def abortar(self):
+        """Cierra la sesión desde otro hilo; la operación en curso termina con error"""
+        instrumento, self.instrumento = self.instrumento, None
+        self._id_aborto = None
+        if instrumento is None:
+            return
+        
+        # Con pyvisa-py, close() no despierta un select() bloqueado en la
+        # lectura: se corta antes el socket para que la lectura termine ya
+        try:
+            sesion = instrumento.visalib.sessions[instrumento.session]
+            sesion.interface.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        
+        try:
+            instrumento.close()
+        except Exception:
+            pass
+    
+    def esperar(self, segundos):
+        """Pausa interrumpible si hay token de cancelación"""
+        if self.token is not None:
+            self.token.dormir(segundos)
+        else:
+            time.sleep(segundos)
+    
     def enviar_comando(self, comando):
         if not self.instrumento:
             return None, "No hay conexión con el instrumento"
@@ -56,11 +112,11 @@ class Equipo:
             respuesta = self.instrumento.query(query).strip()
             return respuesta, None
         except Exception as e:
-            # Intentar recuperar la conexión si hay un timeout
-            if "timeout" in str(e).lower():
+            # Intentar recuperar la conexión si hay un timeout (salvo si se canceló)
+            if "timeout" in str(e).lower() and not (self.token is not None and self.token.cancelado):
                 try:
                     # Limpiar búfer
-                    self.instrumento.clear()
+                    self.descartar_pendiente()
                     # Reintentar una vez
                     respuesta = self.instrumento.query(query).strip()
                     return respuesta, None
@@ -68,12 +124,74 @@ class Equipo:
                     return None, f"Error en reintento: {str(e2)}"
             return None, str(e)
     
+    def descartar_pendiente(self, timeout=100):
+        """
+        Descarta respuestas atrasadas tras un timeout
+        
+        Sustituye a instrumento.clear(): con pyvisa-py, clear() no termina
+        nunca si el equipo cerró la conexión. Aquí la espera está acotada.
+        """
+        anterior = self.instrumento.timeout
+        try:
+            self.instrumento.timeout = timeout
+            while True:
+                self.instrumento.read_raw()
+        except Exception:
+            pass
+        finally:
+            if self.instrumento:
+                self.instrumento.timeout = anterior
+    
     def identificar(self):
         return self.enviar_query("*IDN?")
 
 class Osciloscopio(Equipo):
-    def __init__(self, ip, puerto, timeout=5000):
-        super().__init__(ip, puerto, timeout)
+    def __init__(self, ip, puerto, timeout=5000, token=None):
+        super().__init__(ip, puerto, timeout, token)
+    
+    def _consultar_bloque(self, consulta, tamano_maximo=None):
+        """
+        Envía una consulta cuya respuesta es un bloque binario IEEE 488.2
+        (#<n><longitud><datos>), quizá precedido de una cabecera de texto
+        
+        Los datos se leen con una sola lectura de la longitud anunciada: la
+        sesión los copia por trozos en un único búfer, sin tratarlos como texto.
+        
+        Returns:
+            bytes: Cabecera de texto (hasta el '#', incluido)
+            bytes: Datos del bloque
+        """
+        instrumento = self.instrumento
+        terminacion = instrumento.read_termination
+        try:
+            instrumento.write(consulta)
+            
+            # Leer por bytes: el bloque binario puede contener '\n'
+            instrumento.read_termination = None
+            cabecera = bytearray()
+            while not cabecera.endswith(b"#"):
+                cabecera += instrumento.read_bytes(1)
+            digitos = int(instrumento.read_bytes(1))
+            longitud = int(instrumento.read_bytes(digitos))
+            if tamano_maximo is not None and longitud > tamano_maximo:
+                # El resto del bloque se descarta para no desincronizar la sesión
+                self.descartar_pendiente()
+                raise ValueError(f"El bloque ocupa {longitud} bytes (máximo {tamano_maximo})")
+            datos = instrumento.read_bytes(longitud)
+            
+            # Consumir el terminador para no desincronizar la siguiente respuesta
+            timeout = instrumento.timeout
+            try:
+                instrumento.timeout = 50
+                instrumento.read_bytes(1)
+            except Exception:
+                pass
+            finally:
+                instrumento.timeout = timeout
+        finally:
+            if self.instrumento is instrumento:
+                instrumento.read_termination = terminacion
+        return bytes(cabecera), datos
     
     def auto_setup(self):
         return self.enviar_comando(":AUTOSet")
@@ -106,29 +224,29 @@ class Osciloscopio(Equipo):
         try:
             # Limpiar todas las mediciones actuales
             self.enviar_comando(':MEASure:CLEar ALL')
-            time.sleep(0.2)  # Reducido de 0.5 a 0.2
+            self.esperar(0.2)  # Reducido de 0.5 a 0.2
             
             # Configurar las fuentes para la medición
             self.enviar_comando(f':MEASure:SOURce1 {canal}')
             self.enviar_comando(f':MEASure:SOURce2 {canal}')
-            time.sleep(0.2)  # Reducido de 0.5 a 0.2
+            self.esperar(0.2)  # Reducido de 0.5 a 0.2
             
             # Activar la medición específica y obtener resultado
             if tipo_medicion == "PK2PK":
                 self.enviar_comando(':MEASure:PK2PK ON')
-                time.sleep(0.2)  # Reducido de 0.5 a 0.2
+                self.esperar(0.2)  # Reducido de 0.5 a 0.2
                 resultado, error = self.enviar_query(':MEASure:PK2PK?')
             elif tipo_medicion == "AMPLITUDE":
                 self.enviar_comando(':MEASure:AMPlitude ON')
-                time.sleep(0.2)  # Reducido de 0.5 a 0.2
+                self.esperar(0.2)  # Reducido de 0.5 a 0.2
                 resultado, error = self.enviar_query(':MEASure:AMPlitude?')
             elif tipo_medicion == "FREQUENCY":
                 self.enviar_comando(':MEASure:FREQuency ON')
-                time.sleep(0.2)  # Reducido de 0.5 a 0.2
+                self.esperar(0.2)  # Reducido de 0.5 a 0.2
                 resultado, error = self.enviar_query(':MEASure:FREQuency?')
             elif tipo_medicion == "RMS":
                 self.enviar_comando(':MEASure:RMS ON')
-                time.sleep(0.2)  # Reducido de 0.5 a 0.2
+                self.esperar(0.2)  # Reducido de 0.5 a 0.2
                 resultado, error = self.enviar_query(':MEASure:RMS?')
             else:
                 return None, "Tipo de medición no reconocido"
@@ -146,9 +264,72 @@ class Osciloscopio(Equipo):
         except Exception as e:
             return None, str(e)
 
+    def leer_forma_onda(self, canal=1):
+        """
+        Lee la memoria de adquisición de un canal (:ACQuire<X>:MEMory?)
+        
+        La respuesta es una cabecera de texto "clave,valor;..." seguida de un
+        bloque binario IEEE 488.2 (#<n><longitud><datos>) con muestras de 16 bits.
+        
+        Returns:
+            dict: "tiempo" y "voltaje" (arrays de numpy) y "cabecera" (dict), o None
+            str: Mensaje de error o None en caso de éxito
+        """
+        import numpy as np
+        
+        if not self.instrumento:
+            return None, "No hay conexión con el instrumento"
+        
+        try:
+            cabecera, datos = self._consultar_bloque(f":ACQuire{canal}:MEMory?")
+        except Exception as e:
+            return None, str(e)
+        
+        parametros = {}
+        for campo in cabecera[:-1].decode("latin-1").split(";"):
+            if "," in campo:
+                clave, valor = campo.split(",", 1)
+                try:
+                    parametros[clave.strip()] = float(valor)
+                except ValueError:
+                    parametros[clave.strip()] = valor.strip()
+        
+        muestras = np.frombuffer(bytes(datos), dtype=">i2").astype(float)
+        escala = parametros.get("Vertical Scale", 1.0)
+        periodo = parametros.get("Sampling Period", 1.0)
+        
+        return {
+            "tiempo": np.arange(len(muestras)) * periodo,
+            "voltaje": muestras * escala / CUENTAS_POR_DIVISION,
+            "cabecera": parametros
+        }, None
+
+    def capturar_pantalla(self, tamano_maximo=None):
+        """
+        Imagen de lo que muestra la pantalla (:DISPlay:OUTPut?)
+        
+        Args:
+            tamano_maximo: Bytes como máximo; una imagen mayor se descarta
+                sin leerla entera
+        
+        Returns:
+            bytes: Imagen tal como la envía el equipo (BMP) o None
+            str: Mensaje de error o None en caso de éxito
+        """
+        if not self.instrumento:
+            return None, "No hay conexión con el instrumento"
+        
+        try:
+            _, datos = self._consultar_bloque(":DISPlay:OUTPut?", tamano_maximo)
+        except Exception as e:
+            return None, str(e)
+        return datos, None
+
 class GeneradorFunciones(Equipo):
-    def __init__(self, ip, puerto, timeout=5000):
-        super().__init__(ip, puerto, timeout)
+    def __init__(self, ip, puerto, timeout=5000, token=None):
+        super().__init__(ip, puerto, timeout, token)
+        # Canales cuya salida pudo quedar activada
+        self.salidas_activas = set()
     
     def reset(self):
         return self.enviar_comando("*RST")
@@ -166,10 +347,41 @@ class GeneradorFunciones(Equipo):
         return self.enviar_comando(f"SOURce{canal}:DCOffset {offset}")
     
     def activar_salida(self, canal=1):
+        self.salidas_activas.add(canal)
         return self.enviar_comando(f"OUTPut{canal} ON")
     
     def desactivar_salida(self, canal=1):
-        return self.enviar_comando(f"OUTPut{canal} OFF")
+        resultado, error = self.enviar_comando(f"OUTPut{canal} OFF")
+        if not error:
+            self.salidas_activas.discard(canal)
+        return resultado, error
+    
+    def apagar_salida_segura(self, canal=1, intentos=2):
+        """
+        Desactiva la salida aunque la operación se haya cancelado o la sesión
+        se haya abortado, reconectando si es necesario. No se puede cancelar.
+        
+        Returns:
+            bool: True si la salida quedó desactivada
+            str: Mensaje de error o None en caso de éxito
+        """
+        self.token = None
+        self._id_aborto = None
+        error = None
+        
+        for _ in range(intentos):
+            if not self.instrumento:
+                conectado, error = self.conectar()
+                if not conectado:
+                    continue
+            
+            _, error = self.desactivar_salida(canal)
+            if not error:
+                return True, None
+            # Sesión en mal estado: cerrar y reintentar con una nueva
+            self.desconectar()
+        
+        return False, error
     
     def obtener_estado_salida(self, canal=1):
         return self.enviar_query(f"OUTPut{canal}?")
@@ -0,0 +1,167 @@
+# Archivo modules/establecimiento.py - Tiempo de establecimiento según la frecuencia
+#
+# Con un tiempo fijo (0.5 s por defecto) se espera de más a 1 MHz y quizá de
+# menos a 10 Hz, donde un periodo ya dura 100 ms. La política adaptativa
+# espera N periodos de la señal más varias constantes de tiempo del
+# dispositivo (estimadas con la fase o la ganancia del punto anterior) y,
+# opcionalmente, confirma el establecimiento con lecturas rápidas que deben
+# converger dentro de una tolerancia.
+
+import math
+import time
+
+MODOS_ESTABLECIMIENTO = ("fijo", "adaptativo")
+
+ESTABLECIMIENTO_POR_DEFECTO = {
+    "modo": "fijo",             # fijo: adquisicion.estabilizacion en cada punto
+    "periodos": 10,             # Periodos de la señal a esperar como mínimo
+    "constantes_tiempo": 5,     # Constantes de tiempo del dispositivo (5 tau ~ 99 %)
+    "minimo": 0.01,             # Límites de la espera calculada (s)
+    "maximo": 2.0,
+    "confirmar": False,         # Confirmar con lecturas rápidas de la salida
+    "tolerancia": 0.01,         # Diferencia relativa máxima entre lecturas seguidas
+    "lecturas_max": 5,
+    "intervalo_lectura": 0.05,  # Espera entre lecturas de confirmación (s)
+}
+
+# Límite inferior de cada valor numérico: (mínimo, el mínimo queda excluido)
+_LIMITES = {
+    "periodos": (0, True),
+    "constantes_tiempo": (0, False),
+    "minimo": (0, False),
+    "maximo": (0, False),
+    "tolerancia": (0, False),
+    "lecturas_max": (1, False),
+    "intervalo_lectura": (0, False),
+}
+
+def validar_establecimiento(configuracion):
+    """
+    Completa y comprueba la configuración de establecimiento
+
+    Returns:
+        dict: Configuración completa o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    completa = dict(ESTABLECIMIENTO_POR_DEFECTO)
+    configuracion = configuracion or {}
+    desconocidas = set(configuracion) - set(completa)
+    if desconocidas:
+        return None, f"Claves desconocidas en establecimiento: {', '.join(sorted(desconocidas))}"
+    completa.update(configuracion)
+    if completa["modo"] not in MODOS_ESTABLECIMIENTO:
+        return None, f"Modo de establecimiento no válido: {completa['modo']} (usar {', '.join(MODOS_ESTABLECIMIENTO)})"
+    if not isinstance(completa["confirmar"], bool):
+        return None, "establecimiento.confirmar debe ser true o false"
+    for clave in _LIMITES:
+        valor = completa[clave]
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            return None, f"establecimiento.{clave} debe ser un número"
+    for clave, (minimo, estricto) in _LIMITES.items():
+        if completa[clave] < minimo or (estricto and completa[clave] == minimo):
+            return None, f"establecimiento.{clave} debe ser {'mayor' if estricto else 'mayor o igual'} que {minimo}"
+    if completa["lecturas_max"] != int(completa["lecturas_max"]):
+        return None, "establecimiento.lecturas_max debe ser un número entero"
+    completa["lecturas_max"] = int(completa["lecturas_max"])
+    if not completa["minimo"] <= completa["maximo"]:
+        return None, "establecimiento: se necesita 0 <= minimo <= maximo"
+    return completa, None
+
+def tiempo_minimo(configuracion, frecuencia):
+    """Espera que no depende del dispositivo: N periodos, dentro de los límites"""
+    return min(max(configuracion["periodos"] / frecuencia, configuracion["minimo"]), configuracion["maximo"])
+
+def estimar_tau(frecuencia, ganancia, ganancia_banda_paso, pendiente=None, fase=None):
+    """
+    Constante de tiempo (s) de un sistema de primer orden que explique el
+    punto medido, o None si el punto no permite estimarla
+
+    Con fase (grados, salida respecto a entrada): retraso = paso bajo,
+    tau = tan(-fase) / w; adelanto = paso alto, tau = 1 / (w tan(fase)).
+    Sin fase, la atenuación r respecto a la banda de paso da
+    tau = sqrt(r² - 1) / w (paso bajo, ganancia que cae con la frecuencia)
+    o 1 / (w sqrt(r² - 1)) (paso alto, ganancia que sube).
+    """
+    w = 2 * math.pi * frecuencia
+    if fase is not None and 1.0 < abs(fase) < 89.0:
+        tangente = math.tan(math.radians(abs(fase)))
+        return tangente / w if fase < 0 else 1 / (w * tangente)
+
+    if not ganancia or not ganancia_banda_paso:
+        return None
+    atenuacion = ganancia_banda_paso / ganancia
+    # Por debajo de ~0.4 dB la atenuación es ruido de medida
+    if atenuacion < 1.05:
+        return None
+    raiz = math.sqrt(atenuacion ** 2 - 1)
+    return 1 / (w * raiz) if pendiente is not None and pendiente > 0 else raiz / w
+
+class PoliticaEstablecimiento:
+    """
+    Calcula la espera de cada punto y aprende la constante de tiempo del
+    dispositivo a partir de los puntos ya medidos.
+
+    Args:
+        configuracion: Configuración validada (validar_establecimiento)
+    """
+
+    def __init__(self, configuracion):
+        self.configuracion = configuracion
+        self.tau = None
+        self._ganancia_max = None
+        self._anterior = None
+
+    def tiempo(self, frecuencia):
+        """Espera (s) para una frecuencia con la constante de tiempo conocida"""
+        c = self.configuracion
+        espera = c["periodos"] / frecuencia
+        if self.tau:
+            espera = max(espera, c["constantes_tiempo"] * self.tau)
+        return min(max(espera, c["minimo"]), c["maximo"])
+
+    def observar(self, frecuencia, ganancia, fase=None):
+        """Actualiza la constante de tiempo con un punto medido"""
+        if not ganancia or ganancia <= 0:
+            return
+        self._ganancia_max = max(self._ganancia_max or 0.0, ganancia)
+        pendiente = None
+        if self._anterior is not None and self._anterior[0] != frecuencia:
+            pendiente = (ganancia - self._anterior[1]) / (frecuencia - self._anterior[0])
+        self._anterior = (frecuencia, ganancia)
+
+        tau = estimar_tau(frecuencia, ganancia, self._ganancia_max, pendiente, fase)
+        if tau is not None:
+            self.tau = tau
+
+    def esperar(self, frecuencia, token, leer=None):
+        """
+        Espera el tiempo calculado y, si la configuración lo pide y hay
+        función de lectura, repite lecturas hasta que dos seguidas difieran
+        menos de la tolerancia (o se agoten las lecturas)
+
+        Args:
+            frecuencia: Frecuencia del punto (Hz)
+            token: TokenCancelacion (las esperas se interrumpen al detener)
+            leer: Función sin argumentos que devuelve una lectura rápida o None
+
+        Returns:
+            float: Tiempo total de establecimiento (s)
+            int: Lecturas de confirmación realizadas
+        """
+        c = self.configuracion
+        inicio = time.monotonic()
+        token.dormir(self.tiempo(frecuencia))
+
+        lecturas = 0
+        if c["confirmar"] and leer is not None:
+            anterior = None
+            while lecturas < c["lecturas_max"]:
+                valor = leer()
+                lecturas += 1
+                if valor is not None and anterior is not None:
+                    if abs(valor - anterior) <= c["tolerancia"] * max(abs(anterior), 1e-12):
+                        break
+                anterior = valor
+                token.dormir(c["intervalo_lectura"])
+
+        return time.monotonic() - inicio, lecturas
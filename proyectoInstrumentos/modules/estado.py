@@ -0,0 +1,296 @@
+# Archivo modules/estado.py - Estado compartido de ejecución entre el hilo de barrido y la UI
+
+import collections
+import json
+import os
+import queue
+import threading
+import time
+from types import MappingProxyType
+from datetime import datetime
+from modules.config import escribir_json_atomico
+from modules.cancelacion import TokenCancelacion
+
+class EstadoEjecucion:
+    """
+    Estado en memoria de la secuencia en ejecución.
+
+    Reemplaza el intercambio por archivos entre el hilo de barrido y la
+    interfaz:
+
+    - El hilo de barrido publica eventos (log y progreso) en una cola sin
+      bloqueos (queue.SimpleQueue).
+    - La detención se señala con un TokenCancelacion, sin leer ningún archivo;
+      cancelarlo interrumpe las esperas y la E/S en curso del barrido.
+    - La interfaz obtiene una instantánea inmutable que se sustituye de forma
+      atómica cada vez que se aplican eventos nuevos.
+
+    Args:
+        max_lineas_log: Líneas de log que se conservan en memoria
+        espejo: EspejoArchivos opcional para persistir el estado de forma asíncrona
+        max_historial: Eventos numerados que se conservan para eventos_desde()
+    """
+
+    def __init__(self, max_lineas_log=500, espejo=None, max_historial=2000):
+        self.token_cancelacion = TokenCancelacion()
+        self.espejo = espejo
+
+        self._eventos = queue.SimpleQueue()
+        self._lock_aplicar = threading.Lock()
+        self._log = collections.deque(maxlen=max_lineas_log)
+        # Eventos ya aplicados, numerados, para clientes que los siguen en streaming
+        self._historial = collections.deque(maxlen=max_historial)
+        # Resultados de la corrida actual, en orden de llegada (solo se agregan)
+        self._mediciones = []
+        self._corrida = 0
+        self._estado = {
+            "estado": "Detenido",
+            "progreso": 0,
+            "total": 1,
+            "ejecutando": False,
+            "ultimo_update": time.time(),
+            "version": 0,
+        }
+        self._instantanea = self._crear_instantanea()
+
+        if espejo is not None:
+            self._recuperar(espejo)
+
+    # --- Productor (hilo de barrido) ---
+
+    def publicar(self, tipo, **datos):
+        evento = {"tipo": tipo, "tiempo": time.time(), **datos}
+        self._eventos.put(evento)
+        if self.espejo is not None:
+            self.espejo.encolar(evento)
+
+        # Si ninguna interfaz está leyendo, aplicar para acotar la memoria
+        if self._eventos.qsize() > 1000:
+            self.instantanea()
+
+    def log(self, mensaje):
+        tiempo = datetime.now().strftime("%H:%M:%S")
+        self.publicar("log", linea=f"[{tiempo}] {mensaje}\n")
+
+    def progreso(self, estado, progreso=0, total=1):
+        self.publicar("progreso", estado=estado, progreso=progreso, total=total)
+
+    def medicion(self, resultado):
+        self.publicar("medicion", medicion=dict(resultado))
+
+    def iniciar(self):
+        """
+        Marca el inicio de una secuencia con una señal de detención nueva
+
+        Returns:
+            TokenCancelacion: Token que debe recibir la secuencia
+        """
+        self.token_cancelacion = TokenCancelacion()
+        self.publicar("inicio")
+        return self.token_cancelacion
+
+    def finalizar(self):
+        self.publicar("fin")
+
+    def limpiar_log(self):
+        self.publicar("limpiar_log")
+
+    # --- Control ---
+
+    def solicitar_detencion(self):
+        self.token_cancelacion.cancelar()
+        self.publicar("detener")
+
+    def debe_detenerse(self):
+        return self.token_cancelacion.cancelado
+
+    # --- Consumidor (interfaz) ---
+
+    def instantanea(self):
+        """
+        Aplica los eventos pendientes y devuelve el estado actual
+
+        Returns:
+            mappingproxy: Estado inmutable (estado, progreso, total, ejecutando,
+                detener, ultimo_update, version, corrida, num_mediciones, log)
+        """
+        with self._lock_aplicar:
+            hubo_cambios = False
+            while True:
+                try:
+                    evento = self._eventos.get_nowait()
+                except queue.Empty:
+                    break
+                self._aplicar(evento)
+                hubo_cambios = True
+
+            if hubo_cambios:
+                # Sustitución atómica de la referencia
+                self._instantanea = self._crear_instantanea()
+
+        return self._instantanea
+
+    def mediciones_desde(self, corrida, indice=0):
+        """
+        Devuelve los resultados de la corrida actual a partir de un índice
+
+        Args:
+            corrida: Corrida que conoce el cliente (si no es la actual se envía todo)
+            indice: Número de resultados que el cliente ya tiene
+
+        Returns:
+            int: Corrida actual
+            list: Resultados nuevos
+        """
+        self.instantanea()
+        with self._lock_aplicar:
+            if corrida != self._corrida:
+                indice = 0
+            return self._corrida, self._mediciones[indice:]
+
+    def eventos_desde(self, secuencia, espera=0.0, intervalo=0.05):
+        """
+        Devuelve los eventos con número de secuencia mayor que el indicado
+
+        Args:
+            secuencia: Último número de secuencia recibido por el cliente
+            espera: Tiempo máximo (s) a esperar si todavía no hay eventos nuevos
+            intervalo: Periodo de sondeo mientras se espera
+
+        Returns:
+            list: Eventos (diccionarios con la clave "seq")
+        """
+        limite = time.monotonic() + espera
+        while True:
+            self.instantanea()
+            with self._lock_aplicar:
+                nuevos = [e for e in self._historial if e["seq"] > secuencia]
+            if nuevos or time.monotonic() >= limite:
+                return nuevos
+            time.sleep(intervalo)
+
+    def _aplicar(self, evento):
+        tipo = evento["tipo"]
+        if tipo == "log":
+            self._log.append(evento["linea"])
+        elif tipo == "limpiar_log":
+            self._log.clear()
+        elif tipo == "progreso":
+            self._estado["estado"] = evento["estado"]
+            self._estado["progreso"] = evento["progreso"]
+            self._estado["total"] = evento["total"]
+        elif tipo == "medicion":
+            self._mediciones.append(evento["medicion"])
+        elif tipo == "inicio":
+            self._estado["ejecutando"] = True
+            self._corrida += 1
+            self._mediciones = []
+        elif tipo == "fin":
+            self._estado["ejecutando"] = False
+            self._estado["estado"] = "Detenido"
+            self._estado["progreso"] = 0
+            self._estado["total"] = 1
+
+        self._estado["ultimo_update"] = evento["tiempo"]
+        self._estado["version"] += 1
+        self._historial.append({"seq": self._estado["version"], **evento})
+
+    def _crear_instantanea(self):
+        return MappingProxyType({
+            **self._estado,
+            "detener": self.token_cancelacion.cancelado,
+            "corrida": self._corrida,
+            "num_mediciones": len(self._mediciones),
+            "log": tuple(self._log),
+        })
+
+    def _recuperar(self, espejo):
+        # Tras un reinicio del servidor, mostrar el último estado conocido
+        lineas, estado = espejo.recuperar(self._log.maxlen)
+        self._log.extend(lineas)
+        if estado and estado.get("ejecutando"):
+            self._log.append(
+                f"[{datetime.now().strftime('%H:%M:%S')}] Aviso: la ejecución anterior se interrumpió "
+                f"en {estado.get('progreso', 0)}/{estado.get('total', 1)} (reinicio del servidor).\n"
+            )
+        self._instantanea = self._crear_instantanea()
+
+class EspejoArchivos:
+    """
+    Copia asíncrona del estado en disco para recuperación ante caídas.
+
+    Un hilo propio agrupa los eventos pendientes y los escribe en el log
+    (RegistroProgreso) y en un JSON de estado, fuera del hilo de barrido.
+
+    Args:
+        registro: RegistroProgreso donde se escriben las líneas de log
+        archivo_estado: JSON con el último estado de progreso
+    """
+
+    def __init__(self, registro, archivo_estado):
+        self.registro = registro
+        self.archivo_estado = archivo_estado
+        self._cola = queue.SimpleQueue()
+        self._estado = {"estado": "Detenido", "progreso": 0, "total": 1, "ejecutando": False}
+        self._hilo = threading.Thread(target=self._ejecutar, name="espejo-estado", daemon=True)
+        self._hilo.start()
+
+    def encolar(self, evento):
+        self._cola.put(evento)
+
+    def recuperar(self, max_lineas):
+        lineas = self.registro.ultimas_lineas(max_lineas)
+        estado = None
+        if os.path.exists(self.archivo_estado):
+            try:
+                with open(self.archivo_estado, "r") as f:
+                    estado = json.load(f)
+            except Exception as e:
+                print(f"Error al leer estado de progreso: {e}")
+        return lineas, estado
+
+    def _ejecutar(self):
+        while True:
+            lote = [self._cola.get()]
+            while True:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._escribir(lote)
+            except Exception as e:
+                print(f"Error en el espejo de estado: {e}")
+
+    def _escribir(self, lote):
+        lineas = []
+        estado_cambio = False
+
+        for evento in lote:
+            tipo = evento["tipo"]
+            if tipo == "log":
+                lineas.append(evento["linea"])
+                continue
+
+            if lineas:
+                self.registro.agregar("".join(lineas))
+                lineas = []
+
+            if tipo == "limpiar_log":
+                self.registro.archivar()
+            elif tipo == "progreso":
+                self._estado.update(estado=evento["estado"], progreso=evento["progreso"], total=evento["total"])
+                estado_cambio = True
+            elif tipo == "inicio":
+                self._estado["ejecutando"] = True
+                estado_cambio = True
+            elif tipo == "fin":
+                self._estado.update(estado="Detenido", progreso=0, total=1, ejecutando=False)
+                estado_cambio = True
+
+        if lineas:
+            self.registro.agregar("".join(lineas))
+
+        if estado_cambio:
+            escribir_json_atomico(self.archivo_estado, {**self._estado, "timestamp": time.time()})
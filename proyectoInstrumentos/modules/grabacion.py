@@ -0,0 +1,322 @@
+# Archivo modules/grabacion.py - Grabación y reproducción de sesiones SCPI
+#
+# Con un transporte activo, Equipo.conectar() no abre la sesión VISA
+# directamente sino a través de él:
+#
+#   - Grabadora: abre la sesión real y la envuelve; cada escritura, consulta
+#     y lectura se guarda (comando, respuesta, error, instante y duración) en
+#     un archivo JSON Lines (comprimido si termina en .gz).
+#   - Reproductor: no abre nada; devuelve las respuestas grabadas, en el
+#     mismo orden y por equipo (ip:puerto), al ritmo grabado o sin esperas.
+#
+# Así una sesión real de ejecutar_secuencia_completa sirve después como
+# prueba de regresión y como benchmark reproducible sin banco de medida.
+#
+# Uso:
+#
+#   with Grabadora("data/sesion.jsonl.gz") as grabadora:
+#       activar_transporte(grabadora)
+#       ejecutar_secuencia_completa(...)
+#   desactivar_transporte()
+#
+# La reproducción (benchmarks/reproduccion_scpi.py) usa Reproductor y, a
+# velocidad máxima, un TokenSinEsperas para saltarse también las esperas del
+# motor de barrido.
+
+import base64
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from modules.cancelacion import TokenCancelacion
+
+VERSION = 1
+
+VELOCIDADES = ("grabada", "maxima")
+
+_transporte = None
+
+def activar_transporte(transporte):
+    """Las conexiones siguientes de Equipo usan este transporte"""
+    global _transporte
+    _transporte = transporte
+
+def desactivar_transporte():
+    global _transporte
+    _transporte = None
+
+def transporte_activo():
+    return _transporte
+
+class DesincronizacionReproduccion(Exception):
+    """La sesión reproducida pide algo distinto de lo grabado"""
+
+class TokenSinEsperas(TokenCancelacion):
+    """
+    Token cuyas esperas (estabilización, pausas entre comandos) no duermen:
+    con la reproducción a velocidad máxima solo queda el tiempo de cálculo
+    """
+
+    def esperar(self, segundos):
+        return self.cancelado
+
+def _abrir_archivo(archivo, modo):
+    if archivo.endswith(".gz"):
+        return gzip.open(archivo, modo + "t", encoding="utf-8")
+    return open(archivo, modo, encoding="utf-8")
+
+def _codificar(respuesta):
+    # Las lecturas binarias (forma de onda) se guardan en base64
+    if isinstance(respuesta, (bytes, bytearray)):
+        return {"b": base64.b64encode(bytes(respuesta)).decode("ascii")}
+    return {"r": respuesta}
+
+class Grabadora:
+    """
+    Transporte que graba las sesiones reales.
+
+    Cada línea del archivo es una operación: eq (ip:puerto), op (abrir,
+    write, query, read_raw, read_bytes, clear), c (comando o tamaño), r o b
+    (respuesta de texto o binaria en base64), e (error), t (s desde el
+    inicio) y d (duración en s). La primera línea es la cabecera y las
+    líneas {"meta": ...} guardan datos del llamador (plan, resultados...).
+
+    Args:
+        archivo: Ruta del archivo (.jsonl o .jsonl.gz)
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.operaciones = 0
+        self._lock = threading.Lock()
+        self._inicio = time.monotonic()
+        self._salida = _abrir_archivo(archivo, "w")
+        self._escribir({"version": VERSION, "creada": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def _escribir(self, registro):
+        with self._lock:
+            if self._salida is not None:
+                self._salida.write(json.dumps(registro, separators=(",", ":")) + "\n")
+
+    def anotar(self, **datos):
+        """Guarda datos del llamador junto a la sesión (p. ej. el plan)"""
+        self._escribir({"meta": datos})
+
+    def registrar(self, equipo, operacion, comando, inicio, respuesta=None, error=None):
+        registro = {"eq": equipo, "op": operacion, "c": comando,
+                    "t": round(inicio - self._inicio, 6), "d": round(time.monotonic() - inicio, 6)}
+        if error is not None:
+            registro["e"] = error
+        elif respuesta is not None:
+            registro.update(_codificar(respuesta))
+        self._escribir(registro)
+        self.operaciones += 1
+
+    def abrir(self, equipo):
+        direccion = f"{equipo.ip}:{equipo.puerto}"
+        inicio = time.monotonic()
+        try:
+            instrumento = equipo._abrir_visa()
+        except Exception as e:
+            self.registrar(direccion, "abrir", None, inicio, error=str(e))
+            raise
+        self.registrar(direccion, "abrir", None, inicio)
+        return InstrumentoGrabado(instrumento, self, direccion)
+
+    def cerrar(self):
+        with self._lock:
+            if self._salida is not None:
+                self._salida.close()
+                self._salida = None
+
+class InstrumentoGrabado:
+    """Sesión VISA real que anota cada operación en la grabadora"""
+
+    def __init__(self, instrumento, grabadora, direccion):
+        # Atributos propios en __dict__; el resto (timeout, terminaciones,
+        # session, visalib) se reenvía a la sesión real
+        self.__dict__.update(_instrumento=instrumento, _grabadora=grabadora, _direccion=direccion)
+
+    def __getattr__(self, nombre):
+        return getattr(self._instrumento, nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._instrumento, nombre, valor)
+
+    def _operar(self, operacion, comando, funcion, *argumentos):
+        inicio = time.monotonic()
+        try:
+            respuesta = funcion(*argumentos)
+        except Exception as e:
+            self._grabadora.registrar(self._direccion, operacion, comando, inicio, error=str(e))
+            raise
+        self._grabadora.registrar(self._direccion, operacion, comando, inicio,
+                                  respuesta if operacion != "write" else None)
+        return respuesta
+
+    def write(self, comando):
+        return self._operar("write", comando, self._instrumento.write, comando)
+
+    def query(self, comando):
+        return self._operar("query", comando, self._instrumento.query, comando)
+
+    def read_raw(self):
+        return self._operar("read_raw", None, self._instrumento.read_raw)
+
+    def read_bytes(self, cantidad):
+        return self._operar("read_bytes", cantidad, self._instrumento.read_bytes, cantidad)
+
+    def clear(self):
+        return self._operar("clear", None, self._instrumento.clear)
+
+    def close(self):
+        self._instrumento.close()
+
+def cargar_grabacion(archivo):
+    """
+    Lee una grabación
+
+    Returns:
+        dict: cabecera, meta (datos anotados, combinados) y operaciones
+            (lista en orden de grabación)
+    """
+    cabecera, meta, operaciones = None, {}, []
+    with _abrir_archivo(archivo, "r") as entrada:
+        for linea in entrada:
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            if cabecera is None:
+                cabecera = registro
+            elif "meta" in registro:
+                meta.update(registro["meta"])
+            else:
+                operaciones.append(registro)
+    if not cabecera or cabecera.get("version") != VERSION:
+        raise ValueError(f"Grabación no reconocida: {archivo}")
+    return {"cabecera": cabecera, "meta": meta, "operaciones": operaciones}
+
+class Reproductor:
+    """
+    Transporte que reproduce una grabación sin equipos.
+
+    Las operaciones se sirven por equipo (ip:puerto) en el orden grabado; las
+    respuestas con error se reproducen como excepciones con el mismo mensaje
+    (la lógica de reintentos ve lo mismo que en la sesión real).
+
+    Args:
+        archivo: Grabación de Grabadora
+        velocidad: "grabada" (cada operación tarda lo que tardó) o "maxima"
+        estricto: Lanzar DesincronizacionReproduccion si la operación pedida no
+            coincide con la grabada; si es False, se salta hasta la siguiente
+            que coincida
+    """
+
+    def __init__(self, archivo, velocidad="grabada", estricto=True):
+        if velocidad not in VELOCIDADES:
+            raise ValueError(f"Velocidad no válida: {velocidad} (usar {', '.join(VELOCIDADES)})")
+        grabacion = cargar_grabacion(archivo)
+        self.archivo = archivo
+        self.meta = grabacion["meta"]
+        self.velocidad = velocidad
+        self.estricto = estricto
+        self.operaciones = 0
+        self.saltadas = 0
+        # Primera desincronización (los equipos capturan sus excepciones y
+        # el motor puede seguir o terminar sin mostrarla)
+        self.desincronizacion = None
+        self._instante = 0.0
+        self._lock = threading.Lock()
+        self._colas = defaultdict(deque)
+        for operacion in grabacion["operaciones"]:
+            self._colas[operacion["eq"]].append(operacion)
+
+    @property
+    def pendientes(self):
+        """Operaciones grabadas que la reproducción aún no ha pedido"""
+        with self._lock:
+            return sum(len(cola) for cola in self._colas.values())
+
+    def siguiente(self, direccion, operacion, comando):
+        with self._lock:
+            cola = self._colas.get(direccion)
+            while cola:
+                registro = cola.popleft()
+                if registro["op"] == operacion and registro.get("c") == comando:
+                    break
+                if self.estricto:
+                    self._desincronizar(f"{direccion}: se esperaba {registro['op']} {registro.get('c')!r} "
+                                        f"y se pidió {operacion} {comando!r}")
+                self.saltadas += 1
+            else:
+                self._desincronizar(f"{direccion}: la grabación no tiene más operaciones ({operacion} {comando!r})")
+            self.operaciones += 1
+            self._instante = registro["t"] + registro["d"]
+
+        if self.velocidad == "grabada" and registro.get("d"):
+            time.sleep(registro["d"])
+        if "e" in registro:
+            raise IOError(registro["e"])
+        if "b" in registro:
+            return base64.b64decode(registro["b"])
+        return registro.get("r")
+
+    def reloj(self):
+        """
+        Segundos de la sesión grabada hasta la última operación servida: las
+        decisiones que dependen del tiempo (p. ej. el presupuesto de capturas)
+        se repiten igual a cualquier velocidad
+        """
+        with self._lock:
+            return self._instante
+
+    def _desincronizar(self, mensaje):
+        if self.desincronizacion is None:
+            self.desincronizacion = mensaje
+        raise DesincronizacionReproduccion(mensaje)
+
+    def token(self):
+        """Token de cancelación para la sesión reproducida (sin esperas a velocidad máxima)"""
+        return TokenSinEsperas() if self.velocidad == "maxima" else TokenCancelacion()
+
+    def abrir(self, equipo):
+        direccion = f"{equipo.ip}:{equipo.puerto}"
+        self.siguiente(direccion, "abrir", None)
+        return InstrumentoReproducido(self, direccion)
+
+class InstrumentoReproducido:
+    """Sesión simulada: cada operación devuelve la respuesta grabada"""
+
+    def __init__(self, reproductor, direccion):
+        self._reproductor = reproductor
+        self._direccion = direccion
+        self.timeout = None
+        self.read_termination = None
+        self.write_termination = None
+
+    def write(self, comando):
+        return self._reproductor.siguiente(self._direccion, "write", comando)
+
+    def query(self, comando):
+        return self._reproductor.siguiente(self._direccion, "query", comando)
+
+    def read_raw(self):
+        return self._reproductor.siguiente(self._direccion, "read_raw", None)
+
+    def read_bytes(self, cantidad):
+        return self._reproductor.siguiente(self._direccion, "read_bytes", cantidad)
+
+    def clear(self):
+        return self._reproductor.siguiente(self._direccion, "clear", None)
+
+    def close(self):
+        pass
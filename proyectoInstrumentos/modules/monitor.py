@@ -0,0 +1,277 @@
+# Archivo modules/monitor.py - Salud y latencia de los equipos de cada perfil
+#
+# Un hilo en segundo plano consulta periódicamente (*IDN?) los equipos de los
+# perfiles activos y guarda en un búfer circular la latencia y el error de
+# cada consulta. Así se sabe que un banco no responde o va lento antes de
+# empezar un barrido, no a mitad.
+#
+# Los equipos aceptan una sola conexión, así que el monitor:
+#   - usa la sesión del control manual si hay una abierta (sin esperarla si
+#     está ocupada) y, si no, conecta, consulta y desconecta;
+#   - no consulta nada mientras hay un barrido en curso (reservar()) o
+#     mientras `ocupado()` lo indique (p. ej. un servicio de barridos externo);
+#   - se salta los equipos reservados por un barrido de otro proceso
+#     (modules.reservas, p. ej. `python -m modules.barrido`).
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from modules.equipos import Osciloscopio, GeneradorFunciones
+from modules.reservas import reserva_equipo
+
+OK = "ok"
+DEGRADADO = "degradado"
+CAIDO = "caido"
+SIN_DATOS = "sin datos"
+
+# Orden de gravedad para el estado de un perfil (el peor de sus equipos)
+_GRAVEDAD = {OK: 0, SIN_DATOS: 1, DEGRADADO: 2, CAIDO: 3}
+
+class MonitorEquipos:
+    """
+    Monitor de salud de los equipos de todos los perfiles activos.
+
+    Args:
+        perfiles: Función sin argumentos que devuelve la lista de perfiles
+            (por defecto, los de perfiles_red.json)
+        banco: BancoInstrumentos cuyas sesiones manuales se reutilizan
+        ocupado: Función que devuelve True si otro proceso está usando los equipos
+        intervalo: Segundos entre rondas de consultas
+        muestras: Tamaño del búfer circular por equipo
+        ventana: Últimas consultas con las que se decide el estado (un
+            equipo reparado vuelve a estar bien sin esperar a vaciar el búfer)
+        timeout: Timeout de cada consulta en ms
+        umbral_errores: Fracción de consultas fallidas a partir de la cual
+            el equipo está degradado
+        umbral_latencia_ms: Latencia mediana a partir de la cual está degradado
+        fallos_caido: Fallos consecutivos para considerarlo caído
+    """
+
+    def __init__(self, perfiles=None, banco=None, ocupado=None, intervalo=15.0, muestras=40, ventana=10,
+                 timeout=1500, umbral_errores=0.2, umbral_latencia_ms=500.0, fallos_caido=3):
+        self._perfiles = perfiles or _perfiles_configurados
+        self.banco = banco
+        self.ocupado = ocupado
+        self.intervalo = intervalo
+        self.muestras = muestras
+        self.ventana = ventana
+        self.timeout = timeout
+        self.umbral_errores = umbral_errores
+        self.umbral_latencia_ms = umbral_latencia_ms
+        self.fallos_caido = fallos_caido
+        self._historial = {}
+        self._lock = threading.Lock()
+        # Se mantiene durante cada consulta; reservar() lo toma para esperarla
+        self._lock_sondeo = threading.Lock()
+        self._reservas = 0
+        self._motivo_reserva = None
+        self._en_uso_externo = False
+        self._reservados = []
+        self._despertar = threading.Event()
+        self._hilo = None
+
+    @property
+    def pausado_por(self):
+        """Motivo por el que no se consultan los equipos, o None"""
+        if self._reservas:
+            return self._motivo_reserva
+        if self._en_uso_externo:
+            return "Equipos en uso por el servicio de barridos"
+        if self._reservados:
+            return f"Equipos reservados por otro proceso: {', '.join(self._reservados)}"
+        return None
+
+    def iniciar(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._ejecutar, name="monitor-equipos", daemon=True)
+            self._hilo.start()
+        return self
+
+    def sondear_ahora(self):
+        """Adelanta la siguiente ronda de consultas"""
+        self._despertar.set()
+
+    @contextmanager
+    def reservar(self, motivo="Barrido en curso"):
+        """
+        Reserva los equipos (p. ej. durante un barrido): espera a que termine
+        la consulta en curso y no hace ninguna más hasta salir del bloque
+        """
+        with self._lock:
+            self._reservas += 1
+            self._motivo_reserva = motivo
+        with self._lock_sondeo:
+            pass
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reservas -= 1
+
+    def _ejecutar(self):
+        while True:
+            try:
+                self.ronda()
+            except Exception as e:
+                print(f"Error en el monitor de equipos: {e}")
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+
+    def _direcciones(self):
+        direcciones = {}
+        for perfil in self._perfiles():
+            if not perfil.get("activo", True):
+                continue
+            for rol, clase in (("osciloscopio", Osciloscopio), ("generador", GeneradorFunciones)):
+                clave = (perfil[rol]["ip"], int(perfil[rol]["puerto"]))
+                direcciones.setdefault(clave, clase)
+        return direcciones
+
+    def ronda(self):
+        """Consulta una vez cada equipo de los perfiles activos (salvo si están reservados)"""
+        self._en_uso_externo = self.ocupado is not None and bool(self.ocupado())
+        if self._en_uso_externo:
+            return
+        reservados = []
+        for (ip, puerto), clase in self._direcciones().items():
+            with self._lock_sondeo:
+                if self._reservas:
+                    return
+                if reserva_equipo(ip, puerto) is not None:
+                    # Barrido en otro proceso: ni se consulta ni se cuenta
+                    reservados.append(f"{ip}:{puerto}")
+                    continue
+                muestra = self._sondear(clase, ip, puerto)
+            if muestra is None:
+                continue  # Sesión manual ocupada: no se cuenta
+            with self._lock:
+                self._historial.setdefault((ip, puerto), deque(maxlen=self.muestras)).append(muestra)
+        self._reservados = reservados
+
+    def _sondear(self, clase, ip, puerto):
+        # Con una sesión manual abierta se usa esa conexión (sin esperar si está ocupada)
+        sesion = self.banco.sesion_conectada(ip, puerto) if self.banco is not None else None
+        if sesion is not None:
+            resultado = sesion.sondear()
+            return None if resultado is None else (time.time(), *resultado)
+
+        equipo = clase(ip, puerto, timeout=self.timeout)
+        conectado, error = equipo.conectar()
+        if not conectado:
+            return (time.time(), None, error or "Sin conexión")
+        try:
+            inicio = time.perf_counter()
+            _, error = equipo.identificar()
+            return (time.time(), (time.perf_counter() - inicio) * 1000, error)
+        finally:
+            equipo.desconectar()
+
+    def salud_equipo(self, ip, puerto):
+        """
+        Resumen de las últimas consultas (ventana) de un equipo
+
+        Returns:
+            dict: estado (ok, degradado, caido o sin datos), muestras,
+                tasa_error, latencia_ms (mediana), latencia_max_ms,
+                ultimo_error y ultima (hora de la última consulta)
+        """
+        with self._lock:
+            muestras = list(self._historial.get((ip, int(puerto)), ()))[-self.ventana:]
+        if not muestras:
+            return {"estado": SIN_DATOS, "muestras": 0, "tasa_error": None, "latencia_ms": None,
+                    "latencia_max_ms": None, "ultimo_error": None, "ultima": None}
+
+        errores = [error for _, _, error in muestras if error]
+        latencias = sorted(ms for _, ms, error in muestras if ms is not None and not error)
+        tasa_error = len(errores) / len(muestras)
+        mediana = latencias[len(latencias) // 2] if latencias else None
+        recientes = muestras[-self.fallos_caido:]
+        if len(recientes) == self.fallos_caido and all(error for _, _, error in recientes):
+            estado = CAIDO
+        elif tasa_error > self.umbral_errores or (mediana is not None and mediana > self.umbral_latencia_ms):
+            estado = DEGRADADO
+        else:
+            estado = OK
+        return {
+            "estado": estado,
+            "muestras": len(muestras),
+            "tasa_error": tasa_error,
+            "latencia_ms": mediana,
+            "latencia_max_ms": latencias[-1] if latencias else None,
+            "ultimo_error": muestras[-1][2],
+            "ultima": datetime.fromtimestamp(muestras[-1][0]).strftime("%H:%M:%S"),
+        }
+
+    def latencias(self, ip, puerto):
+        """Serie del búfer: lista de (hora, latencia_ms o None, error)"""
+        with self._lock:
+            return [(datetime.fromtimestamp(t), ms, error)
+                    for t, ms, error in self._historial.get((ip, int(puerto)), ())]
+
+    def salud_perfil(self, perfil):
+        """
+        Returns:
+            str: Estado del perfil (el peor de sus dos equipos)
+            dict: Salud por rol (osciloscopio, generador)
+        """
+        equipos = {rol: self.salud_equipo(perfil[rol]["ip"], perfil[rol]["puerto"])
+                   for rol in ("osciloscopio", "generador")}
+        estado = max((salud["estado"] for salud in equipos.values()), key=_GRAVEDAD.get)
+        return estado, equipos
+
+    def tabla(self):
+        """Una fila por perfil y equipo para el panel de estado"""
+        filas = []
+        for perfil in self._perfiles():
+            for rol in ("osciloscopio", "generador"):
+                salud = self.salud_equipo(perfil[rol]["ip"], perfil[rol]["puerto"])
+                filas.append({
+                    "perfil": perfil["nombre"], "equipo": rol,
+                    "direccion": f"{perfil[rol]['ip']}:{perfil[rol]['puerto']}",
+                    "estado": salud["estado"],
+                    "latencia_ms": round(salud["latencia_ms"], 1) if salud["latencia_ms"] is not None else None,
+                    "errores_%": round(salud["tasa_error"] * 100) if salud["tasa_error"] is not None else None,
+                    "ultima": salud["ultima"],
+                })
+        return filas
+
+    def comprobar_banco(self, parametros):
+        """
+        Comprueba que los equipos de un barrido no estén degradados ni caídos
+
+        Args:
+            parametros: Parámetros del barrido (gen_ip, gen_puerto, osc_ip, osc_puerto)
+
+        Returns:
+            str: Motivo para no iniciar el barrido o None si se puede iniciar
+        """
+        problemas = []
+        for nombre, ip, puerto in (("generador", parametros.get("gen_ip"), parametros.get("gen_puerto")),
+                                   ("osciloscopio", parametros.get("osc_ip"), parametros.get("osc_puerto"))):
+            if ip is None or puerto is None:
+                continue
+            salud = self.salud_equipo(ip, puerto)
+            if salud["estado"] == CAIDO:
+                problemas.append(f"el {nombre} ({ip}:{puerto}) no responde: {salud['ultimo_error']}")
+            elif salud["estado"] == DEGRADADO:
+                latencia = f"{salud['latencia_ms']:.0f} ms" if salud["latencia_ms"] is not None else "sin latencia"
+                problemas.append(f"el {nombre} ({ip}:{puerto}) está degradado "
+                                 f"({salud['tasa_error']:.0%} de errores, {latencia})")
+        if problemas:
+            return "Banco no disponible: " + "; ".join(problemas)
+        return None
+
+    def olvidar(self, ip=None, puerto=None):
+        """Descarta el historial de un equipo (o de todos), p. ej. tras repararlo"""
+        with self._lock:
+            if ip is None:
+                self._historial.clear()
+            else:
+                self._historial.pop((ip, int(puerto)), None)
+
+def _perfiles_configurados():
+    from modules.config import cargar_perfiles_red
+    return cargar_perfiles_red()["perfiles"]
@@ -0,0 +1,165 @@
+# Archivo modules/persistencia.py - Guardado diferido de resultados
+
+import queue
+import threading
+import time
+from datetime import datetime
+from modules.config import agregar_mediciones_ganancia
+
+# Marcadores internos de la cola
+_VACIAR = object()
+_CERRAR = object()
+
+class EscritorResultados:
+    """
+    Persistencia diferida (write-behind) de las mediciones de ganancia.
+
+    Las mediciones se encolan desde el hilo de medición y un hilo escritor
+    dedicado las guarda por lotes con una única escritura atómica, de modo que
+    la latencia del disco nunca prolonga el tiempo con la salida activada.
+
+    Args:
+        progreso_callback: Función callback para informar avisos y errores
+        capacidad: Tamaño máximo de la cola de mediciones pendientes
+        tamano_lote: Número de mediciones que fuerza una escritura
+        intervalo_max: Tiempo máximo (s) que una medición espera en memoria
+        funcion_guardado: Función que guarda un lote (por defecto en datos_ganancia.json)
+    """
+
+    def __init__(self, progreso_callback=None, capacidad=256, tamano_lote=32,
+                 intervalo_max=2.0, funcion_guardado=agregar_mediciones_ganancia):
+        self.progreso_callback = progreso_callback
+        self.tamano_lote = tamano_lote
+        self.intervalo_max = intervalo_max
+        self.funcion_guardado = funcion_guardado
+
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._hilo = None
+        self._pendientes = []
+        self.guardadas = 0
+        self.errores = 0
+
+    def _informar(self, mensaje):
+        if self.progreso_callback:
+            try:
+                self.progreso_callback(mensaje)
+            except Exception as e:
+                print(f"Error en callback del escritor de resultados: {e}")
+        else:
+            print(mensaje)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name="escritor-resultados", daemon=True)
+            self._hilo.start()
+        return self
+
+    def agregar(self, medicion, timeout=5.0):
+        """
+        Encola una medición para su guardado
+
+        Args:
+            medicion: Diccionario con los campos de la medición
+            timeout: Tiempo máximo de espera si la cola está llena
+
+        Returns:
+            bool: True si se encoló, False si se descartó
+        """
+        medicion = dict(medicion)
+        medicion.setdefault("fecha", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+        try:
+            self._cola.put_nowait(medicion)
+            return True
+        except queue.Full:
+            # Contrapresión: avisar y esperar a que el escritor libere espacio
+            self._informar(f"Advertencia: cola de guardado llena ({self._cola.maxsize}), esperando al disco...")
+
+        try:
+            self._cola.put(medicion, timeout=timeout)
+            return True
+        except queue.Full:
+            self.errores += 1
+            self._informar(f"Error: no se pudo encolar la medición de {medicion.get('frecuencia')} Hz para guardado.")
+            return False
+
+    def vaciar(self, timeout=None):
+        """
+        Fuerza la escritura de todo lo pendiente (límite de secuencia)
+
+        Returns:
+            bool: True si se completó la escritura dentro del tiempo indicado
+        """
+        if self._hilo is None:
+            return True
+
+        completado = threading.Event()
+        self._cola.put((_VACIAR, completado))
+        return completado.wait(timeout)
+
+    def cerrar(self, timeout=None):
+        """Escribe lo pendiente y detiene el hilo escritor"""
+        if self._hilo is None:
+            return True
+
+        self._cola.put((_CERRAR, None))
+        self._hilo.join(timeout)
+        terminado = not self._hilo.is_alive()
+        self._hilo = None
+        return terminado
+
+    def _escribir_lote(self):
+        if not self._pendientes:
+            return True
+
+        try:
+            guardado = self.funcion_guardado(self._pendientes)
+        except Exception as e:
+            guardado = False
+            self._informar(f"Error al guardar resultados: {str(e)}")
+
+        if guardado:
+            self.guardadas += len(self._pendientes)
+            self._pendientes = []
+            return True
+
+        # Se conservan para reintentar en la siguiente escritura
+        self.errores += 1
+        self._informar(f"Advertencia: No se pudieron guardar {len(self._pendientes)} mediciones, se reintentará.")
+        return False
+
+    def _ejecutar(self):
+        primera_pendiente = None
+
+        while True:
+            # Esperar como máximo hasta que venza la medición más antigua
+            if primera_pendiente is None:
+                espera = None
+            else:
+                espera = max(0.0, self.intervalo_max - (time.monotonic() - primera_pendiente))
+
+            try:
+                elemento = self._cola.get(timeout=espera)
+            except queue.Empty:
+                self._escribir_lote()
+                primera_pendiente = time.monotonic() if self._pendientes else None
+                continue
+
+            if isinstance(elemento, tuple) and elemento[0] is _VACIAR:
+                self._escribir_lote()
+                primera_pendiente = time.monotonic() if self._pendientes else None
+                elemento[1].set()
+                continue
+
+            if isinstance(elemento, tuple) and elemento[0] is _CERRAR:
+                if not self._escribir_lote():
+                    self._informar(f"Error: se perdieron {len(self._pendientes)} mediciones sin guardar.")
+                return
+
+            self._pendientes.append(elemento)
+            if primera_pendiente is None:
+                primera_pendiente = time.monotonic()
+
+            if len(self._pendientes) >= self.tamano_lote:
+                self._escribir_lote()
+                primera_pendiente = time.monotonic() if self._pendientes else None
@@ -0,0 +1,426 @@
+# Archivo modules/planes.py - Planes de barrido declarativos compilados a programas SCPI
+#
+# Un plan describe QUÉ medir (ejes, estímulo, canales, rango y adquisición).
+# compilar_plan() lo convierte en un programa: para cada punto, solo los
+# comandos SCPI que cambian respecto al punto anterior, más las esperas y
+# consultas necesarias. Así se puede estimar la duración antes de empezar.
+#
+# Ejemplo (JSON; también YAML si está instalado PyYAML):
+#
+#   {
+#     "nombre": "Bode filtro RC",
+#     "ejes": [{"parametro": "frecuencia", "inicio": 10, "fin": 1000000, "puntos": 30, "escala": "log"}],
+#     "estimulo": {"canal": 1, "forma_onda": "SINusoid", "amplitud": 0.05, "offset": 0.0},
+#     "canales": {"entrada": 1, "salida": 2, "acoplamiento": "AC"},
+#     "rango": {"modo": "inicial", "periodos": 4},
+#     "adquisicion": {"estabilizacion": 0.5, "entre_mediciones": 0.2}
+#   }
+#
+# Con "establecimiento": {"modo": "adaptativo"} la espera de cada punto la
+# decide modules.establecimiento (periodos de la señal y constante de tiempo
+# del dispositivo) en lugar de adquisicion.estabilizacion.
+
+import copy
+import itertools
+import json
+import math
+
+from modules.config import generar_frecuencias
+from modules.establecimiento import ESTABLECIMIENTO_POR_DEFECTO, validar_establecimiento, tiempo_minimo
+
+# Parámetros del estímulo que se pueden barrer
+PARAMETROS_EJE = ("frecuencia", "amplitud", "offset")
+
+# Políticas de rango del osciloscopio:
+#   autoset: AUTOSet en cada punto (como el barrido original)
+#   inicial: AUTOSet solo en el primer punto
+#   fijo:    sin AUTOSet; escalas verticales del plan
+MODOS_RANGO = ("autoset", "inicial", "fijo")
+
+# Acoplamientos de los canales del osciloscopio
+ACOPLAMIENTOS = ("AC", "DC", "GND")
+
+# Medidas para el cálculo de ganancia y su raíz SCPI
+MEDIDAS = {"PK2PK": ":MEASure:PK2PK", "AMPLITUDE": ":MEASure:AMPlitude"}
+
+# Fase de la salida respecto a la entrada (SOURce1 = entrada, SOURce2 = salida)
+MEDIDA_FASE = ":MEASure:PHAse"
+
+# Coste aproximado (s) de cada operación para estimar la duración
+COSTOS_ESTIMADOS = {
+    "conexion": 0.15,   # Conectar e identificar un equipo
+    "comando": 0.02,    # Escritura (un lote canalizado cuenta como una)
+    "query": 0.06,      # Consulta con respuesta
+}
+
+PLAN_POR_DEFECTO = {
+    "nombre": "Barrido",
+    "ejes": [],
+    "estimulo": {"canal": 1, "forma_onda": "SINusoid", "frecuencia": 1000.0, "amplitud": 0.05, "offset": 0.0},
+    "canales": {"entrada": 1, "salida": 2, "acoplamiento": "AC", "posicion": 0},
+    "rango": {"modo": "autoset", "escalas": {}, "periodos": None},
+    "adquisicion": {"estabilizacion": 0.5, "entre_mediciones": 0.5, "detener": True, "espera_medicion": 0.2,
+                    "medir_fase": False},
+    "establecimiento": dict(ESTABLECIMIENTO_POR_DEFECTO),
+}
+
+def cargar_plan(ruta):
+    """
+    Lee un plan de un archivo JSON o YAML (.yaml/.yml)
+
+    Returns:
+        dict: Plan validado o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            texto = f.read()
+    except OSError as e:
+        return None, f"No se pudo leer {ruta}: {e}"
+    return leer_plan(texto, yaml=ruta.endswith((".yaml", ".yml")))
+
+def leer_plan(texto, yaml=False):
+    """Como cargar_plan, a partir del texto del plan"""
+    try:
+        if yaml:
+            try:
+                import yaml as pyyaml
+            except ImportError:
+                return None, "Los planes YAML necesitan PyYAML (pip install pyyaml)"
+            plan = pyyaml.safe_load(texto)
+        else:
+            plan = json.loads(texto)
+    except Exception as e:
+        return None, f"Plan no válido: {e}"
+    return validar_plan(plan)
+
+def plan_desde_parametros(frecuencias, amplitud=0.05, offset=0.0, forma_onda="SINusoid",
+                          tiempo_estabilizacion=0.5, tiempo_entre_mediciones=0.5, establecimiento=None):
+    """Plan equivalente a los parámetros clásicos de ejecutar_secuencia_completa"""
+    plan = {
+        "nombre": "Barrido de frecuencias",
+        "ejes": [{"parametro": "frecuencia", "valores": list(frecuencias)}],
+        "estimulo": {"forma_onda": forma_onda, "amplitud": amplitud, "offset": offset},
+        "rango": {"modo": "autoset"},
+        "adquisicion": {"estabilizacion": tiempo_estabilizacion, "entre_mediciones": tiempo_entre_mediciones},
+    }
+    if establecimiento:
+        plan["establecimiento"] = dict(establecimiento)
+    return plan
+
+def _es_canal(valor):
+    # 1 o 2 como entero (no booleano)
+    return type(valor) is int and valor in (1, 2)
+
+def _real(valor):
+    """Valor como float si es un número finito (no booleano), o None"""
+    if isinstance(valor, bool):
+        return None
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if math.isfinite(numero) else None
+
+def validar_plan(plan):
+    """
+    Completa un plan con los valores por defecto y comprueba su contenido
+
+    Returns:
+        dict: Plan completo o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    if not isinstance(plan, dict):
+        return None, "El plan debe ser un objeto con ejes, estimulo, canales, rango y adquisicion"
+
+    completo = copy.deepcopy(PLAN_POR_DEFECTO)
+    for seccion, valor in plan.items():
+        if seccion not in completo:
+            return None, f"Sección desconocida en el plan: {seccion}"
+        if isinstance(completo[seccion], dict):
+            if not isinstance(valor, dict):
+                return None, f"La sección {seccion} debe ser un objeto"
+            desconocidas = set(valor) - set(completo[seccion])
+            if desconocidas:
+                return None, f"Claves desconocidas en {seccion}: {', '.join(sorted(desconocidas))}"
+            completo[seccion].update(valor)
+        else:
+            completo[seccion] = valor
+
+    if not isinstance(completo["ejes"], list) or not completo["ejes"]:
+        return None, "El plan necesita al menos un eje"
+    ejes = []
+    for eje in completo["ejes"]:
+        if not isinstance(eje, dict):
+            return None, "Cada eje debe ser un objeto con parametro y valores (o inicio, fin y puntos)"
+        parametro = eje.get("parametro")
+        if parametro not in PARAMETROS_EJE:
+            return None, f"Parámetro de eje no válido: {parametro} (usar {', '.join(PARAMETROS_EJE)})"
+        if "valores" in eje:
+            valores = eje["valores"]
+            if not isinstance(valores, list):
+                return None, f"Eje {parametro}: 'valores' debe ser una lista de números"
+        else:
+            try:
+                escala = "Lineal" if eje.get("escala", "log") in ("lin", "lineal") else "Logarítmica"
+                extremos = [_real(eje["inicio"]), _real(eje["fin"])]
+                puntos = _real(eje["puntos"])
+            except KeyError as e:
+                return None, f"Eje {parametro}: falta {e} (o indicar 'valores')"
+            if None in extremos or puntos is None or puntos < 1 or puntos != int(puntos):
+                return None, f"Eje {parametro}: inicio y fin deben ser números y puntos un entero positivo"
+            if escala == "Logarítmica" and min(extremos) <= 0:
+                return None, f"Eje {parametro}: la escala logarítmica necesita inicio y fin mayores que 0"
+            valores = generar_frecuencias(extremos[0], extremos[1], int(puntos), escala)
+        valores = [_real(v) for v in valores]
+        if None in valores:
+            return None, f"Eje {parametro}: los valores deben ser números"
+        if not valores:
+            return None, f"Eje {parametro}: sin valores"
+        if parametro == "frecuencia" and min(valores) <= 0:
+            return None, f"Eje {parametro}: las frecuencias deben ser mayores que 0"
+        ejes.append({"parametro": parametro, "valores": valores})
+    completo["ejes"] = ejes
+
+    estimulo = completo["estimulo"]
+    for parametro in PARAMETROS_EJE:
+        if _real(estimulo[parametro]) is None:
+            return None, f"estimulo.{parametro} debe ser un número"
+    if _real(estimulo["frecuencia"]) <= 0:
+        return None, "estimulo.frecuencia debe ser mayor que 0"
+    if not _es_canal(estimulo["canal"]):
+        return None, "estimulo.canal debe ser 1 o 2"
+    if not isinstance(estimulo["forma_onda"], str) or not estimulo["forma_onda"]:
+        return None, "estimulo.forma_onda debe ser un texto (p. ej. SINusoid)"
+
+    rango = completo["rango"]
+    if rango["modo"] not in MODOS_RANGO:
+        return None, f"Modo de rango no válido: {rango['modo']} (usar {', '.join(MODOS_RANGO)})"
+    if rango["periodos"] is not None and not (_real(rango["periodos"]) or 0) > 0:
+        return None, "rango.periodos debe ser un número mayor que 0"
+    if not isinstance(rango["escalas"], dict) or not all((_real(v) or 0) > 0 for v in rango["escalas"].values()):
+        return None, "rango.escalas debe asociar cada canal a una escala (V/div) mayor que 0"
+    completo["establecimiento"], error = validar_establecimiento(completo["establecimiento"])
+    if error:
+        return None, error
+    canales = completo["canales"]
+    if not (_es_canal(canales["entrada"]) and _es_canal(canales["salida"])) or canales["entrada"] == canales["salida"]:
+        return None, "Los canales de entrada y salida deben ser 1 y 2"
+    if canales["acoplamiento"] not in ACOPLAMIENTOS:
+        return None, f"Acoplamiento no válido: {canales['acoplamiento']} (usar {', '.join(ACOPLAMIENTOS)})"
+    if _real(canales["posicion"]) is None:
+        return None, "canales.posicion debe ser un número"
+
+    adquisicion = completo["adquisicion"]
+    for clave in ("estabilizacion", "entre_mediciones", "espera_medicion"):
+        segundos = _real(adquisicion[clave])
+        if segundos is None or segundos < 0:
+            return None, f"adquisicion.{clave} debe ser un número de segundos mayor o igual que 0"
+    for clave in ("detener", "medir_fase"):
+        if not isinstance(adquisicion[clave], bool):
+            return None, f"adquisicion.{clave} debe ser true o false"
+
+    return completo, None
+
+def generar_puntos(plan):
+    """Puntos del barrido: producto de los ejes, el primero es el más externo"""
+    base = {clave: plan["estimulo"][clave] for clave in PARAMETROS_EJE}
+    nombres = [eje["parametro"] for eje in plan["ejes"]]
+    return [
+        {**base, **dict(zip(nombres, valores))}
+        for valores in itertools.product(*(eje["valores"] for eje in plan["ejes"]))
+    ]
+
+def _numero(valor):
+    return f"{float(valor):.10g}"
+
+def _escala_125(valor):
+    """Menor escala de la serie 1-2-5 que no es inferior a `valor`"""
+    decada = 10.0 ** math.floor(math.log10(valor))
+    for factor in (1, 2, 5, 10):
+        if factor * decada >= valor * (1 - 1e-9):
+            return factor * decada
+
+def _compilar_punto(plan, punto, indice, estado):
+    """
+    Instrucciones de un punto a partir del estado conocido de los equipos.
+    Actualiza `estado`; con un estado vacío se obtiene la configuración completa.
+    """
+    instrucciones = []
+    generador, osciloscopio = estado["generador"], estado["osciloscopio"]
+    estimulo, canales, rango, adquisicion = plan["estimulo"], plan["canales"], plan["rango"], plan["adquisicion"]
+    establecimiento = plan["establecimiento"]
+    c = estimulo["canal"]
+
+    def comando(equipo, clave, valor, texto):
+        # Solo se envía lo que cambia respecto al estado conocido
+        memoria = generador if equipo == "generador" else osciloscopio
+        if memoria.get(clave) != valor:
+            memoria[clave] = valor
+            instrucciones.append({"linea": indice + 1, "equipo": equipo, "tipo": "comando", "texto": texto})
+
+    def accion(equipo, texto):
+        instrucciones.append({"linea": indice + 1, "equipo": equipo, "tipo": "comando", "texto": texto})
+
+    def espera(segundos, establecer=False):
+        if segundos > 0:
+            instrucciones.append({"linea": indice + 1, "equipo": None, "tipo": "espera", "ms": segundos * 1000,
+                                  "texto": f"WAIT {segundos * 1000:g}", "establecimiento": establecer})
+
+    def establecer(final):
+        # Espera de establecimiento de la señal: fija o según la política
+        # (modules.establecimiento), que se resuelve al ejecutar
+        if establecimiento["modo"] == "fijo":
+            espera(adquisicion["estabilizacion"], establecer=True)
+            return
+        confirmar = final and establecimiento["confirmar"]
+        if confirmar:
+            # La confirmación lee la amplitud del canal de salida
+            n = canales["salida"]
+            comando("osciloscopio", "fuente", n, f":MEASure:SOURce1 CH{n}")
+            comando("osciloscopio", "medida:AMPLITUDE", True, f"{MEDIDAS['AMPLITUDE']} ON")
+        minimo = tiempo_minimo(establecimiento, float(punto["frecuencia"])) * 1000
+        instrucciones.append({"linea": indice + 1, "equipo": "osciloscopio" if confirmar else None,
+                              "tipo": "establecimiento", "ms": minimo, "frecuencia": float(punto["frecuencia"]),
+                              "confirmar": confirmar, "consulta": f"{MEDIDAS['AMPLITUDE']}?",
+                              "texto": f"SETTLE {minimo:g}"})
+
+    # Generador: forma, frecuencia, amplitud y offset que cambian; salida activada una vez
+    comando("generador", "forma", estimulo["forma_onda"], f":SOURce{c}:FUNCtion {estimulo['forma_onda']}")
+    comando("generador", "frecuencia", _numero(punto["frecuencia"]), f":SOURce{c}:FREQuency {_numero(punto['frecuencia'])}")
+    comando("generador", "amplitud", _numero(punto["amplitud"]), f":SOURce{c}:AMPlitude {_numero(punto['amplitud'])}")
+    comando("generador", "offset", _numero(punto["offset"]), f":SOURce{c}:DCOffset {_numero(punto['offset'])}")
+    if generador.get("salida") != "ON":
+        generador["salida"] = "ON"
+        instrucciones.append({"linea": indice + 1, "equipo": "generador", "tipo": "salida", "canal": c,
+                              "texto": f"OUTPut{c} ON"})
+
+    # Osciloscopio: rango según la política del plan
+    if rango["modo"] == "autoset" or (rango["modo"] == "inicial" and indice == 0):
+        establecer(final=False)
+        accion("osciloscopio", ":AUTOSet")
+        # AUTOSet cambia escalas, posiciones y base de tiempo: estado desconocido
+        osciloscopio.clear()
+        osciloscopio["adquisicion"] = "RUN"
+        establecer(final=True)
+        ajustes_antes_de_esperar = False
+    else:
+        comando("osciloscopio", "adquisicion", "RUN", ":RUN")
+        ajustes_antes_de_esperar = True
+
+    for n in (canales["entrada"], canales["salida"]):
+        comando("osciloscopio", f"CH{n}:acoplamiento", canales["acoplamiento"], f":CHANnel{n}:COUPling {canales['acoplamiento']}")
+        comando("osciloscopio", f"CH{n}:display", "ON", f":CHANnel{n}:DISPlay ON")
+        if rango["modo"] == "fijo" and str(n) in {str(k) for k in rango["escalas"]}:
+            escala = {str(k): v for k, v in rango["escalas"].items()}[str(n)]
+            comando("osciloscopio", f"CH{n}:escala", _numero(escala), f":CHANnel{n}:SCALe {_numero(escala)}")
+        comando("osciloscopio", f"CH{n}:posicion", _numero(canales["posicion"]), f":CHANnel{n}:POSition {canales['posicion']}")
+    if rango.get("periodos"):
+        # Base de tiempo (serie 1-2-5) para ver al menos `periodos` ciclos en
+        # las 10 divisiones; puntos cercanos comparten escala y no la reenvían
+        base = _numero(_escala_125(float(rango["periodos"]) / (10 * float(punto["frecuencia"]))))
+        comando("osciloscopio", "base_tiempo", base, f":TIMebase:SCALe {base}")
+
+    if ajustes_antes_de_esperar:
+        establecer(final=True)
+
+    if adquisicion["detener"]:
+        accion("osciloscopio", ":STOP")
+        osciloscopio["adquisicion"] = "STOP"
+        espera(0.2)
+
+    # Mediciones: el orden de los canales se alterna entre puntos para que
+    # el último canal de un punto sea el primero del siguiente (un cambio
+    # de fuente menos por punto)
+    roles = [("entrada", canales["entrada"]), ("salida", canales["salida"])]
+    if indice % 2:
+        roles.reverse()
+    for rol, n in roles:
+        if osciloscopio.get("fuente") != n:
+            comando("osciloscopio", "fuente", n, f":MEASure:SOURce1 CH{n}")
+            espera(adquisicion["espera_medicion"])
+        for medida, raiz in MEDIDAS.items():
+            if not osciloscopio.get(f"medida:{medida}"):
+                comando("osciloscopio", f"medida:{medida}", True, f"{raiz} ON")
+                espera(adquisicion["espera_medicion"])
+            instrucciones.append({"linea": indice + 1, "equipo": "osciloscopio", "tipo": "medicion",
+                                  "rol": rol, "medida": medida, "texto": f"{raiz}?"})
+        if rol == "entrada" and adquisicion["medir_fase"]:
+            # Con SOURce1 en la entrada: fase de la salida (SOURce2)
+            comando("osciloscopio", "fuente2", canales["salida"], f":MEASure:SOURce2 CH{canales['salida']}")
+            instrucciones.append({"linea": indice + 1, "equipo": "osciloscopio", "tipo": "medicion",
+                                  "rol": "salida", "medida": "PHASE", "texto": f"{MEDIDA_FASE}?"})
+
+    return instrucciones
+
+def compilar_plan(plan):
+    """
+    Compila un plan en un programa de instrucciones por punto
+
+    Returns:
+        dict: Programa (plan, puntos con 'instrucciones' y 'completo') o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    plan, error = validar_plan(plan)
+    if error:
+        return None, error
+
+    estado = {"generador": {}, "osciloscopio": {}}
+    puntos = []
+    for indice, punto in enumerate(generar_puntos(plan)):
+        puntos.append({
+            "punto": punto,
+            # Solo lo que cambia respecto al punto anterior
+            "instrucciones": _compilar_punto(plan, punto, indice, estado),
+            # Configuración completa, para retomar tras un error en el punto anterior
+            "completo": _compilar_punto(plan, punto, indice, {"generador": {}, "osciloscopio": {}}),
+        })
+
+    return {"plan": plan, "puntos": puntos}, None
+
+def _contar(instrucciones):
+    comandos = sum(1 for i in instrucciones if i["tipo"] in ("comando", "salida"))
+    consultas = sum(1 for i in instrucciones if i["tipo"] == "medicion")
+    # Las esperas de establecimiento adaptativas cuentan con su mínimo
+    esperas = sum(i["ms"] for i in instrucciones if i["tipo"] in ("espera", "establecimiento")) / 1000
+    return comandos, consultas, esperas
+
+def estimar_duracion(programa, costos=COSTOS_ESTIMADOS):
+    """Duración estimada (s) de un programa compilado"""
+    from modules.scripts_scpi import agrupar_pasos
+
+    duracion = 2 * costos["conexion"]
+    for punto in programa["puntos"]:
+        _, consultas, esperas = _contar(punto["instrucciones"])
+        # Los comandos consecutivos de un mismo equipo viajan en una sola escritura
+        escrituras = sum(
+            len(agrupar_pasos(list(grupo)))
+            for (equipo, tipo), grupo in itertools.groupby(
+                punto["instrucciones"], key=lambda i: (i["equipo"], i["tipo"])
+            )
+            if tipo in ("comando", "salida")
+        )
+        duracion += escrituras * costos["comando"] + consultas * costos["query"] + esperas
+    # Con establecimiento adaptativo el motor no hace la pausa entre mediciones
+    if programa["plan"]["establecimiento"]["modo"] != "adaptativo":
+        duracion += max(len(programa["puntos"]) - 1, 0) * programa["plan"]["adquisicion"]["entre_mediciones"]
+    return duracion
+
+def resumen_programa(programa):
+    """
+    Resumen de un programa compilado para mostrar antes de ejecutarlo
+
+    Returns:
+        dict: puntos, comandos, comandos_sin_deltas, consultas y duracion_estimada (s)
+    """
+    comandos = sum(_contar(p["instrucciones"])[0] for p in programa["puntos"])
+    completos = sum(_contar(p["completo"])[0] for p in programa["puntos"])
+    consultas = sum(_contar(p["instrucciones"])[1] for p in programa["puntos"])
+    return {
+        "nombre": programa["plan"]["nombre"],
+        "puntos": len(programa["puntos"]),
+        "comandos": comandos,
+        "comandos_sin_deltas": completos,
+        "consultas": consultas,
+        "duracion_estimada": round(estimar_duracion(programa), 1),
+    }
@@ -0,0 +1,283 @@
+# Archivo modules/referencia.py - Prueba de máscara contra una respuesta de referencia
+#
+# Una referencia ("golden") es una corrida buena con una banda de tolerancia
+# por frecuencia. Cada corrida nueva se interpola sobre la rejilla de
+# frecuencias de la referencia y se obtiene un veredicto (PASA / FALLA /
+# INCOMPLETA), la frecuencia de peor desviación y el margen. Opcionalmente,
+# un límite duro permite abortar el barrido en el primer punto fuera de él.
+
+import math
+import os
+from datetime import datetime
+
+from modules.config import (
+    DATA_DIR, ensure_data_dir, escribir_json_atomico, invalidar_cache,
+    _cargar_json_cacheado, congelar, descongelar
+)
+
+ARCHIVO_REFERENCIAS = os.path.join(DATA_DIR, "referencias.json")
+
+PASA = "PASA"
+FALLA = "FALLA"
+INCOMPLETA = "INCOMPLETA"
+
+# Ganancia mínima representable en dB (como agregar_columnas_db): una placa
+# sin señal de salida debe fallar, no quedar como punto sin medir
+GANANCIA_MINIMA = 1e-10
+
+class FallaReferencia(Exception):
+    """Un punto quedó fuera del límite duro de la referencia activa"""
+
+def ganancia_db(medicion, columna="ganancia_real"):
+    return 20 * math.log10(max(medicion.get(columna) or 0.0, GANANCIA_MINIMA))
+
+def cargar_referencias():
+    """
+    Carga las referencias guardadas (instantánea inmutable)
+
+    Returns:
+        dict: {"referencias": [...], "referencia_activa": nombre o None}
+    """
+    ensure_data_dir()
+    if os.path.exists(ARCHIVO_REFERENCIAS):
+        try:
+            return _cargar_json_cacheado(ARCHIVO_REFERENCIAS)
+        except Exception as e:
+            print(f"Error al cargar referencias: {e}")
+    return congelar({"referencias": [], "referencia_activa": None})
+
+def guardar_referencias(datos):
+    ensure_data_dir()
+    try:
+        escribir_json_atomico(ARCHIVO_REFERENCIAS, descongelar(datos))
+        return True
+    except Exception as e:
+        print(f"Error al guardar referencias: {e}")
+        return False
+    finally:
+        invalidar_cache(ARCHIVO_REFERENCIAS)
+
+def referencia_activa():
+    """
+    Returns:
+        Referencia activa (instantánea) o None si no hay ninguna
+    """
+    datos = cargar_referencias()
+    for referencia in datos["referencias"]:
+        if referencia["nombre"] == datos.get("referencia_activa"):
+            return referencia
+    return None
+
+def crear_referencia(nombre, mediciones, tolerancia_db=1.0, limite_duro_db=None,
+                     abortar=False, corrida=None):
+    """
+    Crea una referencia a partir de las mediciones de una corrida buena
+
+    Args:
+        nombre: Nombre de la referencia
+        mediciones: Mediciones de la corrida (frecuencia, ganancia_real)
+        tolerancia_db: Tolerancia ± en dB; un número o una lista por frecuencia
+            (cada elemento un número o [inferior, superior])
+        limite_duro_db: Desviación (±dB) a partir de la cual el punto es una
+            falla dura; None para no comprobarlo durante el barrido
+        abortar: Detener el barrido en la primera falla dura
+        corrida: Identificador de la corrida de origen
+
+    Returns:
+        dict: Referencia o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    import numpy as np
+    from modules.analisis import preparar_curvas
+
+    if not nombre:
+        return None, "La referencia necesita un nombre"
+    F, G = preparar_curvas([([m["frecuencia"] for m in mediciones],
+                             [ganancia_db(m) for m in mediciones])])
+    validos = ~np.isnan(F[0])
+    frecuencias, ganancias = F[0][validos], G[0][validos]
+    if len(frecuencias) < 2:
+        return None, "La referencia necesita al menos dos frecuencias"
+
+    if isinstance(tolerancia_db, (int, float)):
+        tolerancia_db = [tolerancia_db] * len(frecuencias)
+    if len(tolerancia_db) != len(frecuencias):
+        return None, f"Se esperaban {len(frecuencias)} tolerancias y hay {len(tolerancia_db)}"
+    bandas = [t if isinstance(t, (list, tuple)) else (t, t) for t in tolerancia_db]
+    if any(inferior < 0 or superior < 0 for inferior, superior in bandas):
+        return None, "Las tolerancias deben ser positivas"
+
+    return {
+        "nombre": nombre,
+        "creada": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "corrida": corrida,
+        "frecuencias": frecuencias.tolist(),
+        "ganancia_db": ganancias.tolist(),
+        "tolerancia_inferior_db": [float(inferior) for inferior, _ in bandas],
+        "tolerancia_superior_db": [float(superior) for _, superior in bandas],
+        "limite_duro_db": limite_duro_db,
+        "abortar": bool(abortar and limite_duro_db is not None),
+    }, None
+
+def guardar_referencia(referencia, activar=True):
+    """
+    Añade (o reemplaza por nombre) una referencia y opcionalmente la activa
+
+    Returns:
+        bool: True si se guardó correctamente
+    """
+    datos = descongelar(cargar_referencias())
+    datos["referencias"] = [r for r in datos["referencias"] if r["nombre"] != referencia["nombre"]]
+    datos["referencias"].append(descongelar(referencia))
+    if activar:
+        datos["referencia_activa"] = referencia["nombre"]
+    return guardar_referencias(datos)
+
+def activar_referencia(nombre):
+    datos = descongelar(cargar_referencias())
+    datos["referencia_activa"] = nombre
+    return guardar_referencias(datos)
+
+def _interpolar_en_rejilla(F, G, rejilla):
+    """
+    Interpola cada fila de (F, G) en log-frecuencia sobre la rejilla común
+
+    Todas las filas se resuelven con una sola búsqueda: cada fila se desplaza
+    a un tramo propio del eje (fila * ancho) y se concatena. Fuera del rango
+    medido de cada fila el resultado es NaN (no se extrapola).
+
+    Returns:
+        numpy.ndarray: Matriz (corridas, puntos de la rejilla)
+    """
+    import numpy as np
+
+    filas, columnas = F.shape
+    X = np.log10(F)
+    xr = np.log10(np.asarray(rejilla, dtype=float))
+    minimo = min(np.nanmin(X), xr.min())
+    ancho = max(np.nanmax(X), xr.max()) - minimo + 2.0
+    desplazamiento = (np.arange(filas) * ancho)[:, None]
+
+    # El relleno NaN va al final del tramo de su fila, por encima de la rejilla
+    plano = (np.where(np.isnan(X), ancho - 1.0, X - minimo) + desplazamiento).ravel()
+    consultas = xr[None, :] - minimo + desplazamiento
+    n = (~np.isnan(X)).sum(axis=1)[:, None]
+    indice = np.searchsorted(plano, consultas, side="right") - np.arange(filas)[:, None] * columnas
+    indice = np.clip(indice, 1, np.maximum(n - 1, 1))
+
+    filas_idx = np.arange(filas)[:, None]
+    x0, x1 = X[filas_idx, indice - 1], X[filas_idx, indice]
+    g0, g1 = G[filas_idx, indice - 1], G[filas_idx, indice]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(x1 != x0, (xr[None, :] - x0) / (x1 - x0), 0.0)
+        valores = g0 + t * (g1 - g0)
+
+    # Sin extrapolación: solo dentro del rango medido de cada fila
+    cubierto = (xr[None, :] >= X[:, :1] - 1e-12) & (xr[None, :] <= X[filas_idx[:, 0], n[:, 0] - 1][:, None] + 1e-12)
+    return np.where(cubierto & (n >= 2), valores, np.nan)
+
+def evaluar_lote(referencia, curvas):
+    """
+    Evalúa varias corridas contra una referencia en un solo cálculo
+
+    Args:
+        referencia: Referencia (crear_referencia)
+        curvas: Lista de (frecuencias, ganancias_db)
+
+    Returns:
+        list: Un veredicto por curva (ver evaluar_mediciones)
+    """
+    import numpy as np
+    from modules.analisis import preparar_curvas
+
+    if not curvas:
+        return []
+    rejilla = np.asarray(referencia["frecuencias"], dtype=float)
+    dorada = np.asarray(referencia["ganancia_db"], dtype=float)
+    inferior = np.asarray(referencia["tolerancia_inferior_db"], dtype=float)
+    superior = np.asarray(referencia["tolerancia_superior_db"], dtype=float)
+
+    F, G = preparar_curvas(curvas)
+    if F.shape[1] < 2:
+        # Con menos de dos puntos por corrida no hay tramo que interpolar
+        M = np.full((len(curvas), len(rejilla)), np.nan)
+    else:
+        M = _interpolar_en_rejilla(F, G, rejilla)
+    desviacion = M - dorada[None, :]
+    # Margen con signo: negativo = fuera de la banda
+    margen = np.minimum(superior[None, :] - desviacion, desviacion + inferior[None, :])
+
+    medidos = ~np.isnan(margen)
+    cubiertos = medidos.sum(axis=1)
+    fuera = (margen < 0).sum(axis=1)
+    peor = np.where(medidos, margen, np.inf).argmin(axis=1)
+    filas = np.arange(len(curvas))
+
+    limite = referencia.get("limite_duro_db")
+    if limite is not None:
+        duras = (np.abs(np.nan_to_num(desviacion)) > limite).any(axis=1)
+    else:
+        duras = np.zeros(len(curvas), dtype=bool)
+
+    veredictos = []
+    for i in filas:
+        hay = cubiertos[i] > 0
+        if fuera[i]:
+            veredicto = FALLA
+        elif cubiertos[i] < len(rejilla):
+            veredicto = INCOMPLETA
+        else:
+            veredicto = PASA
+        veredictos.append({
+            "referencia": referencia["nombre"],
+            "veredicto": veredicto,
+            "margen_db": float(margen[i, peor[i]]) if hay else None,
+            "frecuencia_peor": float(rejilla[peor[i]]) if hay else None,
+            "desviacion_peor_db": float(desviacion[i, peor[i]]) if hay else None,
+            "puntos_fuera": int(fuera[i]),
+            "puntos_cubiertos": int(cubiertos[i]),
+            "puntos_referencia": len(rejilla),
+            "falla_dura": bool(duras[i]),
+        })
+    return veredictos
+
+def evaluar_mediciones(referencia, mediciones):
+    """
+    Veredicto de una corrida contra la referencia
+
+    Returns:
+        dict: referencia, veredicto (PASA, FALLA o INCOMPLETA), margen_db
+            (el peor; negativo si está fuera de la banda), frecuencia_peor,
+            desviacion_peor_db, puntos_fuera, puntos_cubiertos,
+            puntos_referencia y falla_dura
+    """
+    return evaluar_lote(referencia, [([m["frecuencia"] for m in mediciones],
+                                      [ganancia_db(m) for m in mediciones])])[0]
+
+def desviacion_punto(referencia, frecuencia, ganancia):
+    """
+    Desviación (dB) de un punto respecto a la referencia, interpolada en
+    log-frecuencia; None si la frecuencia está fuera de la referencia
+    """
+    import numpy as np
+
+    frecuencias = referencia["frecuencias"]
+    if not frecuencias[0] <= frecuencia <= frecuencias[-1]:
+        return None
+    dorada = np.interp(math.log10(frecuencia), np.log10(frecuencias), referencia["ganancia_db"])
+    return ganancia - float(dorada)
+
+def comprobar_punto(referencia, medicion):
+    """
+    Lanza FallaReferencia si la medición supera el límite duro de la
+    referencia y la referencia pide abortar
+    """
+    limite = referencia.get("limite_duro_db")
+    if limite is None or not referencia.get("abortar"):
+        return
+    desviacion = desviacion_punto(referencia, medicion["frecuencia"], ganancia_db(medicion))
+    if desviacion is not None and abs(desviacion) > limite:
+        raise FallaReferencia(
+            f"Falla dura en {medicion['frecuencia']:.6g} Hz: desviación {desviacion:+.2f} dB "
+            f"(límite ±{limite:g} dB de '{referencia['nombre']}')"
+        )
@@ -0,0 +1,102 @@
+# Archivo modules/registro.py - Log de progreso con lectura desde el final y rotación
+
+import gzip
+import os
+import shutil
+import threading
+
+class RegistroProgreso:
+    """
+    Archivo de log de texto con rotación por tamaño.
+
+    - Las últimas líneas se leen buscando hacia atrás desde el final del archivo,
+      sin recorrerlo entero (la interfaz lee el log en memoria de EstadoEjecucion;
+      el archivo solo se lee para recuperar el último estado tras un reinicio).
+    - Al superar max_bytes, el archivo se archiva comprimido como <archivo>.1.gz,
+      desplazando los anteriores hasta max_archivos.
+
+    Args:
+        archivo: Ruta del archivo de log
+        max_bytes: Tamaño a partir del cual se rota el archivo
+        max_archivos: Número de archivos comprimidos que se conservan
+    """
+
+    def __init__(self, archivo, max_bytes=1024 * 1024, max_archivos=5):
+        self.archivo = archivo
+        self.max_bytes = max_bytes
+        self.max_archivos = max_archivos
+        self._lock = threading.Lock()
+
+    def agregar(self, linea):
+        """Agrega una línea al log, rotándolo si supera el tamaño máximo"""
+        with self._lock:
+            with open(self.archivo, "a", encoding="utf-8") as f:
+                f.write(linea if linea.endswith("\n") else linea + "\n")
+                tamano = f.tell()
+            if tamano >= self.max_bytes:
+                self._rotar()
+
+    def archivar(self):
+        """Archiva el log actual (si tiene contenido) y deja uno vacío"""
+        with self._lock:
+            if os.path.exists(self.archivo) and os.path.getsize(self.archivo) > 0:
+                self._rotar()
+            else:
+                open(self.archivo, "w").close()
+
+    def archivos(self):
+        """Lista de archivos comprimidos existentes, del más reciente al más antiguo"""
+        return [
+            ruta for ruta in (f"{self.archivo}.{i}.gz" for i in range(1, self.max_archivos + 1))
+            if os.path.exists(ruta)
+        ]
+
+    def leer_archivo_comprimido(self, ruta):
+        """Devuelve las líneas de un log archivado"""
+        with gzip.open(ruta, "rt", encoding="utf-8", errors="replace") as f:
+            return f.readlines()
+
+    def _rotar(self):
+        # Desplazar los archivos comprimidos: .N-1.gz -> .N.gz
+        for i in range(self.max_archivos - 1, 0, -1):
+            origen = f"{self.archivo}.{i}.gz"
+            if os.path.exists(origen):
+                os.replace(origen, f"{self.archivo}.{i + 1}.gz")
+
+        # Renombrar primero para liberar el nombre y comprimir después
+        temporal = f"{self.archivo}.rotando"
+        os.replace(self.archivo, temporal)
+        open(self.archivo, "w").close()
+
+        if self.max_archivos > 0:
+            with open(temporal, "rb") as entrada, gzip.open(f"{self.archivo}.1.gz", "wb") as salida:
+                shutil.copyfileobj(entrada, salida)
+        os.remove(temporal)
+
+    def ultimas_lineas(self, max_lineas=100, tam_bloque=8192):
+        """
+        Lee las últimas líneas buscando hacia atrás desde el final del archivo
+
+        Returns:
+            list: Líneas (con salto de línea)
+        """
+        try:
+            with open(self.archivo, "rb") as f:
+                posicion = os.fstat(f.fileno()).st_size
+                datos = b""
+
+                # Leer bloques desde el final hasta reunir suficientes saltos de línea
+                while posicion > 0 and datos.count(b"\n") <= max_lineas:
+                    lectura = min(tam_bloque, posicion)
+                    posicion -= lectura
+                    f.seek(posicion)
+                    datos = f.read(lectura) + datos
+        except FileNotFoundError:
+            return []
+
+        # Descartar una línea incompleta al final (aún se está escribiendo)
+        ultimo_salto = datos.rfind(b"\n")
+        completas = datos[:ultimo_salto + 1] if ultimo_salto >= 0 else b""
+
+        lineas = completas.decode("utf-8", errors="replace").splitlines(keepends=True)
+        return lineas[-max_lineas:]
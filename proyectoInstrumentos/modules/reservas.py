@@ -0,0 +1,171 @@
+# Archivo modules/reservas.py - Reserva de equipos entre procesos
+#
+# Los equipos aceptan una sola conexión. Dentro de la interfaz, el monitor y
+# el control manual saben cuándo hay un barrido (MonitorEquipos.reservar(),
+# estado del servicio), pero un barrido lanzado con `python -m
+# modules.barrido` corre en otro proceso. Mientras dura, ejecutar_programa
+# deja un archivo por equipo en data/reservas/ (ip_puerto.json, con el PID
+# y el motivo) y el monitor, el control manual, la prueba de conexiones y
+# la búsqueda de equipos no tocan las direcciones reservadas.
+#
+# Una reserva cuyo proceso ya no existe (se cerró sin liberarla) se descarta
+# al encontrarla.
+
+import json
+import os
+import socket
+import time
+from datetime import datetime
+
+from modules.config import DATA_DIR
+
+DIRECTORIO_RESERVAS = os.path.join(DATA_DIR, "reservas")
+
+# Segundos durante los que un archivo de reserva recién creado puede estar vacío
+_GRACIA = 5.0
+
+def _archivo(ip, puerto):
+    return os.path.join(DIRECTORIO_RESERVAS, f"{ip}_{int(puerto)}.json".replace(":", "_"))
+
+def _proceso_vivo(pid):
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    if os.name == "nt":
+        # os.kill(pid, 0) en Windows envía CTRL_C_EVENT: se consulta el proceso
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        manejador = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not manejador:
+            return False
+        codigo = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(manejador, ctypes.byref(codigo))
+        kernel32.CloseHandle(manejador)
+        return codigo.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, pero es de otro usuario
+    return True
+
+def _descartar(archivo, estado):
+    # Solo si sigue siendo el archivo leído: otro proceso puede haberlo
+    # descartado ya y creado una reserva nueva con el mismo nombre
+    try:
+        actual = os.stat(archivo)
+        if (actual.st_ino, actual.st_mtime_ns) == (estado.st_ino, estado.st_mtime_ns):
+            os.remove(archivo)
+    except OSError:
+        pass
+
+def _leer(archivo):
+    """Reserva vigente guardada en `archivo`, o None si no hay o su proceso terminó"""
+    try:
+        estado = os.stat(archivo)
+    except OSError:
+        return None
+    try:
+        with open(archivo, "r", encoding="utf-8") as f:
+            reserva = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        # Recién creado y aún sin contenido: vigente durante la gracia
+        if time.time() - estado.st_mtime < _GRACIA:
+            return {"pid": None, "host": None, "rol": None, "motivo": "Barrido", "desde": None}
+        _descartar(archivo, estado)
+        return None
+    if reserva.get("host") == socket.gethostname() and not _proceso_vivo(reserva.get("pid")):
+        _descartar(archivo, estado)
+        return None
+    return reserva
+
+def reserva_equipo(ip, puerto):
+    """
+    Reserva vigente de un equipo (de este u otro proceso)
+
+    Returns:
+        dict: pid, host, rol, motivo y desde; o None si el equipo está libre
+    """
+    return _leer(_archivo(ip, puerto))
+
+def reservas_vigentes():
+    """
+    Returns:
+        dict: {(ip, puerto): reserva} de todos los equipos reservados
+    """
+    try:
+        nombres = os.listdir(DIRECTORIO_RESERVAS)
+    except FileNotFoundError:
+        return {}
+    vigentes = {}
+    for nombre in nombres:
+        if not nombre.endswith(".json"):
+            continue
+        reserva = _leer(os.path.join(DIRECTORIO_RESERVAS, nombre))
+        if reserva is not None and reserva.get("ip") is not None:
+            vigentes[(reserva["ip"], int(reserva["puerto"]))] = reserva
+    return vigentes
+
+def describir_reserva(reserva):
+    """Texto para informar de que un equipo está reservado"""
+    if reserva.get("pid") is None:
+        return f"En uso por otro proceso ({reserva['motivo']})"
+    return f"En uso por otro proceso ({reserva['motivo']}, PID {reserva['pid']}, desde las {reserva['desde'][-8:]})"
+
+class ReservaEquipos:
+    """
+    Reserva entre procesos de los equipos de un barrido.
+
+    Args:
+        equipos: Lista de (rol, ip, puerto)
+        motivo: Texto que verá quien encuentre los equipos reservados
+    """
+
+    def __init__(self, equipos, motivo="Barrido"):
+        self.equipos = list(equipos)
+        self.motivo = motivo
+        self._archivos = []
+
+    def tomar(self):
+        """
+        Reserva todos los equipos o ninguno
+
+        Returns:
+            bool: True si quedaron reservados
+            str: Mensaje de error o None en caso de éxito
+        """
+        os.makedirs(DIRECTORIO_RESERVAS, exist_ok=True)
+        for rol, ip, puerto in self.equipos:
+            error = self._crear(rol, ip, puerto)
+            if error:
+                self.liberar()
+                return False, f"No se puede usar el {rol} ({ip}:{puerto}): {error}"
+        return True, None
+
+    def _crear(self, rol, ip, puerto):
+        archivo = _archivo(ip, puerto)
+        for _ in range(2):
+            try:
+                descriptor = os.open(archivo, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                reserva = _leer(archivo)
+                if reserva is not None:
+                    return describir_reserva(reserva)
+                continue  # Reserva abandonada, ya descartada: se vuelve a intentar
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump({"pid": os.getpid(), "host": socket.gethostname(), "rol": rol, "ip": ip,
+                           "puerto": int(puerto), "motivo": self.motivo,
+                           "desde": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f)
+            self._archivos.append(archivo)
+            return None
+        return "no se pudo crear la reserva"
+
+    def liberar(self):
+        for archivo in self._archivos:
+            try:
+                os.remove(archivo)
+            except OSError:
+                pass
+        self._archivos = []
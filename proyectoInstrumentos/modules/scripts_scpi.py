@@ -0,0 +1,204 @@
+# Archivo modules/scripts_scpi.py - Ejecución de scripts SCPI con informe de tiempos
+#
+# Formato del script (una instrucción por línea):
+#
+#   # comentario                  (también al final de una línea)
+#   :CHANnel1:COUPling AC         comando (sin respuesta)
+#   :MEASure:PK2PK?               query (termina en '?', se guarda la respuesta)
+#   WAIT 200                      pausa en milisegundos
+#   LOOP 5                        repite el bloque hasta END (se puede anidar)
+#   END
+
+import csv
+import io
+import math
+import time
+
+# Límite de pasos tras expandir los bucles (protege de LOOP 1000000)
+MAX_PASOS = 10000
+
+# Comandos agrupados como máximo en una escritura canalizada
+MAX_LOTE = 10
+
+def _quitar_comentario(linea):
+    # '#' inicia un comentario al principio de la línea o tras un espacio
+    # (en SCPI, '#' pegado a un valor puede ser parte de un bloque o un número)
+    if linea.lstrip().startswith("#"):
+        return ""
+    posicion = linea.find(" #")
+    return linea[:posicion] if posicion >= 0 else linea
+
+def parsear_script(texto):
+    """
+    Convierte el texto de un script en una lista de pasos (bucles expandidos)
+
+    Returns:
+        list: Pasos (dict con linea, tipo y texto o ms) o None en caso de error
+        str: Mensaje de error o None en caso de éxito
+    """
+    # Pila de bloques abiertos: (pasos del bloque, repeticiones, línea del LOOP)
+    pila = [([], 1, 0)]
+
+    for numero, linea in enumerate(texto.splitlines(), 1):
+        linea = _quitar_comentario(linea).strip()
+        if not linea:
+            continue
+
+        partes = linea.split()
+        directiva = partes[0].upper()
+        pasos = pila[-1][0]
+
+        if directiva == "WAIT":
+            try:
+                ms = float(partes[1])
+            except (IndexError, ValueError):
+                return None, f"Línea {numero}: WAIT necesita un tiempo en milisegundos"
+            if not math.isfinite(ms) or ms < 0:
+                return None, f"Línea {numero}: el tiempo de WAIT debe ser un número positivo de milisegundos"
+            pasos.append({"linea": numero, "tipo": "espera", "texto": linea, "ms": ms})
+        elif directiva == "LOOP":
+            try:
+                repeticiones = int(partes[1])
+            except (IndexError, ValueError):
+                return None, f"Línea {numero}: LOOP necesita un número de repeticiones"
+            if repeticiones < 0:
+                return None, f"Línea {numero}: LOOP necesita un número de repeticiones positivo"
+            pila.append(([], repeticiones, numero))
+        elif directiva == "END":
+            if len(pila) == 1:
+                return None, f"Línea {numero}: END sin LOOP"
+            cuerpo, repeticiones, _ = pila.pop()
+            # Comprobar el límite antes de expandir (LOOP 1000000000 agotaría la memoria)
+            if sum(len(bloque[0]) for bloque in pila) + len(cuerpo) * repeticiones > MAX_PASOS:
+                return None, f"El script supera {MAX_PASOS} pasos tras expandir los bucles"
+            pila[-1][0].extend(cuerpo * repeticiones)
+        else:
+            tipo = "query" if linea.endswith("?") else "comando"
+            pasos.append({"linea": numero, "tipo": tipo, "texto": linea})
+
+        if sum(len(bloque[0]) for bloque in pila) > MAX_PASOS:
+            return None, f"El script supera {MAX_PASOS} pasos tras expandir los bucles"
+
+    if len(pila) > 1:
+        return None, f"Línea {pila[-1][2]}: LOOP sin END"
+
+    return pila[0][0], None
+
+def _canalizable(paso):
+    # Unir con ';' solo es seguro si cada comando tiene la ruta completa
+    # (':' o '*' al principio); uno relativo cambiaría de significado
+    return paso["tipo"] == "comando" and paso["texto"][0] in ":*"
+
+def agrupar_pasos(pasos, canalizar=True, max_lote=MAX_LOTE):
+    """
+    Agrupa comandos consecutivos que se pueden enviar en una sola escritura
+
+    Returns:
+        list: Lotes (listas de pasos); las queries y esperas van siempre solas
+    """
+    lotes = []
+    for paso in pasos:
+        if (canalizar and _canalizable(paso) and lotes and len(lotes[-1]) < max_lote
+                and all(_canalizable(p) for p in lotes[-1])):
+            lotes[-1].append(paso)
+        else:
+            lotes.append([paso])
+    return lotes
+
+def ejecutar_script(equipo, pasos, canalizar=True, token=None, detener_en_error=False):
+    """
+    Ejecuta los pasos de un script sobre un equipo ya conectado
+
+    Args:
+        equipo: Osciloscopio o GeneradorFunciones conectado
+        pasos: Resultado de parsear_script
+        canalizar: Enviar comandos consecutivos en una sola escritura (';')
+        token: TokenCancelacion opcional (interrumpe las esperas)
+        detener_en_error: Parar en el primer error
+
+    Returns:
+        list: Una fila por paso (linea, instruccion, tipo, respuesta, error, rtt_ms, lote)
+        str: Mensaje de error o None en caso de éxito
+    """
+    filas = []
+    errores = 0
+
+    for numero_lote, lote in enumerate(agrupar_pasos(pasos, canalizar), 1):
+        if token is not None and token.cancelado:
+            return filas, "Script detenido por el usuario"
+
+        primero = lote[0]
+        respuesta = None
+        inicio = time.perf_counter()
+
+        if primero["tipo"] == "espera":
+            if token is not None:
+                token.esperar(primero["ms"] / 1000.0)
+            else:
+                time.sleep(primero["ms"] / 1000.0)
+            error = None
+        elif primero["tipo"] == "query":
+            respuesta, error = equipo.enviar_query(primero["texto"])
+        else:
+            _, error = equipo.enviar_comando(";".join(p["texto"] for p in lote))
+
+        rtt_ms = (time.perf_counter() - inicio) * 1000
+        for paso in lote:
+            filas.append({
+                "linea": paso["linea"],
+                "instruccion": paso["texto"],
+                "tipo": paso["tipo"],
+                "respuesta": respuesta,
+                "error": error,
+                # En un lote canalizado el tiempo es el de la escritura conjunta
+                "rtt_ms": round(rtt_ms, 3),
+                "lote": numero_lote,
+            })
+
+        if error:
+            errores += len(lote)
+            if detener_en_error:
+                return filas, f"Línea {primero['linea']}: {error}"
+
+    return filas, (f"{errores} pasos con error" if errores else None)
+
+def resumen_tiempos(filas):
+    """
+    Tiempo total y por instrucción distinta (para perfilar secuencias)
+
+    Returns:
+        dict: total_ms, lotes y por_instruccion (veces, media_ms, max_ms)
+    """
+    lotes = {}
+    por_instruccion = {}
+    for fila in filas:
+        if fila["tipo"] == "espera":
+            continue
+        lotes[fila["lote"]] = fila["rtt_ms"]
+        estadistica = por_instruccion.setdefault(fila["instruccion"], {"veces": 0, "total_ms": 0.0, "max_ms": 0.0})
+        estadistica["veces"] += 1
+        estadistica["total_ms"] += fila["rtt_ms"]
+        estadistica["max_ms"] = max(estadistica["max_ms"], fila["rtt_ms"])
+
+    return {
+        "total_ms": round(sum(lotes.values()), 3),
+        "lotes": len(lotes),
+        "por_instruccion": {
+            instruccion: {
+                "veces": e["veces"],
+                "media_ms": round(e["total_ms"] / e["veces"], 3),
+                "max_ms": round(e["max_ms"], 3),
+            }
+            for instruccion, e in por_instruccion.items()
+        },
+    }
+
+def filas_a_csv(filas):
+    """Exporta el resultado de un script a CSV (texto)"""
+    salida = io.StringIO()
+    escritor = csv.DictWriter(
+        salida, fieldnames=["linea", "instruccion", "tipo", "respuesta", "error", "rtt_ms", "lote"]
+    )
+    escritor.writeheader()
+    escritor.writerows(filas)
+    return salida.getvalue()
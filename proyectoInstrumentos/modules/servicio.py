@@ -0,0 +1,447 @@
+# Archivo modules/servicio.py - Servicio de barridos fuera del proceso de Streamlit
+#
+# Uso (desde proyectoInstrumentos/):
+#
+#   python -m modules.servicio --puerto 8765
+#
+# El servicio es dueño de las sesiones con los instrumentos y de la cola de
+# trabajos, y expone una API de control HTTP en localhost:
+#
+#   GET  /estado                        Estado actual (incluye las últimas líneas de log)
+#   POST /barridos                      Encola un barrido (cuerpo JSON con los parámetros)
+#   POST /detener                       Detiene el barrido en curso y vacía la cola
+#   POST /log                           Agrega una línea al log ({"mensaje": "..."})
+#   POST /log/limpiar                   Limpia el log (el anterior queda archivado)
+#   GET  /mediciones?corrida=C&desde=N  Resultados de la corrida actual a partir del N-ésimo
+#   GET  /eventos?desde=N&espera=S      Eventos posteriores a N (espera larga hasta S segundos)
+#   GET  /eventos?desde=N&seguir=1      Eventos en streaming, un JSON por línea
+#   GET  /salud                         Salud y latencia de los equipos (modules.monitor)
+#   POST /salud/sondear                 Adelanta la siguiente ronda del monitor
+
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from modules.estado import EstadoEjecucion, EspejoArchivos
+from modules.registro import RegistroProgreso
+
+PUERTO_POR_DEFECTO = 8765
+
+# Parámetros aceptados para un barrido (los de ejecutar_secuencia_completa)
+PARAMETROS_BARRIDO = (
+    "gen_ip", "gen_puerto", "osc_ip", "osc_puerto", "amplitud", "offset",
+    "forma_onda", "tiempo_estabilizacion", "tiempo_entre_mediciones", "frecuencias", "plan",
+    "establecimiento", "perfil", "calibrar", "corregir", "capturar_pantalla"
+)
+
+def crear_estado_con_espejo(directorio="data"):
+    """EstadoEjecucion con copia en disco del log y del progreso"""
+    os.makedirs(directorio, exist_ok=True)
+    registro = RegistroProgreso(os.path.join(directorio, "progress_log.txt"))
+    return EstadoEjecucion(espejo=EspejoArchivos(registro, os.path.join(directorio, "progress_status.json")))
+
+class ServicioBarrido:
+    """
+    Cola de barridos con un hilo trabajador propio.
+
+    Se usa igual dentro de Streamlit (modo local) que detrás del servidor HTTP
+    (modo servicio); ClienteServicio expone los mismos métodos por red.
+
+    Args:
+        estado: EstadoEjecucion donde se publican log, progreso y detención
+        monitor: MonitorEquipos opcional; con él no se aceptan barridos en un
+            banco degradado y el monitor no consulta los equipos durante el barrido
+    """
+
+    def __init__(self, estado=None, monitor=None):
+        self.estado_ejecucion = estado or EstadoEjecucion()
+        self.monitor = monitor
+        self._cola = queue.Queue()
+        self._ids = itertools.count(1)
+        self._trabajo_actual = None
+        self._hilo = threading.Thread(target=self._procesar, name="servicio-barrido", daemon=True)
+        self._hilo.start()
+
+    @property
+    def remoto(self):
+        return False
+
+    def iniciar_barrido(self, parametros):
+        """
+        Encola un barrido completo
+
+        Args:
+            parametros: Diccionario con los parámetros de ejecutar_secuencia_completa
+
+        Returns:
+            int: Identificador del trabajo o None en caso de error
+            str: Mensaje de error o None en caso de éxito
+        """
+        if not isinstance(parametros, dict):
+            return None, "Los parámetros del barrido deben ser un objeto"
+        desconocidos = set(parametros) - set(PARAMETROS_BARRIDO)
+        if desconocidos:
+            return None, f"Parámetros no reconocidos: {', '.join(sorted(desconocidos))}"
+        if self.monitor is not None:
+            error = self.monitor.comprobar_banco(parametros)
+            if error:
+                self.estado_ejecucion.log(f"Barrido rechazado. {error}")
+                return None, error
+
+        trabajo = {"id": next(self._ids), "parametros": dict(parametros)}
+        self._cola.put(trabajo)
+        self.estado_ejecucion.log(f"Barrido {trabajo['id']} en cola ({self._cola.qsize()} pendientes)")
+        return trabajo["id"], None
+
+    def detener(self):
+        """Detiene el barrido en curso y descarta los pendientes"""
+        descartados = 0
+        while True:
+            try:
+                self._cola.get_nowait()
+                descartados += 1
+            except queue.Empty:
+                break
+
+        self.estado_ejecucion.solicitar_detencion()
+        self.estado_ejecucion.progreso("Deteniendo")
+        mensaje = "Deteniendo proceso... Espere mientras se cierran las conexiones"
+        if descartados:
+            mensaje += f" ({descartados} barridos en cola descartados)"
+        self.estado_ejecucion.log(mensaje)
+        return True, None
+
+    def registrar_log(self, mensaje):
+        self.estado_ejecucion.log(mensaje)
+        return True, None
+
+    def limpiar_log(self):
+        self.estado_ejecucion.limpiar_log()
+        return True, None
+
+    def estado(self, max_lineas_log=100):
+        """
+        Estado actual en formato serializable
+
+        Returns:
+            dict: estado, progreso, total, ejecutando, detener, ultimo_update,
+                version, trabajo_actual, en_cola y log (últimas líneas)
+        """
+        instantanea = self.estado_ejecucion.instantanea()
+        estado = {k: v for k, v in instantanea.items() if k != "log"}
+        estado["log"] = list(instantanea["log"][-max_lineas_log:]) if max_lineas_log else []
+        estado["trabajo_actual"] = self._trabajo_actual
+        estado["en_cola"] = self._cola.qsize()
+        # Un trabajo en cola cuenta como ejecución para bloquear un segundo inicio
+        estado["ejecutando"] = bool(estado["ejecutando"] or self._trabajo_actual or estado["en_cola"])
+        return estado
+
+    def eventos(self, desde=0, espera=0.0):
+        return self.estado_ejecucion.eventos_desde(desde, espera)
+
+    def salud(self):
+        """
+        Salud de los equipos según el monitor
+
+        Returns:
+            dict: pausado_por y equipos (una fila por perfil y equipo), o None sin monitor
+        """
+        if self.monitor is None:
+            return None
+        return {"pausado_por": self.monitor.pausado_por, "equipos": self.monitor.tabla()}
+
+    def sondear_salud(self):
+        if self.monitor is not None:
+            self.monitor.sondear_ahora()
+        return True, None
+
+    def mediciones(self, corrida=None, desde=0):
+        """Resultados de la corrida actual que el cliente aún no tiene: (corrida, lista)"""
+        return self.estado_ejecucion.mediciones_desde(corrida, desde)
+
+    def _callback_resultado(self, resultado):
+        # Las ganancias en dB pueden ser -inf (no es JSON válido); se recalculan al graficar
+        self.estado_ejecucion.medicion({k: v for k, v in resultado.items() if not k.endswith("_db")})
+
+    def _callback_progreso(self, mensaje, progreso=None, total=None):
+        self.estado_ejecucion.log(mensaje)
+        if progreso is not None and total is not None:
+            self.estado_ejecucion.progreso("Ejecutando", progreso, total)
+
+    def _procesar(self):
+        # Importación diferida: el motor (y PyVISA) solo se cargan al ejecutar
+        from modules.automatizacion import ejecutar_secuencia_completa
+
+        while True:
+            trabajo = self._cola.get()
+            estado = self.estado_ejecucion
+
+            # El banco pudo degradarse o caer mientras el trabajo esperaba en la cola
+            if self.monitor is not None:
+                error = self.monitor.comprobar_banco(trabajo["parametros"])
+                if error:
+                    estado.log(f"Barrido {trabajo['id']} rechazado. {error}")
+                    continue
+
+            self._trabajo_actual = trabajo["id"]
+
+            estado.limpiar_log()
+            estado.progreso("Iniciando", 0, 1)
+            token = estado.iniciar()
+            estado.log(f"Iniciando barrido {trabajo['id']}...")
+
+            # El monitor no toca los equipos mientras el barrido los usa
+            reserva = (self.monitor.reservar(f"Barrido {trabajo['id']} en curso")
+                       if self.monitor is not None else contextlib.nullcontext())
+            try:
+                with reserva:
+                    exito, error = ejecutar_secuencia_completa(
+                        **trabajo["parametros"],
+                        progreso_callback=self._callback_progreso,
+                        resultado_callback=self._callback_resultado,
+                        token=token
+                    )
+                if not exito and error:
+                    estado.log(f"Error en la secuencia: {error}")
+                estado.log("Proceso completado")
+            except Exception as e:
+                mensaje_error = f"Error inesperado: {str(e)}"
+                print(mensaje_error)
+                estado.log(mensaje_error)
+            finally:
+                self._trabajo_actual = None
+                estado.finalizar()
+
+class ClienteServicio:
+    """
+    Cliente de la API HTTP del servicio de barridos.
+
+    Ofrece los mismos métodos que ServicioBarrido, de modo que app.py puede
+    usar cualquiera de los dos.
+
+    Args:
+        url: URL base del servicio (por ejemplo http://127.0.0.1:8765)
+        timeout: Tiempo máximo de cada petición en segundos
+    """
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    @property
+    def remoto(self):
+        return True
+
+    def _peticion(self, metodo, ruta, cuerpo=None, timeout=None):
+        datos = json.dumps(cuerpo).encode("utf-8") if cuerpo is not None else None
+        peticion = urllib.request.Request(
+            self.url + ruta, data=datos, method=metodo,
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(peticion, timeout=timeout or self.timeout) as respuesta:
+                return json.loads(respuesta.read().decode("utf-8")), None
+        except urllib.error.HTTPError as e:
+            try:
+                return None, json.loads(e.read().decode("utf-8")).get("error", str(e))
+            except Exception:
+                return None, str(e)
+        except Exception as e:
+            return None, str(e)
+
+    def disponible(self):
+        respuesta, error = self._peticion("GET", "/estado?log=0", timeout=0.5)
+        return error is None
+
+    def iniciar_barrido(self, parametros):
+        respuesta, error = self._peticion("POST", "/barridos", parametros)
+        return (respuesta["id"], None) if respuesta else (None, error)
+
+    def detener(self):
+        respuesta, error = self._peticion("POST", "/detener", {})
+        return respuesta is not None, error
+
+    def registrar_log(self, mensaje):
+        respuesta, error = self._peticion("POST", "/log", {"mensaje": mensaje})
+        return respuesta is not None, error
+
+    def limpiar_log(self):
+        respuesta, error = self._peticion("POST", "/log/limpiar", {})
+        return respuesta is not None, error
+
+    def estado(self, max_lineas_log=100):
+        respuesta, error = self._peticion("GET", f"/estado?log={int(max_lineas_log)}")
+        if respuesta is None:
+            return {
+                "estado": "Sin conexión con el servicio", "progreso": 0, "total": 1,
+                "ejecutando": False, "detener": False, "ultimo_update": 0, "version": 0,
+                "trabajo_actual": None, "en_cola": 0, "log": [f"Error de conexión con el servicio: {error}\n"]
+            }
+        return respuesta
+
+    def eventos(self, desde=0, espera=0.0):
+        respuesta, error = self._peticion(
+            "GET", f"/eventos?desde={int(desde)}&espera={float(espera)}", timeout=self.timeout + espera
+        )
+        return respuesta["eventos"] if respuesta else []
+
+    def mediciones(self, corrida=None, desde=0):
+        consulta = f"desde={int(desde)}" + (f"&corrida={int(corrida)}" if corrida is not None else "")
+        respuesta, error = self._peticion("GET", f"/mediciones?{consulta}")
+        if respuesta is None:
+            return corrida, []
+        return respuesta["corrida"], respuesta["mediciones"]
+
+    def salud(self):
+        respuesta, error = self._peticion("GET", "/salud")
+        return respuesta.get("salud") if respuesta else None
+
+    def sondear_salud(self):
+        respuesta, error = self._peticion("POST", "/salud/sondear", {})
+        return respuesta is not None, error
+
+def _parametro(consulta, nombre, tipo, defecto):
+    """Parámetro numérico de la URL; ValueError con un mensaje si no es válido"""
+    valor = consulta.get(nombre, [None])[0]
+    if valor is None:
+        return defecto
+    try:
+        numero = tipo(valor)
+    except ValueError:
+        raise ValueError(f"Parámetro '{nombre}' no válido: {valor!r}") from None
+    if not math.isfinite(numero):
+        raise ValueError(f"Parámetro '{nombre}' no válido: {valor!r}")
+    return numero
+
+def crear_manejador(servicio):
+    """Crea la clase de manejador HTTP asociada a un ServicioBarrido"""
+
+    class ManejadorServicio(BaseHTTPRequestHandler):
+        def log_message(self, formato, *args):
+            pass  # Sin log por petición: el estado ya tiene su propio log
+
+        def _responder(self, codigo, datos):
+            cuerpo = json.dumps(datos).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def _leer_cuerpo(self):
+            longitud = int(self.headers.get("Content-Length") or 0)
+            if not longitud:
+                return {}
+            cuerpo = json.loads(self.rfile.read(longitud).decode("utf-8"))
+            if not isinstance(cuerpo, dict):
+                raise ValueError("el cuerpo debe ser un objeto JSON")
+            return cuerpo
+
+        def do_GET(self):
+            ruta = urlparse(self.path)
+            consulta = parse_qs(ruta.query)
+            try:
+                log = _parametro(consulta, "log", int, 100)
+                desde = _parametro(consulta, "desde", int, 0)
+                corrida = _parametro(consulta, "corrida", int, None)
+                espera = min(_parametro(consulta, "espera", float, 0.0), 30.0)
+            except ValueError as e:
+                self._responder(400, {"error": str(e)})
+                return
+
+            if ruta.path == "/estado":
+                self._responder(200, servicio.estado(log))
+            elif ruta.path == "/mediciones":
+                corrida, mediciones = servicio.mediciones(corrida, desde)
+                self._responder(200, {"corrida": corrida, "mediciones": mediciones})
+            elif ruta.path == "/eventos":
+                if consulta.get("seguir", ["0"])[0] == "1":
+                    self._seguir_eventos(desde)
+                else:
+                    self._responder(200, {"eventos": servicio.eventos(desde, espera)})
+            elif ruta.path == "/salud":
+                self._responder(200, {"salud": servicio.salud()})
+            else:
+                self._responder(404, {"error": f"Ruta no encontrada: {ruta.path}"})
+
+        def do_POST(self):
+            ruta = urlparse(self.path).path
+            try:
+                cuerpo = self._leer_cuerpo()
+            except ValueError as e:
+                self._responder(400, {"error": f"JSON inválido: {e}"})
+                return
+
+            if ruta == "/barridos":
+                id_trabajo, error = servicio.iniciar_barrido(cuerpo)
+                if error:
+                    self._responder(400, {"error": error})
+                else:
+                    self._responder(202, {"id": id_trabajo})
+            elif ruta == "/detener":
+                servicio.detener()
+                self._responder(200, {"ok": True})
+            elif ruta == "/log":
+                servicio.registrar_log(str(cuerpo.get("mensaje", "")))
+                self._responder(200, {"ok": True})
+            elif ruta == "/log/limpiar":
+                servicio.limpiar_log()
+                self._responder(200, {"ok": True})
+            elif ruta == "/salud/sondear":
+                servicio.sondear_salud()
+                self._responder(200, {"ok": True})
+            else:
+                self._responder(404, {"error": f"Ruta no encontrada: {ruta}"})
+
+        def _seguir_eventos(self, desde):
+            # Streaming de eventos en formato JSON Lines hasta que el cliente cierre
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                while True:
+                    for evento in servicio.eventos(desde, espera=15.0):
+                        self.wfile.write((json.dumps(evento) + "\n").encode("utf-8"))
+                        desde = evento["seq"]
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return ManejadorServicio
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de barridos de frecuencia GW Instek")
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz de escucha (solo local por defecto)")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    parser.add_argument("--datos", default="data", help="Directorio de datos")
+    parser.add_argument("--intervalo-monitor", type=float, default=15.0,
+                        help="Segundos entre consultas de salud a los equipos (0 para no vigilarlos)")
+    args = parser.parse_args()
+
+    monitor = None
+    if args.intervalo_monitor > 0:
+        from modules.monitor import MonitorEquipos
+        monitor = MonitorEquipos(intervalo=args.intervalo_monitor).iniciar()
+    servicio = ServicioBarrido(crear_estado_con_espejo(args.datos), monitor=monitor)
+    servidor = ThreadingHTTPServer((args.host, args.puerto), crear_manejador(servicio))
+    servidor.daemon_threads = True
+    print(f"Servicio de barridos escuchando en http://{args.host}:{args.puerto}")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("Deteniendo servicio...")
+        servicio.detener()
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# Archivo modules/sesiones.py - Conexiones persistentes para el control manual
+
+import threading
+import time
+from datetime import datetime
+
+from modules.reservas import reserva_equipo, reservas_vigentes, describir_reserva
+
+# Fragmentos de mensajes de error que indican una conexión perdida
+_ERRORES_CONEXION = (
+    "timeout", "timed out", "connection", "conexión", "socket", "broken pipe",
+    "closed", "conn_lost", "errno", "invalid session"
+)
+
+def es_error_conexion(error):
+    texto = str(error).lower()
+    return any(fragmento in texto for fragmento in _ERRORES_CONEXION)
+
+class SesionInstrumento:
+    """
+    Conexión persistente con un instrumento, perteneciente a una sesión del navegador.
+
+    Las operaciones se serializan con un lock. Si una consulta falla por una
+    conexión perdida, se reconecta y se reintenta una vez sin que el usuario
+    tenga que hacer nada. Las escrituras no se repiten (*RST, :AUTOSet o un
+    script aplicarían sus efectos dos veces): se informa de la conexión
+    perdida y el comando siguiente se conecta de nuevo.
+
+    Args:
+        equipo: Osciloscopio o GeneradorFunciones (sin conectar)
+        propietario: Identificador de la sesión del navegador dueña de la conexión
+    """
+
+    def __init__(self, equipo, propietario):
+        self.equipo = equipo
+        self.propietario = propietario
+        self.estado = "desconectado"  # desconectado, conectado, reconectando, error, liberada
+        self.motivo_liberacion = None
+        self.ultimo_error = None
+        self.latencia_ms = None
+        self.reconexiones = 0
+        self.desde = datetime.now()
+        self.ultima_actividad = time.monotonic()
+        self._lock = threading.RLock()
+
+    @property
+    def liberada(self):
+        return self.estado == "liberada"
+
+    def retiene_equipo(self):
+        """La sesión tiene el equipo abierto (o lo está usando en este momento)"""
+        if not self._lock.acquire(blocking=False):
+            return True
+        try:
+            return not self.liberada and self.equipo.instrumento is not None
+        finally:
+            self._lock.release()
+
+    def conectar(self):
+        with self._lock:
+            if self.liberada:
+                return False, f"Sesión liberada: {self.motivo_liberacion}"
+            # También con la conexión abierta: un barrido (de este u otro
+            # proceso) puede haber reservado el equipo después de conectar
+            reserva = reserva_equipo(self.equipo.ip, self.equipo.puerto)
+            if reserva is not None:
+                self.equipo.desconectar()
+                self.estado = "error"
+                self.ultimo_error = describir_reserva(reserva)
+                return False, self.ultimo_error
+            if self.equipo.instrumento:
+                return True, None
+
+            conectado, error = self.equipo.conectar()
+            self.estado = "conectado" if conectado else "error"
+            self.ultimo_error = error
+            return conectado, error
+
+    def ejecutar(self, operacion, reintentar=True):
+        """
+        Ejecuta una operación sobre el equipo, conectando si hace falta.
+        Si el equipo está reservado por un barrido, se cierra la conexión y
+        no se ejecuta.
+
+        Args:
+            operacion: Función que recibe el equipo y devuelve (valor, error)
+            reintentar: Reconectar y repetir una vez si se perdió la conexión
+                (solo para operaciones que pueden repetirse, como consultas;
+                las escrituras deben pasar False)
+
+        Returns:
+            valor: Resultado de la operación o None en caso de error
+            str: Mensaje de error o None en caso de éxito
+        """
+        with self._lock:
+            conectado, error = self.conectar()
+            if not conectado:
+                return None, f"Error de conexión: {error}"
+
+            inicio = time.monotonic()
+            valor, error = operacion(self.equipo)
+
+            if error and reintentar and es_error_conexion(error):
+                # Conexión perdida (equipo reiniciado, cable, inactividad): reconectar
+                self.estado = "reconectando"
+                self.reconexiones += 1
+                self.equipo.desconectar()
+                conectado, error_conexion = self.equipo.conectar()
+                if conectado:
+                    inicio = time.monotonic()
+                    valor, error = operacion(self.equipo)
+                else:
+                    error = f"Error de conexión: {error_conexion}"
+            elif error and es_error_conexion(error):
+                # Sin repetir: el comando puede haberse aplicado o no
+                self.equipo.desconectar()
+                error = f"Se perdió la conexión con el equipo y el comando no se repitió: {error}"
+
+            self.latencia_ms = (time.monotonic() - inicio) * 1000
+            self.ultima_actividad = time.monotonic()
+            self.ultimo_error = error
+            self.estado = "error" if error and es_error_conexion(error) else "conectado"
+            return valor, error
+
+    def mantener(self, intervalo):
+        """
+        Keepalive: si la conexión lleva `intervalo` segundos sin uso, la comprueba
+        con *IDN? (y se reconecta si se había perdido). No espera si está ocupada.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self.liberada or not self.equipo.instrumento:
+                return
+            if time.monotonic() - self.ultima_actividad < intervalo:
+                return
+            self.ejecutar(lambda equipo: equipo.identificar())
+        finally:
+            self._lock.release()
+
+    def sondear(self):
+        """
+        Consulta *IDN? por la conexión abierta sin esperar si está ocupada
+        (para el monitor de equipos)
+
+        Returns:
+            tuple: (latencia_ms, error) o None si la sesión está en uso o cerrada
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if self.liberada or not self.equipo.instrumento:
+                return None
+            inicio = time.monotonic()
+            _, error = self.ejecutar(lambda equipo: equipo.identificar())
+            return (time.monotonic() - inicio) * 1000, error
+        finally:
+            self._lock.release()
+
+    def liberar(self, motivo="Liberada por el usuario"):
+        with self._lock:
+            self.equipo.desconectar()
+            self.estado = "liberada"
+            self.motivo_liberacion = motivo
+
+class BancoInstrumentos:
+    """
+    Registro de las conexiones manuales del banco de medida (una por equipo).
+
+    Cada equipo (ip, puerto) tiene como mucho una sesión abierta. Otra sesión
+    del navegador solo puede usarlo tomando el control, lo que libera la
+    conexión anterior. Un hilo de mantenimiento hace el keepalive y libera
+    las sesiones cuyo navegador lleva `inactividad_max` segundos sin actividad
+    y las de los equipos que un barrido (de este u otro proceso) ha reservado.
+
+    Args:
+        intervalo_keepalive: Segundos sin uso tras los que se comprueba la conexión
+        inactividad_max: Segundos sin actividad del navegador tras los que se libera
+    """
+
+    def __init__(self, intervalo_keepalive=15.0, inactividad_max=300.0):
+        self.intervalo_keepalive = intervalo_keepalive
+        self.inactividad_max = inactividad_max
+        self._sesiones = {}
+        self._actividad = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def tocar(self, propietario):
+        """Registra actividad de una sesión del navegador"""
+        self._actividad[propietario] = time.monotonic()
+
+    def obtener(self, clase, ip, puerto, propietario, forzar=False):
+        """
+        Devuelve la sesión del propietario con un equipo, creándola si hace falta.
+        Una sesión que aún no se ha conectado no retiene el equipo: si es de
+        otro propietario, se sustituye.
+
+        Args:
+            clase: Osciloscopio o GeneradorFunciones
+            forzar: Tomar el control aunque otra sesión esté usando el equipo
+
+        Returns:
+            SesionInstrumento: Sesión (sin conectar todavía si es nueva) o None
+            str: Mensaje de error o None en caso de éxito
+        """
+        self.tocar(propietario)
+        with self._lock:
+            actual = self._sesiones.get((ip, puerto))
+            if actual is not None and not actual.liberada:
+                if actual.propietario == propietario:
+                    return actual, None
+                if not forzar and actual.retiene_equipo():
+                    return None, f"El equipo está en uso por otra sesión desde las {actual.desde.strftime('%H:%M:%S')}"
+                actual.liberar("Otra sesión tomó el control del equipo")
+
+            sesion = SesionInstrumento(clase(ip, puerto), propietario)
+            self._sesiones[(ip, puerto)] = sesion
+            self._iniciar_mantenimiento()
+            return sesion, None
+
+    def sesion_liberada(self, ip, puerto, propietario):
+        """Última sesión del propietario con el equipo si fue liberada (para mostrar el motivo)"""
+        sesion = self._sesiones.get((ip, puerto))
+        if sesion is not None and sesion.propietario == propietario and sesion.liberada:
+            return sesion
+        return None
+
+    def sesion_conectada(self, ip, puerto):
+        """Sesión manual con conexión abierta al equipo, o None"""
+        sesion = self._sesiones.get((ip, puerto))
+        if sesion is not None and not sesion.liberada and sesion.equipo.instrumento:
+            return sesion
+        return None
+
+    def liberar_propietario(self, propietario, motivo="Liberada por el usuario"):
+        with self._lock:
+            sesiones = [s for s in self._sesiones.values() if s.propietario == propietario]
+        for sesion in sesiones:
+            sesion.liberar(motivo)
+
+    def liberar_todas(self, motivo):
+        with self._lock:
+            sesiones = list(self._sesiones.values())
+        for sesion in sesiones:
+            if not sesion.liberada:
+                sesion.liberar(motivo)
+
+    def _iniciar_mantenimiento(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._mantener, name="banco-keepalive", daemon=True)
+            self._hilo.start()
+
+    def _mantener(self):
+        while True:
+            time.sleep(1.0)
+            self._revisar()
+
+    def _revisar(self):
+        """Una vuelta del mantenimiento: reservas, inactividad y keepalive"""
+        with self._lock:
+            sesiones = [s for s in self._sesiones.values() if not s.liberada]
+
+        ahora = time.monotonic()
+        reservas = reservas_vigentes() if sesiones else {}
+        for sesion in sesiones:
+            reserva = reservas.get((sesion.equipo.ip, int(sesion.equipo.puerto)))
+            if reserva is not None:
+                sesion.liberar(f"Equipo reservado por un barrido: {describir_reserva(reserva)}")
+            elif ahora - self._actividad.get(sesion.propietario, 0) > self.inactividad_max:
+                sesion.liberar("Sesión del navegador inactiva")
+            else:
+                try:
+                    sesion.mantener(self.intervalo_keepalive)
+                except Exception as e:
+                    print(f"Error en keepalive: {e}")
@@ -0,0 +1,215 @@
+# Archivo modules/spc.py - Control estadístico del proceso (SPC) incremental
+#
+# Cada corrida registrada actualiza, por frecuencia, unos agregados de tamaño
+# fijo: conteo, media y varianza (Welford), mínimo, máximo, cuantiles
+# aproximados (algoritmo P²) y una ventana con los últimos valores para las
+# cartas de control. Los agregados se guardan en data/spc.json, así que los
+# límites y las gráficas se obtienen en O(frecuencias) sin releer el historial.
+
+import math
+import os
+import threading
+from datetime import datetime
+
+from modules.config import (
+    DATA_DIR, ensure_data_dir, escribir_json_atomico, invalidar_cache,
+    _cargar_json_cacheado, bloqueo_archivo, congelar, descongelar
+)
+
+ARCHIVO_SPC = os.path.join(DATA_DIR, "spc.json")
+
+# Cuantiles que se siguen por frecuencia
+CUANTILES = (0.05, 0.5, 0.95)
+
+# Últimos valores por frecuencia para la carta de control
+VENTANA = 100
+
+# Hilos de este proceso; entre procesos (la interfaz y el barrido por
+# línea de comandos), bloqueo_archivo sobre data/spc.json
+_lock = threading.Lock()
+
+def clave_frecuencia(frecuencia):
+    # Las corridas repiten frecuencias con pequeñas diferencias de redondeo
+    return f"{float(frecuencia):.6g}"
+
+def _vacio():
+    return {"corridas": 0, "ultima_corrida": None, "actualizado": None, "frecuencias": {}}
+
+def cargar_spc():
+    """
+    Carga los agregados SPC (instantánea inmutable)
+
+    Returns:
+        dict: {"corridas", "ultima_corrida", "actualizado", "frecuencias": {clave: agregado}}
+    """
+    ensure_data_dir()
+    if os.path.exists(ARCHIVO_SPC):
+        try:
+            return _cargar_json_cacheado(ARCHIVO_SPC)
+        except Exception as e:
+            print(f"Error al cargar los agregados SPC: {e}")
+    return congelar(_vacio())
+
+def guardar_spc(datos):
+    ensure_data_dir()
+    try:
+        escribir_json_atomico(ARCHIVO_SPC, descongelar(datos))
+        return True
+    except Exception as e:
+        print(f"Error al guardar los agregados SPC: {e}")
+        return False
+    finally:
+        invalidar_cache(ARCHIVO_SPC)
+
+def _p2_nuevo(p):
+    return {"p": p, "q": [], "n": [], "d": []}
+
+def _p2_agregar(estado, x):
+    """
+    Algoritmo P² (Jain y Chlamtac): cinco marcadores por cuantil, que se
+    ajustan con interpolación parabólica a medida que llegan valores
+    """
+    p, q, n, d = estado["p"], estado["q"], estado["n"], estado["d"]
+    if len(q) < 5:
+        q.append(x)
+        q.sort()
+        if len(q) == 5:
+            n[:] = [1, 2, 3, 4, 5]
+            d[:] = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        return
+
+    if x < q[0]:
+        q[0] = x
+        k = 0
+    elif x >= q[4]:
+        q[4] = x
+        k = 3
+    else:
+        k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+    for i in range(k + 1, 5):
+        n[i] += 1
+    for i, incremento in enumerate((0, p / 2, p, (1 + p) / 2, 1)):
+        d[i] += incremento
+
+    for i in (1, 2, 3):
+        desfase = d[i] - n[i]
+        if (desfase >= 1 and n[i + 1] - n[i] > 1) or (desfase <= -1 and n[i - 1] - n[i] < -1):
+            s = 1 if desfase > 0 else -1
+            parabolica = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+            )
+            if q[i - 1] < parabolica < q[i + 1]:
+                q[i] = parabolica
+            else:
+                q[i] += s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+            n[i] += s
+
+def _p2_valor(estado):
+    q = estado["q"]
+    if not q:
+        return None
+    if len(q) < 5:
+        # Pocos valores: cuantil exacto por interpolación
+        posicion = estado["p"] * (len(q) - 1)
+        inferior = int(posicion)
+        superior = min(inferior + 1, len(q) - 1)
+        return q[inferior] + (posicion - inferior) * (q[superior] - q[inferior])
+    return q[2]
+
+def _agregar_valor(agregado, x, etiqueta):
+    # Welford: media y suma de cuadrados de las desviaciones, estables en un paso
+    agregado["n"] += 1
+    delta = x - agregado["media"]
+    agregado["media"] += delta / agregado["n"]
+    agregado["m2"] += delta * (x - agregado["media"])
+    agregado["minimo"] = x if agregado["minimo"] is None else min(agregado["minimo"], x)
+    agregado["maximo"] = x if agregado["maximo"] is None else max(agregado["maximo"], x)
+    for estado in agregado["cuantiles"]:
+        _p2_agregar(estado, x)
+    agregado["recientes"].append([etiqueta, x])
+    del agregado["recientes"][:-VENTANA]
+
+def _agregar_corrida(datos, corrida):
+    from modules.referencia import ganancia_db
+
+    if corrida.get("tipo") == "calibracion":
+        return  # Conexión directa, no el dispositivo
+    for medicion in corrida.get("mediciones", []):
+        if medicion.get("frecuencia") is None or medicion.get("ganancia_real") is None:
+            continue
+        clave = clave_frecuencia(medicion["frecuencia"])
+        agregado = datos["frecuencias"].setdefault(clave, {
+            "frecuencia": float(clave), "n": 0, "media": 0.0, "m2": 0.0,
+            "minimo": None, "maximo": None,
+            "cuantiles": [_p2_nuevo(p) for p in CUANTILES], "recientes": [],
+        })
+        _agregar_valor(agregado, ganancia_db(medicion), corrida.get("inicio"))
+    datos["corridas"] += 1
+    datos["ultima_corrida"] = corrida.get("id")
+    datos["actualizado"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def actualizar_spc(corrida):
+    """
+    Incorpora una corrida (registro de modules.corridas) a los agregados
+
+    Returns:
+        bool: True si se guardó correctamente
+    """
+    ensure_data_dir()
+    with _lock, bloqueo_archivo(ARCHIVO_SPC):
+        datos = descongelar(cargar_spc())
+        if corrida.get("id") is not None and corrida.get("id") == datos.get("ultima_corrida"):
+            return True  # Ya incorporada
+        _agregar_corrida(datos, corrida)
+        return guardar_spc(datos)
+
+def reconstruir_spc():
+    """
+    Recalcula los agregados a partir de todo el historial de corridas
+    (solo hace falta una vez, para un historial anterior a este módulo)
+
+    Returns:
+        bool: True si se guardó correctamente
+    """
+    from modules.corridas import cargar_corridas
+
+    ensure_data_dir()
+    with _lock, bloqueo_archivo(ARCHIVO_SPC):
+        datos = _vacio()
+        for corrida in cargar_corridas():
+            _agregar_corrida(datos, corrida)
+        return guardar_spc(datos)
+
+def limites_control(datos=None, sigmas=3.0):
+    """
+    Límites de control por frecuencia calculados solo con los agregados
+
+    Args:
+        datos: Agregados (cargar_spc por defecto)
+        sigmas: Ancho de los límites en desviaciones estándar
+
+    Returns:
+        list: Por frecuencia (ordenada): frecuencia, n, media, sigma, lcl, ucl,
+            minimo, maximo y p5/p50/p95 (en dB)
+    """
+    if datos is None:
+        datos = cargar_spc()
+    filas = []
+    for agregado in datos["frecuencias"].values():
+        n = agregado["n"]
+        sigma = math.sqrt(agregado["m2"] / (n - 1)) if n > 1 else 0.0
+        fila = {
+            "frecuencia": agregado["frecuencia"],
+            "n": n,
+            "media": agregado["media"],
+            "sigma": sigma,
+            "lcl": agregado["media"] - sigmas * sigma,
+            "ucl": agregado["media"] + sigmas * sigma,
+            "minimo": agregado["minimo"],
+            "maximo": agregado["maximo"],
+        }
+        for estado in agregado["cuantiles"]:
+            fila[f"p{round(estado['p'] * 100)}"] = _p2_valor(estado)
+        filas.append(fila)
+    return sorted(filas, key=lambda fila: fila["frecuencia"])
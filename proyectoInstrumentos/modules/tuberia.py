@@ -0,0 +1,135 @@
+# Archivo modules/tuberia.py - Tubería de etapas con colas acotadas
+#
+# El hilo que mide (adquisición) entrega cada lectura a la primera cola y pasa
+# al siguiente punto; cada etapa posterior (análisis, guardado/notificación)
+# corre en su propio hilo y consume de su cola. Con un solo hilo por etapa y
+# colas FIFO, los elementos salen en el mismo orden en que entraron.
+
+import queue
+import threading
+
+from modules.cancelacion import OperacionCancelada
+
+# Marcador de fin: recorre todas las etapas detrás del último elemento
+_FIN = object()
+
+class Tuberia:
+    """
+    Etapas encadenadas por colas acotadas, cada una en su propio hilo.
+
+    Cada etapa es una función que recibe un elemento y devuelve el elemento
+    para la siguiente etapa (o None para descartarlo). Si una etapa lanza una
+    excepción, la tubería queda en fallo: las etapas descartan lo que les
+    llegue hasta el marcador de fin y la excepción se relanza en el hilo
+    productor en la siguiente llamada a enviar() o verificar().
+
+    Garantías:
+        - Orden: los elementos llegan a cada etapa en el orden de envío.
+        - Cierre: cerrar() procesa todo lo enviado antes (salvo fallo) y
+          espera a que terminen todos los hilos.
+        - Contrapresión: si una cola se llena, enviar() espera (atento a la
+          cancelación del token y a los fallos de las etapas).
+
+    Args:
+        etapas: Lista de (nombre, funcion)
+        capacidad: Tamaño máximo de cada cola
+        token: TokenCancelacion para no quedar bloqueado en una cola llena
+    """
+
+    def __init__(self, etapas, capacidad=8, token=None):
+        self.etapas = list(etapas)
+        self.token = token
+        self._colas = [queue.Queue(maxsize=capacidad) for _ in self.etapas]
+        self._hilos = []
+        self._fallo = threading.Event()
+        self.error = None
+        self.etapa_error = None
+        self.procesados = [0] * len(self.etapas)
+
+    def iniciar(self):
+        if not self._hilos:
+            for indice, (nombre, _) in enumerate(self.etapas):
+                hilo = threading.Thread(target=self._ejecutar, args=(indice,),
+                                        name=f"tuberia-{nombre}", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+        return self
+
+    def verificar(self):
+        """Relanza en el hilo llamador el error de una etapa, si lo hubo"""
+        if self.error is not None:
+            raise self.error
+
+    def enviar(self, elemento):
+        """
+        Entrega un elemento a la primera etapa
+
+        Lanza el error de una etapa o OperacionCancelada si se cancela mientras
+        espera sitio en la cola.
+        """
+        self.verificar()
+        while True:
+            try:
+                self._colas[0].put(elemento, timeout=0.05)
+                return
+            except queue.Full:
+                self.verificar()
+                if self.token is not None:
+                    self.token.verificar()
+
+    def esperar(self):
+        """
+        Espera a que todas las etapas procesen lo enviado hasta ahora y
+        relanza el error de una etapa, si lo hubo (para decidir antes de
+        seguir, p. ej. abortar en la primera falla dura)
+        """
+        for cola in self._colas:
+            cola.join()
+        self.verificar()
+
+    def cerrar(self, timeout=None):
+        """
+        Envía el marcador de fin y espera a que las etapas lo procesen
+
+        Returns:
+            bool: True si todos los hilos terminaron dentro del tiempo indicado
+        """
+        if not self._hilos:
+            return True
+        self._colas[0].put(_FIN)
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        terminado = not any(hilo.is_alive() for hilo in self._hilos)
+        self._hilos = []
+        return terminado
+
+    def _ejecutar(self, indice):
+        nombre, funcion = self.etapas[indice]
+        entrada = self._colas[indice]
+        salida = self._colas[indice + 1] if indice + 1 < len(self._colas) else None
+
+        while True:
+            elemento = entrada.get()
+            try:
+                if elemento is _FIN:
+                    if salida is not None:
+                        salida.put(_FIN)
+                    return
+                if self._fallo.is_set():
+                    continue  # Se descarta hasta el fin
+
+                try:
+                    resultado = funcion(elemento)
+                except (Exception, OperacionCancelada) as e:
+                    self.error = e
+                    self.etapa_error = nombre
+                    self._fallo.set()
+                    continue
+
+                self.procesados[indice] += 1
+                if salida is not None and resultado is not None:
+                    salida.put(resultado)
+            finally:
+                # Después de pasarlo a la siguiente cola: esperar() recorre
+                # las colas en orden
+                entrada.task_done()
@@ -0,0 +1,123 @@
+# Archivo modules/visor.py - Captura continua de formas de onda para el visor en vivo
+
+import threading
+import time
+from modules.decimacion import decimar
+
+class VisorFormaOnda:
+    """
+    Captura continua de la memoria de CH1/CH2 sobre la sesión persistente
+    del control manual (SesionInstrumento), sin abrir una segunda conexión.
+
+    Un hilo propio lee los canales al ritmo pedido, reduce cada captura al
+    ancho del gráfico (decimación en el servidor) y la deja en una única
+    ranura. La interfaz solo toma el cuadro más reciente: si el navegador va
+    lento, los cuadros intermedios se descartan en lugar de acumularse.
+
+    Args:
+        sesion: SesionInstrumento con el osciloscopio
+        canales: Canales a capturar (1 y/o 2)
+        cuadros_por_segundo: Ritmo máximo de captura
+        puntos: Puntos por canal tras la decimación (ancho del gráfico en píxeles)
+        metodo: Método de decimación ("minmax" o "lttb")
+    """
+
+    def __init__(self, sesion, canales=(1, 2), cuadros_por_segundo=2.0, puntos=1000, metodo="minmax"):
+        self.sesion = sesion
+        self.canales = tuple(canales)
+        self.cuadros_por_segundo = cuadros_por_segundo
+        self.puntos = puntos
+        self.metodo = metodo
+
+        self.capturados = 0
+        self.descartados = 0
+        self.error = None
+
+        self._lock = threading.Lock()
+        self._ultimo = None
+        self._entregado = 0
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        """
+        Conecta la sesión (si no lo estaba) y arranca la captura
+
+        Returns:
+            bool: True si se conectó correctamente
+            str: Mensaje de error o None en caso de éxito
+        """
+        if self.activo:
+            return True, None
+
+        conectado, error = self.sesion.conectar()
+        if not conectado:
+            return False, error
+
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._capturar, name="visor-forma-onda", daemon=True)
+        self._hilo.start()
+        return True, None
+
+    def detener(self, timeout=2.0):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def ultimo_cuadro(self):
+        """
+        Devuelve el cuadro más reciente (o None si aún no hay ninguno)
+
+        Los cuadros capturados desde la última llamada y no entregados se
+        cuentan como descartados.
+        """
+        with self._lock:
+            cuadro = self._ultimo
+            if cuadro is not None and cuadro["numero"] > self._entregado:
+                self.descartados += cuadro["numero"] - self._entregado - 1
+                self._entregado = cuadro["numero"]
+        return cuadro
+
+    def _capturar(self):
+        while not self._detener.is_set():
+            if self.sesion.liberada:
+                self.error = f"Sesión liberada: {self.sesion.motivo_liberacion}"
+                break
+
+            inicio = time.monotonic()
+
+            canales = {}
+            puntos_originales = 0
+            for canal in self.canales:
+                forma_onda, error = self.sesion.ejecutar(lambda equipo: equipo.leer_forma_onda(canal))
+                if error:
+                    self.error = f"CH{canal}: {error}"
+                    break
+                puntos_originales = max(puntos_originales, len(forma_onda["voltaje"]))
+                canales[f"CH{canal}"] = decimar(
+                    forma_onda["tiempo"], forma_onda["voltaje"], self.puntos, self.metodo
+                )
+            else:
+                self.error = None
+                with self._lock:
+                    self.capturados += 1
+                    # Se sustituye el cuadro anterior aunque nadie lo haya leído
+                    self._ultimo = {
+                        "numero": self.capturados,
+                        "tiempo": time.time(),
+                        "duracion_captura": time.monotonic() - inicio,
+                        "puntos_originales": puntos_originales,
+                        "canales": canales,
+                    }
+
+            # Mantener el ritmo pedido descontando lo que tardó la captura
+            espera = 1.0 / self.cuadros_por_segundo - (time.monotonic() - inicio)
+            if self.error:
+                espera = max(espera, 1.0)
+            if espera > 0:
+                self._detener.wait(espera)
@@ -1,26 +1,69 @@
-import pandas as pd
-import streamlit as st
-import plotly.graph_objects as go
-from modules.config import cargar_datos_ganancia
+# pandas, plotly y streamlit se importan dentro de cada función para que
+# importar este módulo no cueste nada hasta que se use una gráfica o exportación
+import math
+import threading
+import time
+from modules.config import (
+    cargar_datos_ganancia, firma_archivo, generacion_cache, ARCHIVO_DATOS_GANANCIA
+)
+
+# Caché del DataFrame de ganancias, validada igual que la caché de JSON
+_cache_dataframe = {"clave": None, "df": None}
+_cache_dataframe_lock = threading.Lock()
 
 def crear_dataframe_ganancias():
     """
     Crea un DataFrame con los datos de ganancia
     
+    El DataFrame se reconstruye solo si cambió el archivo de resultados;
+    se devuelve una copia para que el llamador pueda modificarla.
+    
     Returns:
         pandas.DataFrame: DataFrame con los datos de ganancia
     """
+    import pandas as pd
+    
+    clave = (firma_archivo(ARCHIVO_DATOS_GANANCIA), generacion_cache())
+    
+    with _cache_dataframe_lock:
+        if _cache_dataframe["clave"] == clave and _cache_dataframe["df"] is not None:
+            return _cache_dataframe["df"].copy()
+    
     datos = cargar_datos_ganancia()
     
     if not datos or "mediciones" not in datos or not datos["mediciones"]:
-        return pd.DataFrame()
+        df = pd.DataFrame()
+    else:
+        # Convertir a DataFrame
+        df = pd.DataFrame([dict(m) for m in datos["mediciones"]])
+        
+        # Ordenar por frecuencia
+        if "frecuencia" in df.columns:
+            df = df.sort_values("frecuencia")
     
-    # Convertir a DataFrame
-    df = pd.DataFrame(datos["mediciones"])
+    with _cache_dataframe_lock:
+        _cache_dataframe["clave"] = clave
+        _cache_dataframe["df"] = df
     
-    # Ordenar por frecuencia
-    if "frecuencia" in df.columns:
-        df = df.sort_values("frecuencia")
+    return df.copy()
+
+def agregar_columnas_db(df, columnas=("ganancia_real", "ganancia_pk2pk", "ganancia_amplitud")):
+    """
+    Agrega las columnas en dB (<columna>_db) que falten en el DataFrame
+    
+    Args:
+        df: DataFrame con las ganancias lineales
+        columnas: Columnas de ganancia a convertir
+        
+    Returns:
+        pandas.DataFrame: El mismo DataFrame, modificado en el lugar
+    """
+    import numpy as np
+    
+    for columna in columnas:
+        if columna in df.columns and f"{columna}_db" not in df.columns:
+            # Evitar log(0)
+            df[f"{columna}_db"] = 20 * np.log10(np.maximum(df[columna].to_numpy(dtype=float), 1e-10))
     
     return df
 
@@ -28,6 +71,8 @@ def mostrar_tabla_ganancias():
     """
     Muestra una tabla con los datos de ganancia
     """
+    import streamlit as st
+    
     df = crear_dataframe_ganancias()
     
     if df.empty:
@@ -44,22 +89,39 @@ def mostrar_tabla_ganancias():
     # Mostrar la tabla
     st.dataframe(df)
 
-def generar_grafico_bode():
+def dataframe_mediciones(mediciones):
+    """
+    DataFrame ordenado por frecuencia a partir de una lista de mediciones
+    (por ejemplo, las de una corrida del historial)
+    """
+    import pandas as pd
+    
+    df = pd.DataFrame([dict(m) for m in mediciones])
+    if "frecuencia" in df.columns:
+        df = df.sort_values("frecuencia")
+    return df
+
+def generar_grafico_bode(df=None, metricas=None):
     """
     Genera un gráfico de Bode (diagrama de ganancia)
     
+    Args:
+        df: DataFrame de mediciones; si es None se usan todas las guardadas
+        metricas: Métricas de modules.analisis para marcar los cruces de -3 dB
+    
     Returns:
         plotly.graph_objects.Figure: Figura de Plotly con el gráfico
     """
-    df = crear_dataframe_ganancias()
+    import plotly.graph_objects as go
+    
+    if df is None:
+        df = crear_dataframe_ganancias()
     
     if df.empty:
         return None
     
     # Calcular ganancia en dB si no existe
-    if "ganancia_real_db" not in df.columns:
-        import numpy as np
-        df["ganancia_real_db"] = 20 * np.log10(df["ganancia_real"])
+    agregar_columnas_db(df)
     
     # Crear figura de Plotly
     fig = go.Figure()
@@ -74,6 +136,21 @@ def generar_grafico_bode():
         marker=dict(size=8, color="blue")
     ))
     
+    # Nivel de -3 dB respecto al pico y frecuencias de corte interpoladas
+    if metricas and metricas.get("ganancia_max_db") is not None:
+        nivel = metricas["ganancia_max_db"] - 3
+        fig.add_hline(y=nivel, line=dict(color="gray", dash="dot"),
+                      annotation_text="-3 dB", annotation_position="bottom right")
+        for clave in ("f_inferior_3db", "f_superior_3db"):
+            if metricas.get(clave) is not None:
+                fig.add_trace(go.Scatter(
+                    x=[metricas[clave]],
+                    y=[nivel],
+                    mode="markers",
+                    name=f"{metricas[clave]:.4g} Hz",
+                    marker=dict(size=12, color="red", symbol="x")
+                ))
+    
     # Configurar diseño del gráfico
     fig.update_layout(
         title="Diagrama de Bode - Respuesta en Frecuencia",
@@ -106,3 +183,217 @@ def generar_grafico_bode():
     )
     
     return fig
+
+def generar_grafico_spc(limites):
+    """
+    Banda de control por frecuencia (media, ±3σ, p5-p95 y extremos)
+    
+    Args:
+        limites: Filas de modules.spc.limites_control
+    
+    Returns:
+        plotly.graph_objects.Figure: Figura o None si no hay agregados
+    """
+    import plotly.graph_objects as go
+    
+    if not limites:
+        return None
+    
+    frecuencias = [fila["frecuencia"] for fila in limites]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=frecuencias, y=[fila["p95"] for fila in limites],
+                             mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=frecuencias, y=[fila["p5"] for fila in limites],
+                             mode="lines", line=dict(width=0), fill="tonexty",
+                             fillcolor="rgba(0, 0, 255, 0.15)", name="p5 - p95"))
+    fig.add_trace(go.Scatter(x=frecuencias, y=[fila["media"] for fila in limites],
+                             mode="lines+markers", name="Media", line=dict(color="blue", width=2)))
+    for clave, nombre in (("ucl", "UCL (+3σ)"), ("lcl", "LCL (-3σ)")):
+        fig.add_trace(go.Scatter(x=frecuencias, y=[fila[clave] for fila in limites],
+                                 mode="lines", name=nombre, line=dict(color="red", dash="dash")))
+    for clave, nombre in (("maximo", "Máximo"), ("minimo", "Mínimo")):
+        fig.add_trace(go.Scatter(x=frecuencias, y=[fila[clave] for fila in limites],
+                                 mode="lines", name=nombre, line=dict(color="gray", dash="dot", width=1)))
+    
+    fig.update_layout(
+        xaxis_title="Frecuencia (Hz)",
+        yaxis_title="Ganancia (dB)",
+        xaxis_type="log",
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=True, gridcolor="lightgray"),
+        yaxis=dict(showgrid=True, gridcolor="lightgray"),
+        height=400
+    )
+    return fig
+
+def generar_carta_control(fila, recientes):
+    """
+    Carta de control de valores individuales en una frecuencia
+    
+    Args:
+        fila: Límites de la frecuencia (modules.spc.limites_control)
+        recientes: Últimos valores [[etiqueta, ganancia_db], ...]
+    
+    Returns:
+        plotly.graph_objects.Figure: Figura con los puntos fuera de límites en rojo
+    """
+    import plotly.graph_objects as go
+    
+    valores = [valor for _, valor in recientes]
+    fuera = [not (fila["lcl"] <= valor <= fila["ucl"]) for valor in valores]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=list(range(1, len(valores) + 1)),
+        y=valores,
+        mode="lines+markers",
+        name="Ganancia (dB)",
+        text=[etiqueta for etiqueta, _ in recientes],
+        line=dict(color="blue", width=1),
+        marker=dict(size=7, color=["red" if f else "blue" for f in fuera])
+    ))
+    fig.add_hline(y=fila["media"], line=dict(color="green"), annotation_text="Media")
+    fig.add_hline(y=fila["ucl"], line=dict(color="red", dash="dash"), annotation_text="UCL")
+    fig.add_hline(y=fila["lcl"], line=dict(color="red", dash="dash"), annotation_text="LCL")
+    fig.update_layout(
+        title=f"Carta de control a {fila['frecuencia']:.6g} Hz",
+        xaxis_title="Corrida (últimas)",
+        yaxis_title="Ganancia (dB)",
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=True, gridcolor="lightgray"),
+        yaxis=dict(showgrid=True, gridcolor="lightgray"),
+        height=350
+    )
+    return fig
+
+def _formato_hz(valor):
+    return f"{valor:.4g} Hz" if valor is not None else "—"
+
+def _formato_db(valor, unidad="dB"):
+    return f"{valor:.2f} {unidad}" if valor is not None else "—"
+
+def mostrar_metricas_bode(metricas):
+    """
+    Muestra las métricas de una curva de Bode (modules.analisis) en la columna actual
+    """
+    import streamlit as st
+    
+    if not metricas:
+        st.info("No hay puntos suficientes para analizar la curva.")
+        return
+    
+    st.metric("Ancho de banda (-3 dB)", _formato_hz(metricas.get("ancho_banda_3db")))
+    st.metric("Corte inferior / superior",
+              f"{_formato_hz(metricas.get('f_inferior_3db'))} / {_formato_hz(metricas.get('f_superior_3db'))}")
+    st.metric("Ganancia máxima", _formato_db(metricas.get("ganancia_max_db")),
+              f"{_formato_hz(metricas.get('frecuencia_pico'))}", delta_color="off")
+    st.metric("Q", f"{metricas['q']:.3g}" if metricas.get("q") is not None else "—")
+    st.metric("Pendiente alta / baja",
+              f"{_formato_db(metricas.get('pendiente_alta_db_dec'), 'dB/déc')} / "
+              f"{_formato_db(metricas.get('pendiente_baja_db_dec'), 'dB/déc')}")
+    
+    ajuste = metricas.get("ajuste")
+    if ajuste:
+        with st.expander("Función de transferencia ajustada"):
+            def raiz(r):
+                return f"{r[0]:.4g} {'+' if r[1] >= 0 else '-'} j{abs(r[1]):.4g}" if r[1] else f"{r[0]:.4g}"
+            st.write(f"**Polos (Hz):** {', '.join(raiz(r) for r in ajuste['polos_hz']) or '—'}")
+            st.write(f"**Ceros (Hz):** {', '.join(raiz(r) for r in ajuste['ceros_hz']) or '—'}")
+            st.write(f"**Ganancia DC:** {ajuste['ganancia_dc']:.4g}")
+            if ajuste.get("frecuencia_natural_hz"):
+                st.write(f"**f0 / Q del modelo:** {ajuste['frecuencia_natural_hz']:.4g} Hz / {ajuste['q']:.3g}")
+            st.caption(f"Error RMS del ajuste: {ajuste['error_rms_db']:.2f} dB")
+
+class BodeEnVivo:
+    """
+    Gráfico de Bode que crece punto a punto durante un barrido.
+    
+    Los resultados nuevos se agregan al final de las trazas de una figura que
+    se conserva entre refrescos (sin recargar el archivo ni reordenar). Para no
+    saturar el navegador con un barrido rápido, los puntos recibidos se
+    acumulan y la figura se actualiza como mucho una vez cada intervalo_min.
+    
+    Args:
+        intervalo_min: Tiempo mínimo (s) entre actualizaciones de la figura
+    """
+    
+    def __init__(self, intervalo_min=1.0):
+        self.intervalo_min = intervalo_min
+        self.corrida = None
+        self.recibidos = 0
+        self._frecuencias = []
+        self._ganancias_db = []
+        self._pendientes = []
+        self._figura = None
+        self._ultima_actualizacion = 0.0
+    
+    def agregar(self, corrida, resultados):
+        """
+        Agrega los resultados nuevos de una corrida
+        
+        Si la corrida cambió, el gráfico se reinicia.
+        """
+        if corrida != self.corrida:
+            self.corrida = corrida
+            self.recibidos = 0
+            self._frecuencias = []
+            self._ganancias_db = []
+            self._pendientes = []
+            self._figura = None
+        
+        self._pendientes.extend(resultados)
+        self.recibidos += len(resultados)
+    
+    def figura(self, forzar=False):
+        """
+        Devuelve la figura, incorporando los puntos pendientes si ya pasó el intervalo mínimo
+        
+        Args:
+            forzar: Incorporar los pendientes sin esperar (por ejemplo, al terminar el barrido)
+            
+        Returns:
+            plotly.graph_objects.Figure: Figura o None si aún no hay puntos
+        """
+        ahora = time.monotonic()
+        if self._pendientes and (forzar or self._figura is None
+                                 or ahora - self._ultima_actualizacion >= self.intervalo_min):
+            for resultado in self._pendientes:
+                self._frecuencias.append(resultado["frecuencia"])
+                # Evitar log(0)
+                self._ganancias_db.append(20 * math.log10(max(resultado["ganancia_real"], 1e-10)))
+            self._pendientes = []
+            self._ultima_actualizacion = ahora
+            
+            if self._figura is None:
+                self._figura = self._crear_figura()
+            with self._figura.batch_update():
+                self._figura.data[0].x = self._frecuencias
+                self._figura.data[0].y = self._ganancias_db
+        
+        return self._figura
+    
+    def _crear_figura(self):
+        import plotly.graph_objects as go
+        
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=[],
+            y=[],
+            mode="lines+markers",
+            name="Ganancia (dB)",
+            line=dict(color="blue", width=2),
+            marker=dict(size=6, color="blue")
+        ))
+        fig.update_layout(
+            title="Respuesta en Frecuencia (en vivo)",
+            xaxis_title="Frecuencia (Hz)",
+            yaxis_title="Ganancia (dB)",
+            xaxis_type="log",
+            plot_bgcolor="white",
+            xaxis=dict(showgrid=True, gridcolor="lightgray"),
+            yaxis=dict(showgrid=True, gridcolor="lightgray"),
+            # Conservar zoom y desplazamiento del usuario entre actualizaciones
+            uirevision="bode_en_vivo",
+            height=350
+        )
+        return fig
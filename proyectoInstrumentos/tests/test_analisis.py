@@ -0,0 +1,60 @@
+# Archivo tests/test_analisis.py - Pruebas de las métricas de curvas de Bode
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import math
+import os
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import numpy as np
+import pytest
+
+from modules.analisis import METRICAS, analizar_lote, cruces, preparar_curvas
+
+def _paso_bajo(fc=1000.0, orden=1):
+    f = np.logspace(1, 5, 41)
+    g = -10 * orden * np.log10(1 + (f / fc) ** 2)
+    return f, g
+
+def test_preparar_curvas_promedia_y_descarta():
+    F, G = preparar_curvas([([1000, 100, 100, 10], [0.0, 1.0, 3.0, -math.inf])])
+    assert F.tolist() == [[100.0, 1000.0]]
+    assert G.tolist() == [[2.0, 0.0]]
+
+def test_paso_bajo_primer_orden():
+    f, g = _paso_bajo()
+    metricas = analizar_lote([(f, g)], ajustar=False)[0]
+    assert metricas["f_superior_3db"] == pytest.approx(1000.0, rel=0.02)
+    assert metricas["f_inferior_3db"] is None
+    assert metricas["pendiente_alta_db_dec"] == pytest.approx(-20.0, abs=1.0)
+
+def test_lote_igual_que_corridas_sueltas():
+    curvas = [_paso_bajo(500.0), _paso_bajo(2000.0, orden=2)]
+    lote = analizar_lote(curvas, ajustar=False)
+    for curva, metricas in zip(curvas, lote):
+        assert analizar_lote([curva], ajustar=False)[0] == metricas
+
+@pytest.mark.parametrize("curvas", [
+    [([100], [0.0])],
+    [([100, 100], [0.0, 1.0])],
+    [([], [])],
+    [([100, 1000], [-math.inf, -math.inf])],
+])
+def test_menos_de_dos_puntos_sin_metricas(curvas):
+    metricas = analizar_lote(curvas)[0]
+    assert all(metricas[clave] is None for clave in METRICAS)
+    assert metricas["ajuste"] is None
+
+def test_corrida_corta_en_un_lote():
+    metricas = analizar_lote([_paso_bajo(), ([100], [0.0])], ajustar=False)
+    assert metricas[0]["f_superior_3db"] == pytest.approx(1000.0, rel=0.02)
+    assert all(metricas[1][clave] is None for clave in METRICAS)
+
+def test_cruces_con_una_sola_columna():
+    f_inferior, f_superior = cruces(np.array([[100.0]]), np.array([[0.0]]), 3.0)
+    assert np.isnan(f_inferior).all() and np.isnan(f_superior).all()
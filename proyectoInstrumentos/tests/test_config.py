@@ -0,0 +1,43 @@
+# Archivo tests/test_config.py - Pruebas del guardado de mediciones de ganancia
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import pytest
+
+from modules import config
+
+@pytest.fixture
+def datos_temporales(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "ARCHIVO_DATOS_GANANCIA", str(tmp_path / "datos_ganancia.json"))
+
+def _medicion(frecuencia, ganancia, **barridos):
+    return {"frecuencia": frecuencia, "canal1_pk2pk": 1.0, "canal1_amplitud": 1.0,
+            "canal2_pk2pk": ganancia, "canal2_amplitud": ganancia, "ganancia_pk2pk": ganancia,
+            "ganancia_amplitud": ganancia, "ganancia_real": ganancia, **barridos}
+
+def test_reemplaza_la_misma_frecuencia(datos_temporales):
+    assert config.agregar_mediciones_ganancia([_medicion(100.0, 1.0), _medicion(1000.0, 1.0)])
+    assert config.agregar_mediciones_ganancia([_medicion(100.0, 2.0)])
+    mediciones = config.cargar_datos_ganancia()["mediciones"]
+    assert [(m["frecuencia"], m["ganancia_real"]) for m in mediciones] == [(100.0, 2.0), (1000.0, 1.0)]
+
+def test_amplitud_y_offset_barridos_forman_parte_de_la_clave(datos_temporales):
+    assert config.agregar_mediciones_ganancia([
+        _medicion(100.0, 1.0, amplitud=0.05), _medicion(100.0, 2.0, amplitud=0.1),
+        _medicion(100.0, 3.0, offset=0.5), _medicion(100.0, 4.0),
+    ])
+    assert config.agregar_mediciones_ganancia([_medicion(100.0, 5.0, amplitud=0.1)])
+    mediciones = config.cargar_datos_ganancia()["mediciones"]
+    assert [(m.get("amplitud"), m.get("offset"), m["ganancia_real"]) for m in mediciones] == [
+        (0.05, None, 1.0), (0.1, None, 5.0), (None, 0.5, 3.0), (None, None, 4.0),
+    ]
+    assert "amplitud" not in mediciones[3] and "offset" not in mediciones[3]
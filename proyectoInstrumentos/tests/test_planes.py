@@ -0,0 +1,70 @@
+# Archivo tests/test_planes.py - Pruebas de la validación y compilación de planes
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import pytest
+
+from modules.planes import compilar_plan, estimar_duracion, validar_plan
+
+EJES = [{"parametro": "frecuencia", "valores": [100, 1000, 10000]}]
+
+def test_plan_minimo_con_valores_por_defecto():
+    plan, error = validar_plan({"ejes": EJES})
+    assert error is None
+    assert plan["ejes"][0]["valores"] == [100.0, 1000.0, 10000.0]
+    assert plan["canales"]["entrada"] == 1 and plan["canales"]["salida"] == 2
+
+def test_eje_generado_logaritmico():
+    plan, error = validar_plan({"ejes": [{"parametro": "frecuencia", "inicio": 10, "fin": 1000, "puntos": 3}]})
+    assert error is None
+    assert plan["ejes"][0]["valores"] == [10.0, 100.0, 1000.0]
+
+@pytest.mark.parametrize("plan", [
+    [],
+    {"ejes": []},
+    {"ejes": [5]},
+    {"ejes": [{"parametro": "fase", "valores": [1]}]},
+    {"ejes": [{"parametro": "frecuencia", "valores": [100, 0]}]},
+    {"ejes": [{"parametro": "frecuencia", "valores": [100, "x"]}]},
+    {"ejes": [{"parametro": "frecuencia", "inicio": 0, "fin": 1000, "puntos": 5}]},
+    {"ejes": [{"parametro": "frecuencia", "inicio": 10, "fin": 1000, "puntos": 2.5}]},
+    {"ejes": EJES, "estimulo": {"canal": 3}},
+    {"ejes": EJES, "estimulo": {"frecuencia": 0}},
+    {"ejes": EJES, "canales": {"entrada": [1]}},
+    {"ejes": EJES, "canales": {"entrada": 2, "salida": 2}},
+    {"ejes": EJES, "canales": {"acoplamiento": "XX"}},
+    {"ejes": EJES, "rango": {"periodos": 0}},
+    {"ejes": EJES, "adquisicion": {"estabilizacion": -1}},
+    {"ejes": EJES, "adquisicion": {"detener": "si"}},
+    {"ejes": EJES, "establecimiento": {"periodos": 0}},
+    {"ejes": EJES, "desconocida": {}},
+])
+def test_plan_no_valido_devuelve_error(plan):
+    completo, error = compilar_plan(plan)
+    assert completo is None
+    assert isinstance(error, str) and error
+
+def test_solo_se_envian_los_cambios():
+    programa, error = compilar_plan({"ejes": EJES, "rango": {"modo": "inicial"}})
+    assert error is None
+    primero, segundo = programa["puntos"][0], programa["puntos"][1]
+    textos = [i["texto"] for i in segundo["instrucciones"] if i["tipo"] == "comando"]
+    assert ":SOURce1:FREQuency 1000" in textos
+    assert ":SOURce1:FUNCtion SINusoid" not in textos
+    # La configuración completa repite todo para retomar tras un error
+    assert len(segundo["completo"]) > len(segundo["instrucciones"])
+    assert len(primero["instrucciones"]) == len(primero["completo"])
+
+def test_estimacion_sin_pausa_en_modo_adaptativo():
+    base = {"ejes": EJES, "adquisicion": {"entre_mediciones": 5}}
+    fijo, _ = compilar_plan(base)
+    adaptativo, _ = compilar_plan({**base, "establecimiento": {"modo": "adaptativo"}})
+    assert estimar_duracion(fijo) - estimar_duracion(adaptativo) > 2 * 5 - 1
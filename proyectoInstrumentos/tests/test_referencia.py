@@ -0,0 +1,72 @@
+# Archivo tests/test_referencia.py - Pruebas de los veredictos contra una referencia
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import pytest
+
+from modules.referencia import (
+    FALLA, INCOMPLETA, PASA, FallaReferencia, comprobar_punto, crear_referencia,
+    evaluar_lote, evaluar_mediciones, ganancia_db
+)
+
+FRECUENCIAS = [100.0, 1000.0, 10000.0]
+
+def _mediciones(ganancias, frecuencias=FRECUENCIAS):
+    return [{"frecuencia": f, "ganancia_real": g} for f, g in zip(frecuencias, ganancias)]
+
+@pytest.fixture
+def referencia():
+    referencia, error = crear_referencia("placa", _mediciones([1.0, 1.0, 0.5]), tolerancia_db=1.0,
+                                         limite_duro_db=3.0, abortar=True)
+    assert error is None
+    return referencia
+
+def test_crear_referencia_necesita_dos_frecuencias():
+    assert crear_referencia("placa", _mediciones([1.0], [100.0])) == (
+        None, "La referencia necesita al menos dos frecuencias")
+    referencia, error = crear_referencia("placa", _mediciones([1.0, 1.0]), tolerancia_db=[1.0])
+    assert referencia is None and "tolerancias" in error
+
+def test_veredictos(referencia):
+    assert evaluar_mediciones(referencia, _mediciones([1.0, 1.0, 0.5]))["veredicto"] == PASA
+    falla = evaluar_mediciones(referencia, _mediciones([1.0, 2.0, 0.5]))
+    assert falla["veredicto"] == FALLA
+    assert falla["frecuencia_peor"] == 1000.0 and falla["puntos_fuera"] == 1
+    parcial = evaluar_mediciones(referencia, _mediciones([1.0, 1.0], FRECUENCIAS[:2]))
+    assert parcial["veredicto"] == INCOMPLETA and parcial["puntos_cubiertos"] == 2
+
+def test_ganancia_nula_falla(referencia):
+    veredicto = evaluar_mediciones(referencia, _mediciones([1.0, 0.0, 0.5]))
+    assert veredicto["veredicto"] == FALLA and veredicto["falla_dura"]
+
+def test_lote_igual_que_corridas_sueltas(referencia):
+    corridas = [_mediciones([1.0, 1.0, 0.5]), _mediciones([1.0, 2.0, 0.5]),
+                _mediciones([1.0, 1.0], FRECUENCIAS[:2])]
+    curvas = [([m["frecuencia"] for m in c], [ganancia_db(m) for m in c])
+              for c in corridas]
+    assert evaluar_lote(referencia, curvas) == [evaluar_mediciones(referencia, c) for c in corridas]
+
+@pytest.mark.parametrize("mediciones", [
+    _mediciones([1.0], [1000.0]),
+    _mediciones([1.0, 1.0], [1000.0, 1000.0]),
+    [],
+])
+def test_menos_de_dos_puntos_sin_cobertura(referencia, mediciones):
+    veredicto = evaluar_mediciones(referencia, mediciones)
+    assert veredicto["veredicto"] == INCOMPLETA
+    assert veredicto["puntos_cubiertos"] == 0 and veredicto["margen_db"] is None
+
+def test_comprobar_punto_aborta_con_falla_dura(referencia):
+    comprobar_punto(referencia, {"frecuencia": 1000.0, "ganancia_real": 1.2})
+    with pytest.raises(FallaReferencia):
+        comprobar_punto(referencia, {"frecuencia": 1000.0, "ganancia_real": 2.0})
+    # Fuera del rango de la referencia no se comprueba
+    comprobar_punto(referencia, {"frecuencia": 50000.0, "ganancia_real": 100.0})
@@ -0,0 +1,74 @@
+# Archivo tests/test_scripts_scpi.py - Pruebas del parser de scripts SCPI
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import pytest
+
+from modules.scripts_scpi import MAX_PASOS, parsear_script
+
+def test_comandos_queries_y_comentarios():
+    pasos, error = parsear_script("# inicio\n:CHANnel1:COUPling AC  # acoplamiento\n:MEASure:PK2PK?\n")
+    assert error is None
+    assert [(p["linea"], p["tipo"], p["texto"]) for p in pasos] == [
+        (2, "comando", ":CHANnel1:COUPling AC"),
+        (3, "query", ":MEASure:PK2PK?"),
+    ]
+
+def test_bucles_anidados():
+    pasos, error = parsear_script("LOOP 2\n*IDN?\nLOOP 3\nWAIT 10\nEND\nEND\n")
+    assert error is None
+    assert [p["tipo"] for p in pasos] == ["query"] + ["espera"] * 3 + ["query"] + ["espera"] * 3
+
+def test_loop_cero_no_repite():
+    pasos, error = parsear_script("LOOP 0\n*RST\nEND\n*IDN?\n")
+    assert error is None
+    assert [p["texto"] for p in pasos] == ["*IDN?"]
+
+@pytest.mark.parametrize("texto", [
+    "LOOP 1000000000\n*IDN?\nEND\n",
+    "LOOP 100000\nLOOP 100000\n*IDN?\nEND\nEND\n",
+    f"LOOP {MAX_PASOS + 1}\n*IDN?\nEND\n",
+])
+def test_limite_de_pasos_antes_de_expandir(texto):
+    pasos, error = parsear_script(texto)
+    assert pasos is None
+    assert str(MAX_PASOS) in error
+
+def test_limite_de_pasos_exacto():
+    pasos, error = parsear_script(f"LOOP {MAX_PASOS}\n*IDN?\nEND\n")
+    assert error is None
+    assert len(pasos) == MAX_PASOS
+
+@pytest.mark.parametrize("texto, linea", [
+    ("WAIT -5\n", 1),
+    ("*IDN?\nWAIT nan\n", 2),
+    ("WAIT inf\n", 1),
+    ("WAIT\n", 1),
+    ("WAIT diez\n", 1),
+])
+def test_wait_no_valido(texto, linea):
+    pasos, error = parsear_script(texto)
+    assert pasos is None
+    assert error.startswith(f"Línea {linea}:")
+
+@pytest.mark.parametrize("texto, linea", [
+    ("LOOP -3\n*IDN?\nEND\n", 1),
+    ("*IDN?\nLOOP 2.5\n*IDN?\nEND\n", 2),
+    ("LOOP\nEND\n", 1),
+])
+def test_loop_no_valido(texto, linea):
+    pasos, error = parsear_script(texto)
+    assert pasos is None
+    assert error.startswith(f"Línea {linea}:")
+
+def test_bloques_desequilibrados():
+    assert parsear_script("END\n") == (None, "Línea 1: END sin LOOP")
+    assert parsear_script("*IDN?\nLOOP 2\n*IDN?\n") == (None, "Línea 2: LOOP sin END")
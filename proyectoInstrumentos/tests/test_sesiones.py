@@ -0,0 +1,67 @@
+# Archivo tests/test_sesiones.py - Pruebas de las sesiones manuales frente a las reservas
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import pytest
+
+from modules import reservas
+from modules.sesiones import BancoInstrumentos, SesionInstrumento
+
+class EquipoFalso:
+    def __init__(self, ip, puerto):
+        self.ip, self.puerto = ip, puerto
+        self.instrumento = None
+
+    def conectar(self):
+        self.instrumento = object()
+        return True, None
+
+    def desconectar(self):
+        self.instrumento = None
+
+    def identificar(self):
+        return "FALSO", None
+
+@pytest.fixture(autouse=True)
+def reservas_temporales(tmp_path, monkeypatch):
+    monkeypatch.setattr(reservas, "DIRECTORIO_RESERVAS", str(tmp_path))
+
+def test_sesion_conectada_no_usa_un_equipo_reservado():
+    sesion = SesionInstrumento(EquipoFalso("10.0.0.1", 3000), "navegador")
+    assert sesion.ejecutar(lambda equipo: equipo.identificar()) == ("FALSO", None)
+
+    reserva = reservas.ReservaEquipos([("osciloscopio", "10.0.0.1", 3000)])
+    assert reserva.tomar() == (True, None)
+    try:
+        valor, error = sesion.ejecutar(lambda equipo: equipo.identificar())
+        assert valor is None and "En uso por otro proceso" in error
+        assert sesion.equipo.instrumento is None
+        assert not sesion.retiene_equipo()
+    finally:
+        reserva.liberar()
+    assert sesion.ejecutar(lambda equipo: equipo.identificar()) == ("FALSO", None)
+
+def test_mantenimiento_libera_las_sesiones_reservadas(monkeypatch):
+    banco = BancoInstrumentos()
+    monkeypatch.setattr(banco, "_iniciar_mantenimiento", lambda: None)
+    reservada, _ = banco.obtener(EquipoFalso, "10.0.0.1", 3000, "navegador")
+    libre, _ = banco.obtener(EquipoFalso, "10.0.0.2", 3000, "navegador")
+    reservada.conectar()
+    libre.conectar()
+
+    reserva = reservas.ReservaEquipos([("generador", "10.0.0.1", 3000)])
+    reserva.tomar()
+    try:
+        banco._revisar()
+    finally:
+        reserva.liberar()
+    assert reservada.liberada and "reservado" in reservada.motivo_liberacion
+    assert not libre.liberada and libre.equipo.instrumento is not None
@@ -0,0 +1,59 @@
+# Archivo tests/test_spc.py - Pruebas de los agregados SPC incrementales
+#
+# Uso, desde proyectoInstrumentos/:
+#
+#   python -m pytest -q tests
+
+import math
+import os
+import random
+import statistics
+import sys
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_PROYECTO)
+
+import pytest
+
+from modules import spc
+
+@pytest.fixture(autouse=True)
+def spc_temporal(tmp_path, monkeypatch):
+    monkeypatch.setattr(spc, "ARCHIVO_SPC", str(tmp_path / "spc.json"))
+
+def _corrida(numero, ganancias):
+    return {"id": f"c{numero}", "inicio": f"2026-01-01 00:00:{numero:02d}",
+            "mediciones": [{"frecuencia": f, "ganancia_real": g} for f, g in ganancias.items()]}
+
+def test_media_y_sigma_como_el_historial_completo():
+    aleatorio = random.Random(1)
+    valores = [aleatorio.uniform(0.5, 2.0) for _ in range(40)]
+    for i, valor in enumerate(valores):
+        assert spc.actualizar_spc(_corrida(i, {1000.0: valor}))
+    (fila,) = spc.limites_control()
+    en_db = [20 * math.log10(v) for v in valores]
+    assert fila["n"] == len(valores)
+    assert fila["media"] == pytest.approx(statistics.mean(en_db))
+    assert fila["sigma"] == pytest.approx(statistics.stdev(en_db))
+    assert fila["minimo"] == pytest.approx(min(en_db)) and fila["maximo"] == pytest.approx(max(en_db))
+    assert fila["p5"] <= fila["p50"] <= fila["p95"]
+
+def test_corrida_repetida_y_calibraciones_no_cuentan():
+    corrida = _corrida(1, {100.0: 1.0})
+    spc.actualizar_spc(corrida)
+    spc.actualizar_spc(corrida)
+    spc.actualizar_spc({**_corrida(2, {100.0: 5.0}), "tipo": "calibracion"})
+    datos = spc.cargar_spc()
+    assert datos["frecuencias"][spc.clave_frecuencia(100.0)]["n"] == 1
+
+def test_frecuencias_con_redondeo_comparten_agregado():
+    spc.actualizar_spc(_corrida(1, {1000.0: 1.0}))
+    spc.actualizar_spc(_corrida(2, {1000.0000001: 1.0}))
+    assert [fila["n"] for fila in spc.limites_control()] == [2]
+
+def test_ventana_de_recientes_limitada():
+    for i in range(spc.VENTANA + 5):
+        spc.actualizar_spc(_corrida(i, {100.0: 1.0}))
+    agregado = spc.cargar_spc()["frecuencias"][spc.clave_frecuencia(100.0)]
+    assert len(agregado["recientes"]) == spc.VENTANA
+    assert agregado["n"] == spc.VENTANA + 5